@@ -0,0 +1,111 @@
+"""比較回應編碼方式的微基準測試。
+
+以含有數 MB `response` 的回應比較：
+    legacy: 舊的 __dict__ 物件經 jsonable_encoder 後由 JSONResponse（json.dumps）編碼。
+    orjson: msgspec.Struct 以 orjson 直接編碼為 bytes（app.render 使用的方式）。
+另比較請求體解碼：json.loads 後建立物件，與 msgspec 直接解碼並驗證。
+
+範例：
+    python bench/encode.py --size-mb 5 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from data_structures import SolutionResultT, V1ResponseBase, decode_request, encode  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+
+class LegacyObject:
+    """舊版以 __dict__ 保存欄位的資料類別。"""
+
+    def __init__(self, _dict):
+        self.__dict__.update(_dict)
+
+
+def legacy_decode(body: str):
+    """舊版的請求解碼：json.loads 後以 dict 建立物件，不驗證型別。"""
+    req = LegacyObject(json.loads(body))
+    req.actions = [LegacyObject(action) for action in req.actions]
+    return req
+
+
+def make_html(size: int):
+    """產生約 size 個字元、含多語系文字與需跳脫字元的 HTML。"""
+    row = '<tr><td class="name">商品 "測試" & <b>item</b></td><td>\\ 123.45 \t</td></tr>\n'
+    return "<html><body><table>\n" + row * (size // len(row)) + "</table></body></html>"
+
+
+def measure(func, repeat: int):
+    """執行 repeat 次，回傳每次耗時的中位數（毫秒）與最後一次的結果。"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return times[len(times) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較回應編碼方式")
+    parser.add_argument("--size-mb", type=float, default=5, help="response 欄位大小（MB）")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    html = make_html(int(args.size_mb * 1024 * 1024))
+    fields = {
+        "url": "https://example.com/",
+        "status": 200,
+        "headers": "",
+        "response": html,
+        "cookies": [{"name": f"c{i}", "value": "v" * 32, "domain": "example.com"} for i in range(20)],
+        "userAgent": "Mozilla/5.0",
+        "screenshot_base64": "",
+        "wait_time": 120,
+        "data": {"title": "商品列表", "prices": [i * 1.5 for i in range(200)]},
+    }
+    timings = {"queue": 0.1, "navigation": 512.3, "wait": 80.2, "content": 40.1, "total": 700.5}
+
+    legacy = LegacyObject(
+        {
+            "status": "ok",
+            "message": None,
+            "start_timestamp": 0,
+            "end_timestamp": 0,
+            "version": "1.0.0",
+            "cache_status": "miss",
+            "timings": timings,
+            "request_id": "0" * 32,
+            "solution": LegacyObject(fields),
+        }
+    )
+    solution = SolutionResultT(**{("user_agent" if k == "userAgent" else k): v for k, v in fields.items()})
+    res = V1ResponseBase(cache_status="miss", timings=timings, request_id="0" * 32, solution=solution)
+
+    legacy_ms, legacy_body = measure(lambda: JSONResponse(jsonable_encoder(legacy)).body, args.repeat)
+    orjson_ms, orjson_body = measure(lambda: encode(res), args.repeat)
+    assert json.loads(legacy_body)["solution"]["response"] == json.loads(orjson_body)["solution"]["response"]
+
+    request = json.dumps({"url": "https://example.com/", "actions": [{"trigger": "click", "xpath": "//a"}] * 20})
+    request_body = request.encode()
+    decode_legacy_ms, _ = measure(lambda: legacy_decode(request), args.repeat * 50)
+    decode_ms, _ = measure(lambda: decode_request(request_body), args.repeat * 50)
+
+    print(f"response size: {len(orjson_body) / (1024 * 1024):.1f}MB")
+    print(f"encode  legacy (jsonable_encoder + json.dumps): {legacy_ms:8.2f}ms")
+    print(f"encode  orjson (msgspec.Struct -> bytes):       {orjson_ms:8.2f}ms  ({legacy_ms / orjson_ms:.1f}x)")
+    print(f"decode  legacy (json.loads + object):           {decode_legacy_ms * 1000:8.2f}us")
+    print(f"decode  msgspec (validated Struct):             {decode_ms * 1000:8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""對 `/v1` 與 `/v2` 執行基準測試，輸出延遲百分位數、每秒頁數與最高 RSS。
+
+預設會啟動本機合成網站（bench/synthetic_site.py）與 API 伺服器（src/app.py），
+並以 process_tree_rss 取樣 API 伺服器及其瀏覽器子行程的 RSS。
+結果寫入 JSON 檔案，指定 --baseline 時與先前的結果比較。
+
+範例：
+    python bench/run.py --backends v1,v2 --concurrency 4 --requests 40
+    python bench/run.py --api http://127.0.0.1:8000 --api-pid 1234 --baseline bench/results/old.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+sys.path.insert(0, SRC_DIR)
+
+from process_rss import process_tree_rss  # noqa: E402
+from synthetic_site import start_site  # noqa: E402
+
+# 情境名稱對應到路徑與額外的請求欄位
+SCENARIOS = {
+    "static": ("/static?size=4096", {}),
+    "slow": ("/slow?chunks=5&delay=200", {}),
+    "js": ("/js?delay=500", {"wait_until": "selector", "wait_selector": "#ready"}),
+    "actions": (
+        "/actions",
+        {
+            "actions": [
+                {"trigger": "clickable", "xpath": "//*[@id='reveal']", "select": "#reveal"},
+                {"trigger": "input", "xpath": "//*[@id='q']", "select": "#q", "value": "bench"},
+                {"trigger": "located", "xpath": "//*[@id='result']", "select": "#result"},
+            ]
+        },
+    ),
+    "large": ("/large?nodes=20000", {}),
+}
+
+
+def percentile(values: list, p: float):
+    """以線性內插計算百分位數。"""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(port: int):
+    """啟動 API 伺服器，等到可以連線後回傳子行程。"""
+    env = dict(
+        os.environ,
+        RESPONSE_CACHE_TTL="0",
+        JOB_DB=os.path.join(BENCH_DIR, "bench-jobs.db"),
+        COOKIE_JAR_FILE="",
+        CHANGE_STORE_FILE="",
+        ROUTER_STATS_FILE="",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SRC_DIR,
+        env=env,
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API 伺服器啟動失敗")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("等待 API 伺服器啟動逾時")
+
+
+class RssSampler:
+    """在背景線程定期取樣行程樹的 RSS，記錄最大值。"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        if self.pid:
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        return self.peak
+
+    def __run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self.stopped.wait(self.interval)
+
+
+def crawl(api: str, backend: str, payload: dict, timeout: float):
+    """送出一個請求。
+    Returns:
+        tuple[float, bool]: 延遲秒數與是否成功。
+    """
+    data = json.dumps(payload).encode()
+    request = urllib.request.Request(f"{api}/{backend}", data=data, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read())
+        ok = (body.get("solution") or {}).get("status") == 200
+    except (OSError, ValueError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run_scenario(api: str, backend: str, url: str, extra: dict, concurrency: int, requests: int, timeout: float):
+    """以指定並行數送出 requests 個請求。
+    Returns:
+        dict: 延遲百分位數（毫秒）、每秒頁數與錯誤數。
+    """
+    payload = dict(extra, url=url, no_cache=True, max_timeout=int(timeout * 1000))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: crawl(api, backend, payload, timeout), range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = [latency * 1000 for latency, ok in results if ok]
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+        "pages_per_second": len(latencies) / elapsed if elapsed else None,
+    }
+
+
+def compare(results: dict, baseline: dict):
+    """列出與先前結果相比的 p50 / p95 / 每秒頁數變化。"""
+    print(f"\n{'backend':8} {'scenario':10} {'p50':>10} {'p95':>10} {'pages/s':>10}")
+    for backend, scenarios in results["results"].items():
+        for name, current in scenarios.items():
+            old = baseline.get("results", {}).get(backend, {}).get(name)
+            if not old:
+                continue
+            cells = []
+            for key in ("p50_ms", "p95_ms", "pages_per_second"):
+                if current[key] and old.get(key):
+                    cells.append(f"{(current[key] / old[key] - 1) * 100:+9.1f}%")
+                else:
+                    cells.append(f"{'-':>10}")
+            print(f"{backend:8} {name:10} {' '.join(cells)}")
+    old_rss, rss = baseline.get("peak_rss_mb"), results.get("peak_rss_mb")
+    if old_rss and rss:
+        print(f"peak RSS: {old_rss:.0f}MB -> {rss:.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="對 /v1 與 /v2 執行基準測試")
+    parser.add_argument("--api", help="已啟動的 API 伺服器網址，未指定時自動啟動")
+    parser.add_argument("--api-pid", type=int, help="已啟動的 API 伺服器行程 id，用於取樣 RSS")
+    parser.add_argument("--backends", default="v1,v2")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20, help="每個情境的請求數")
+    parser.add_argument("--warmup", type=int, default=2, help="每個 backend 的預熱請求數")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="結果 JSON 路徑，預設為 bench/results/<時間>.json")
+    parser.add_argument("--baseline", help="要比較的先前結果 JSON")
+    args = parser.parse_args()
+
+    site = start_site()
+    site_url = "http://%s:%d" % site.server_address
+    api_process = None
+    if args.api:
+        api, api_pid = args.api.rstrip("/"), args.api_pid
+    else:
+        port = free_port()
+        api_process = start_api(port)
+        api, api_pid = f"http://127.0.0.1:{port}", api_process.pid
+
+    backends = [b for b in args.backends.split(",") if b]
+    scenarios = [s for s in args.scenarios.split(",") if s in SCENARIOS]
+    sampler = RssSampler(api_pid).start()
+    results = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "backends": backends,
+            "scenarios": scenarios,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "results": {},
+    }
+    try:
+        for backend in backends:
+            for _ in range(args.warmup):
+                crawl(api, backend, {"url": f"{site_url}/static", "no_cache": True}, args.timeout)
+            results["results"][backend] = {}
+            for name in scenarios:
+                path, extra = SCENARIOS[name]
+                result = run_scenario(
+                    api, backend, site_url + path, extra, args.concurrency, args.requests, args.timeout
+                )
+                results["results"][backend][name] = result
+                print(
+                    f"{backend:4} {name:8} p50={result['p50_ms'] or 0:8.1f}ms p95={result['p95_ms'] or 0:8.1f}ms "
+                    f"p99={result['p99_ms'] or 0:8.1f}ms {result['pages_per_second'] or 0:6.2f} pages/s "
+                    f"errors={result['errors']}"
+                )
+    finally:
+        results["peak_rss_mb"] = sampler.stop() / (1024 * 1024) if api_pid else None
+        if api_process is not None:
+            api_process.terminate()
+            api_process.wait()
+        site.shutdown()
+
+    output = args.output or os.path.join(BENCH_DIR, "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n結果已寫入 {output}")
+    if results["peak_rss_mb"]:
+        print(f"peak RSS: {results['peak_rss_mb']:.0f}MB")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
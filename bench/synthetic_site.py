@@ -0,0 +1,134 @@
+"""基準測試用的本機合成網站。
+
+頁面：
+    /static?size=N: 立即回傳約 N 字元的靜態 HTML。
+    /slow?chunks=N&delay=MS: 分 N 段串流 HTML，每段間隔 MS 毫秒。
+    /js?delay=MS: 空白頁面，MS 毫秒後由 JavaScript 產生內容。
+    /actions: 需要 clickable、input、located 三個 actions 才會出現 #result 的頁面。
+    /large?nodes=N: 含 N 個元素的大型 DOM。
+
+可單獨執行：
+    python bench/synthetic_site.py --port 8900
+"""
+
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FILLER = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+
+ACTIONS_PAGE = """<!DOCTYPE html>
+<html><head><title>actions</title></head><body>
+<button id="reveal" onclick="document.getElementById('form').style.display='block'">reveal</button>
+<div id="form" style="display:none">
+  <input id="q" oninput="if (this.value) setTimeout(() => {
+    const el = document.createElement('div');
+    el.id = 'result';
+    el.textContent = 'result for ' + this.value;
+    document.body.appendChild(el);
+  }, 100)">
+</div>
+<p>{filler}</p>
+</body></html>
+"""
+
+JS_PAGE = """<!DOCTYPE html>
+<html><head><title>js</title></head><body>
+<div id="app"></div>
+<script>
+setTimeout(() => {{
+    const app = document.getElementById("app");
+    for (let i = 0; i < 50; i++) {{
+        const p = document.createElement("p");
+        p.textContent = "{filler}";
+        app.appendChild(p);
+    }}
+    const done = document.createElement("div");
+    done.id = "ready";
+    app.appendChild(done);
+}}, {delay});
+</script>
+</body></html>
+"""
+
+
+def html(body: str, title="bench"):
+    return f"<!DOCTYPE html>\n<html><head><title>{title}</title></head><body>{body}</body></html>\n"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """合成網站的請求處理。"""
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        route = getattr(self, "page_" + parts.path.strip("/"), None)
+        if route is None:
+            self.send_error(404)
+            return
+        route(query)
+
+    def page_static(self, query):
+        size = int(query.get("size", 4096))
+        self.send_html(html(f"<p>{(FILLER * (size // len(FILLER) + 1))[:size]}</p>", "static"))
+
+    def page_slow(self, query):
+        chunks = int(query.get("chunks", 5))
+        delay = int(query.get("delay", 200)) / 1000
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+        self.wfile.write(b"<!DOCTYPE html>\n<html><head><title>slow</title></head><body>")
+        for i in range(chunks):
+            self.wfile.write(f"<p id='chunk{i}'>{FILLER * 8}</p>".encode())
+            self.wfile.flush()
+            time.sleep(delay)
+        self.wfile.write(b"</body></html>\n")
+
+    def page_js(self, query):
+        self.send_html(JS_PAGE.format(filler=FILLER, delay=int(query.get("delay", 500))))
+
+    def page_actions(self, query):
+        self.send_html(ACTIONS_PAGE.replace("{filler}", FILLER * 4))
+
+    def page_large(self, query):
+        nodes = int(query.get("nodes", 20000))
+        rows = "".join(f"<li class='item' data-i='{i}'><a href='/static?i={i}'>item {i}</a></li>" for i in range(nodes))
+        self.send_html(html(f"<ul>{rows}</ul>", "large"))
+
+    def send_html(self, content: str):
+        data = content.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_site(host="127.0.0.1", port=0):
+    """在背景線程啟動合成網站。
+    Args:
+        host (str): 監聽位址。
+        port (int): 監聽埠，0 表示自動選擇。
+    Returns:
+        ThreadingHTTPServer: 伺服器，`server_address` 為實際的位址與埠。
+    """
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="基準測試用的本機合成網站")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"serving on http://{args.host}:{args.port}")
+    server.serve_forever()
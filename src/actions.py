@@ -0,0 +1,277 @@
+"""以單一頁面腳本執行 actions，供 SeleniumCrawler 與 NodriverCrawler 共用。
+
+一次把多個 action 編譯成一段注入的腳本，在頁面內以 MutationObserver 等待元素，
+省去每個 action 一次以上的協定往返，並回報每個 action 的結果。
+
+兩種 crawler 的 action 語意相同：
+    元素依序以 select (CSS)、xpath、find（包含文字）尋找，三者皆空時為錯誤。
+    located: 等待元素出現。
+    clickable: 等待元素出現、可見且未停用，捲動到畫面中並點擊。
+    input: 等待元素出現，聚焦後在原有內容後附加 value，並觸發 input / change 事件。
+    等待超過 timeout 秒時略過該 action，繼續下一個；其他錯誤則停止並回傳錯誤訊息。
+    不支援的 trigger 會被略過。
+
+點擊可能導航到新頁面，因此每個批次在 clickable 之後結束，下一批次在新頁面中重新注入。
+腳本以 JSON 字串回報結果（nodriver 以 deep serialization 回傳物件，無法直接取得值）；
+沒有回報結果的 action（例如執行環境在導航中被替換）改以 crawler 原本的逐步方式執行，
+已回報的 action 不會重複執行。
+"""
+
+import asyncio
+import json
+
+from data_structures import ActionT
+from deadline import remaining
+from log import get_logger
+
+logger = get_logger(__name__)
+
+TRIGGERS = ("located", "clickable", "input")
+
+# 每個 action 的結果
+DONE = "done"
+TIMEOUT = "timeout"
+ERROR = "error"
+SKIPPED = "skipped"
+FALLBACK = "fallback"
+
+# 接受 steps 列表並回傳 Promise<string>（結果列表的 JSON）的頁面腳本
+ACTIONS_JS = """
+(steps) => new Promise((resolve) => {
+    const byText = (text) => {
+        // 第一個直接包含該文字的元素，與 text_xpath 相同
+        const walker = document.createTreeWalker(document.body || document.documentElement, NodeFilter.SHOW_TEXT);
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            if (node.nodeValue.includes(text)) return node.parentElement;
+        }
+        return null;
+    };
+    const locate = (step) => {
+        if (step.select) return document.querySelector(step.select);
+        if (step.xpath) {
+            return document.evaluate(step.xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        }
+        return byText(step.find);
+    };
+    const usable = (step, el) => {
+        if (!el) return false;
+        if (step.trigger !== "clickable") return true;
+        const rect = el.getBoundingClientRect();
+        const style = getComputedStyle(el);
+        return rect.width > 0 && rect.height > 0 && style.visibility !== "hidden" && !el.disabled;
+    };
+    const check = (step) => {
+        try {
+            const el = locate(step);
+            return usable(step, el) ? {el} : null;
+        } catch (e) {
+            return {error: String(e)};
+        }
+    };
+    const waitFor = (step) => new Promise((done) => {
+        const found = check(step);
+        if (found) return done(found);
+        let observer, timer, poll;
+        const finish = (result) => {
+            observer.disconnect();
+            clearTimeout(timer);
+            clearInterval(poll);
+            done(result);
+        };
+        const recheck = () => {
+            const result = check(step);
+            if (result) finish(result);
+        };
+        observer = new MutationObserver(recheck);
+        observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        // 可見性也可能因 CSS 動畫改變而沒有 DOM 變動
+        poll = setInterval(recheck, 250);
+        timer = setTimeout(() => finish({timeout: true}), step.timeout);
+    });
+    const perform = (step, el) => {
+        if (step.trigger === "clickable") {
+            el.scrollIntoView({block: "center"});
+            el.click();
+        } else if (step.trigger === "input") {
+            el.focus();
+            if ("value" in el) {
+                const proto = Object.getPrototypeOf(el);
+                const setter = Object.getOwnPropertyDescriptor(proto, "value");
+                // 使用原生 setter，讓 React 等框架察覺變更
+                if (setter && setter.set) setter.set.call(el, el.value + step.value);
+                else el.value += step.value;
+            } else {
+                el.textContent += step.value;
+            }
+            el.dispatchEvent(new Event("input", {bubbles: true}));
+            el.dispatchEvent(new Event("change", {bubbles: true}));
+        }
+    };
+    (async () => {
+        const results = [];
+        for (const step of steps) {
+            const started = performance.now();
+            let status = "done";
+            let error = null;
+            if (!step.select && !step.xpath && !step.find) {
+                status = "error";
+                error = "action path is empty";
+            } else {
+                const found = await waitFor(step);
+                if (found.error) {
+                    status = "error";
+                    error = found.error;
+                } else if (found.timeout) {
+                    status = "timeout";
+                } else {
+                    try {
+                        perform(step, found.el);
+                    } catch (e) {
+                        status = "error";
+                        error = String(e);
+                    }
+                }
+            }
+            results.push({index: step.index, trigger: step.trigger, status, error, ms: Math.round(performance.now() - started)});
+            if (status === "error") break;
+        }
+        resolve(JSON.stringify(results));
+    })();
+})
+"""
+
+
+def text_xpath(text: str):
+    """建立尋找包含文字的元素的 XPath，供逐步執行的 find 使用。"""
+    if '"' not in text:
+        literal = f'"{text}"'
+    elif "'" not in text:
+        literal = f"'{text}'"
+    else:
+        literal = "concat(" + ", '\"', ".join(f'"{part}"' for part in text.split('"')) + ")"
+    return f"//*[text()[contains(., {literal})]]"
+
+
+def build_batches(actions: list[ActionT]):
+    """把 actions 分成批次，每個批次在 clickable 之後結束。
+    Returns:
+        list[list[dict]]: 每個批次為傳給 ACTIONS_JS 的 steps。
+    """
+    batches = [[]]
+    for index, action in enumerate(actions):
+        if action.trigger not in TRIGGERS:
+            continue
+        batches[-1].append(
+            {
+                "index": index,
+                "trigger": action.trigger,
+                "select": action.select,
+                "xpath": action.xpath,
+                "find": action.find,
+                "value": action.value,
+                "timeout": int(action.timeout * 1000),
+            }
+        )
+        if action.trigger == "clickable":
+            batches.append([])
+    return [batch for batch in batches if batch]
+
+
+def _results(actions: list[ActionT]):
+    """建立預設的結果列表，不支援的 trigger 標記為 skipped。"""
+    return [
+        {"index": index, "trigger": action.trigger, "status": SKIPPED, "error": None, "ms": 0}
+        for index, action in enumerate(actions)
+    ]
+
+
+def _merge(results: list, outcome, batch: list):
+    """合併腳本回報的結果。
+    Args:
+        results (list): 每個 action 的結果，就地更新。
+        outcome: 腳本回傳的 JSON 字串；腳本執行失敗時為 None。
+        batch (list): 這個批次的 steps。
+    Returns:
+        tuple[str, list]: 發生錯誤時的錯誤訊息（否則為空字串），與沒有回報結果、需要逐步執行的 steps。
+    """
+    reported = set()
+    try:
+        items = json.loads(outcome) if isinstance(outcome, str) else []
+    except ValueError:
+        items = []
+    indexes = {step["index"] for step in batch}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or item.get("index") not in indexes:
+            continue
+        results[item["index"]] = item
+        reported.add(item["index"])
+        if item.get("status") == ERROR:
+            return f"action {item['index']} ({item['trigger']}) 失敗: {item['error']}", []
+    return "", [step for step in batch if step["index"] not in reported]
+
+
+def _batch_timeout(batch: list):
+    """批次腳本的最長執行秒數。"""
+    return sum(step["timeout"] for step in batch) / 1000 + 5
+
+
+def _fallen_back(results: list, batch: list):
+    for step in batch:
+        results[step["index"]]["status"] = FALLBACK
+
+
+def run_actions_selenium(driver, actions: list[ActionT], fallback):
+    """在 Selenium 頁面中執行 actions。
+    Args:
+        driver: Selenium WebDriver。
+        actions (list): actions 列表。
+        fallback: 逐步執行 actions 的函式，接受 actions 列表並回傳錯誤訊息。
+    Returns:
+        tuple[str, list]: 錯誤訊息（沒有錯誤時為空字串）與每個 action 的結果。
+    """
+    results = _results(actions)
+    for batch in build_batches(actions):
+        outcome = None
+        try:
+            driver.set_script_timeout(remaining(_batch_timeout(batch)))
+            outcome = driver.execute_async_script(
+                f"const done = arguments[arguments.length - 1]; ({ACTIONS_JS})(arguments[0]).then(done);",
+                batch,
+            )
+        except Exception as e:
+            logger.debug("批次 actions 執行失敗，改為逐步執行: %s", e)
+        msg, missing = _merge(results, outcome, batch)
+        if not msg and missing:
+            _fallen_back(results, missing)
+            msg = fallback([actions[step["index"]] for step in missing])
+        if msg:
+            return msg, results
+    return "", results
+
+
+async def run_actions_nodriver(tab, actions: list[ActionT], fallback):
+    """在 nodriver 分頁中執行 actions。
+    Args:
+        tab: nodriver 分頁。
+        actions (list): actions 列表。
+        fallback: 逐步執行 actions 的 async 函式，接受 actions 列表並回傳錯誤訊息。
+    Returns:
+        tuple[str, list]: 錯誤訊息（沒有錯誤時為空字串）與每個 action 的結果。
+    """
+    results = _results(actions)
+    for batch in build_batches(actions):
+        outcome = None
+        try:
+            outcome = await asyncio.wait_for(
+                tab.evaluate(f"({ACTIONS_JS})({json.dumps(batch)})", await_promise=True, return_by_value=True),
+                _batch_timeout(batch),
+            )
+        except Exception as e:
+            logger.debug("批次 actions 執行失敗，改為逐步執行: %s", e)
+        msg, missing = _merge(results, outcome, batch)
+        if not msg and missing:
+            _fallen_back(results, missing)
+            msg = await fallback([actions[step["index"]] for step in missing])
+        if msg:
+            return msg, results
+    return "", results
@@ -1,27 +1,167 @@
 """
 這個 Python 腳本使用 FastAPI 建立了一個 Web API，用來抓取網頁數據。
 
-API 提供一個 `/v1` 端點，接受 POST 請求，請求體需包含抓取目標網頁的相關資訊。
+API 提供 `/v1` 與 `/v2` 端點，接受 POST 請求，請求體需包含抓取目標網頁的相關資訊。
 伺服器會使用 Crawler 抓取指定網頁的數據，並將結果以 JSON 格式返回。
+`/v1/batch` 與 `/v2/batch` 接受多個請求，並在每個請求完成時以 NDJSON 逐行回傳。
 
-程式碼使用了線程鎖，確保多線程環境下對 Crawler 的安全訪問。
+`/v1` 使用 SeleniumPool 驅動池，可同時以多個瀏覽器處理請求；
+`/v2` 使用 NodriverCrawler，在同一個瀏覽器中以多個分頁同時處理請求；
+帶有 session_id 的請求使用具名工作階段的瀏覽器情境，只支援 `/v2`。
+`/v3` 依各網域的統計自動選擇 HTTP、nodriver 或 Selenium，失敗時改用下一個後端。
+設定 WORKERS 時，瀏覽器改由多個 worker 行程持有，本行程只負責派發請求。
 """
 
-import json
-import threading
+import asyncio
+import base64
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from data_structures import V1RequestBase, V1ResponseBase
+import metrics
+import msgspec
+import orjson
+import spool
+from browser_lifecycle import BrowserLifecycleManager
+from browser_sessions import SessionLimitError
+from change_store import ChangeStore, change_key, client_is_current, content_hash, is_conditional
+from compression import CompressionMiddleware
+from cookie_jar import CookieJar
+from data_structures import (
+    CrawlOptionsT,
+    DecodeError,
+    SolutionResultT,
+    V1RequestBase,
+    V1ResponseBase,
+    ValidationError,
+    convert,
+    decode_request,
+    encode,
+    to_builtins,
+)
+from deadline import DeadlineExceeded, run_in_executor, start_deadline, timeout_solution
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from selenium_crawler import SeleniumCrawler
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from http_crawler import HttpCrawler
+from job_queue import JobQueue
+from log import bind_request, get_logger, setup_logging
 from nodriver_crawler import NodriverCrawler
+from response_cache import ResponseCache
+from router import BackendRouter, BrowserBackend, HttpBackend, RouterStats, success_rate
+from screenshot import FORMATS, ScreenshotStore
+from selenium_pool import PoolTimeoutError, SeleniumPool
+from site_crawl import SiteCrawl
+from workers import WorkerPool
+
+# Selenium 驅動池設定
+SELENIUM_POOL_SIZE = int(os.environ.get("SELENIUM_POOL_SIZE", "1"))
+SELENIUM_QUEUE_SIZE = int(os.environ.get("SELENIUM_QUEUE_SIZE", "16"))
+SELENIUM_QUEUE_TIMEOUT = float(os.environ.get("SELENIUM_QUEUE_TIMEOUT", "30"))
+# Nodriver 分頁設定
+NODRIVER_MAX_TABS = int(os.environ.get("NODRIVER_MAX_TABS", "4"))
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "16"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "600"))
+# worker 行程設定，0 表示在 API 行程中抓取，"auto" 表示與 CPU 核心數相同
+WORKERS = os.environ.get("WORKERS", "0")
+WORKERS = (os.cpu_count() or 1) if WORKERS == "auto" else int(WORKERS)
+WORKER_MAX_REQUEUES = int(os.environ.get("WORKER_MAX_REQUEUES", "2"))
+# 所有 worker 合計可同時處理的請求數
+SELENIUM_CAPACITY = SELENIUM_POOL_SIZE * max(WORKERS, 1)
+NODRIVER_CAPACITY = NODRIVER_MAX_TABS * max(WORKERS, 1)
+# 回應快取設定
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "0"))
+RESPONSE_CACHE_MAX_MB = int(os.environ.get("RESPONSE_CACHE_MAX_MB", "256"))
+RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR", "")
+RESPONSE_CACHE_DISK_MAX_MB = int(os.environ.get("RESPONSE_CACHE_DISK_MAX_MB", "1024"))
+# cookie jar 設定
+COOKIE_JAR_FILE = os.environ.get("COOKIE_JAR_FILE", "cookies.json")
+COOKIE_JAR_FLUSH_INTERVAL = float(os.environ.get("COOKIE_JAR_FLUSH_INTERVAL", "5"))
+# 條件式重新抓取的變更紀錄設定
+CHANGE_STORE_FILE = os.environ.get("CHANGE_STORE_FILE", "changes.json")
+CHANGE_STORE_SIZE = int(os.environ.get("CHANGE_STORE_SIZE", "100000"))
+# 預設封鎖的資源，格式同 V1RequestBase.block_resources
+BLOCK_RESOURCES = os.environ.get("BLOCK_RESOURCES", "")
+# HTTP 快速路徑設定，FAST_PATH 為請求沒有指定 fast_path 時的預設值
+FAST_PATH = os.environ.get("FAST_PATH", "false").lower() == "true"
+FAST_PATH_MAX_CONNECTIONS = int(os.environ.get("FAST_PATH_MAX_CONNECTIONS", "100"))
+FAST_PATH_MEMORY_TTL = int(os.environ.get("FAST_PATH_MEMORY_TTL", "3600"))
+# 截圖暫存區設定
+SCREENSHOT_STORE_MAX_MB = int(os.environ.get("SCREENSHOT_STORE_MAX_MB", "256"))
+SCREENSHOT_STORE_TTL = int(os.environ.get("SCREENSHOT_STORE_TTL", "600"))
+# 大型網頁暫存設定，MAX_RESPONSE_BYTES 為請求沒有指定 max_response_bytes 時的預設值
+RESPONSE_SPOOL_BYTES = int(os.environ.get("RESPONSE_SPOOL_BYTES", str(1024 * 1024)))
+RESPONSE_SPOOL_DIR = os.environ.get("RESPONSE_SPOOL_DIR", "")
+MAX_RESPONSE_BYTES = int(os.environ.get("MAX_RESPONSE_BYTES", "0"))
+# 回應壓縮設定
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+# 工作佇列設定
+JOB_DB = os.environ.get("JOB_DB", "jobs.db")
+JOB_MAX_RUNNING = int(os.environ.get("JOB_MAX_RUNNING", str(SELENIUM_CAPACITY + NODRIVER_CAPACITY)))
+JOB_DOMAIN_LIMIT = int(os.environ.get("JOB_DOMAIN_LIMIT", "2"))
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", "86400"))
+# /v3 路由統計設定
+ROUTER_STATS_FILE = os.environ.get("ROUTER_STATS_FILE", "router_stats.json")
+ROUTER_HALF_LIFE = float(os.environ.get("ROUTER_HALF_LIFE", "3600"))
+ROUTER_MIN_SUCCESS = float(os.environ.get("ROUTER_MIN_SUCCESS", "0.5"))
+# 整站抓取設定
+CRAWL_FRONTIER_MEMORY = int(os.environ.get("CRAWL_FRONTIER_MEMORY", "10000"))
+CRAWL_SEEN_EXACT_LIMIT = int(os.environ.get("CRAWL_SEEN_EXACT_LIMIT", "200000"))
+# 瀏覽器生命週期設定
+BROWSER_MAX_REQUESTS = int(os.environ.get("BROWSER_MAX_REQUESTS", "0"))
+BROWSER_MAX_RSS_MB = int(os.environ.get("BROWSER_MAX_RSS_MB", "0"))
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", "30"))
+
+setup_logging()
+logger = get_logger(__name__)
+spool.configure(RESPONSE_SPOOL_BYTES, RESPONSE_SPOOL_DIR)
 
 # 建立 FastAPI 應用程式實例
 app = FastAPI()
-nodcrawl = NodriverCrawler()
-selcrawl = SeleniumCrawler()
-crawl_lock = threading.Lock()
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+cookie_jar = CookieJar(COOKIE_JAR_FILE, COOKIE_JAR_FLUSH_INTERVAL)
+nodcrawl = NodriverCrawler(NODRIVER_MAX_TABS, cookie_jar, BROWSER_MAX_REQUESTS, SESSION_MAX, SESSION_TTL)
+selpool = SeleniumPool(SELENIUM_POOL_SIZE, SELENIUM_QUEUE_SIZE, SELENIUM_QUEUE_TIMEOUT, cookie_jar, BROWSER_MAX_REQUESTS)
+# Selenium 為同步 API，在專用的線程池中執行，避免阻塞事件迴圈；
+# 線程數包含等待佇列，讓排隊的請求不會佔用其他工作的線程
+selenium_executor = ThreadPoolExecutor(
+    max_workers=SELENIUM_POOL_SIZE + SELENIUM_QUEUE_SIZE,
+    thread_name_prefix="selenium",
+)
+# 瀏覽器在啟動時預熱，並定期檢查與回收
+lifecycle = BrowserLifecycleManager(selpool, nodcrawl, selenium_executor, HEALTH_CHECK_INTERVAL, BROWSER_MAX_RSS_MB)
+response_cache = ResponseCache(
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_DISK_MAX_MB * 1024 * 1024,
+)
+change_store = ChangeStore(CHANGE_STORE_FILE, CHANGE_STORE_SIZE, COOKIE_JAR_FLUSH_INTERVAL)
+router_stats = RouterStats(ROUTER_STATS_FILE, ROUTER_HALF_LIFE, flush_interval=COOKIE_JAR_FLUSH_INTERVAL)
+screenshot_store = ScreenshotStore(SCREENSHOT_STORE_MAX_MB * 1024 * 1024, SCREENSHOT_STORE_TTL)
+http_crawler = HttpCrawler(cookie_jar, FAST_PATH_MAX_CONNECTIONS, FAST_PATH_MEMORY_TTL)
+# worker 模式下由 worker 行程持有瀏覽器，API 行程的 selpool / nodcrawl 不會啟動
+worker_pool = None
+if WORKERS:
+    worker_pool = WorkerPool(
+        WORKERS,
+        {
+            "selenium_pool_size": SELENIUM_POOL_SIZE,
+            "selenium_queue_size": SELENIUM_QUEUE_SIZE,
+            "selenium_queue_timeout": SELENIUM_QUEUE_TIMEOUT,
+            "nodriver_max_tabs": NODRIVER_MAX_TABS,
+            "cookie_jar_file": COOKIE_JAR_FILE,
+            "cookie_jar_flush_interval": COOKIE_JAR_FLUSH_INTERVAL,
+            "browser_max_requests": BROWSER_MAX_REQUESTS,
+            "browser_max_rss_mb": BROWSER_MAX_RSS_MB,
+            "health_check_interval": HEALTH_CHECK_INTERVAL,
+            "session_max": SESSION_MAX,
+            "session_ttl": SESSION_TTL,
+            "spool_bytes": RESPONSE_SPOOL_BYTES,
+            "spool_dir": RESPONSE_SPOOL_DIR,
+        },
+        WORKER_MAX_REQUEUES,
+    )
 
 
 # 定義根路由
@@ -30,43 +170,456 @@ async def root():
     """
     根路由處理函式，回應預設的 V1ResponseBase 物件。
     """
-    return V1ResponseBase()
+    return Response(encode(V1ResponseBase()), media_type="application/json")
 
-@app.post("/v1")
-async def api_v1(request: Request):
+async def store_screenshot(req: V1RequestBase, solution: SolutionResultT):
+    """screenshot_mode 為 "url" 時，把截圖移到截圖暫存區，回應只帶下載網址。"""
+    if req.screenshot_mode != "url" or solution is None or not solution.screenshot_base64:
+        return
+    # base64 解碼可能有數 MB，在線程中執行
+    data = await asyncio.to_thread(base64.b64decode, solution.screenshot_base64)
+    screenshot_id = screenshot_store.put(data, FORMATS.get(req.screenshot_format, "image/png"))
+    solution.screenshot_url = f"/screenshots/{screenshot_id}"
+    solution.screenshot_base64 = None
+
+
+async def fetch_worker(backend: str, req: V1RequestBase):
+    """交給 worker 行程抓取，並把 worker 記錄的階段耗時加入目前請求。
+    瀏覽器取得的 cookies 也寫入 API 行程的 cookie jar，讓 HTTP 快速路徑使用。
     """
-    處理 `/v1` 路由的 POST 請求，使用 SeleniumCrawler 抓取網頁。
+    solution, phases = await worker_pool.submit(backend, req)
+    # 工作階段的 cookies 不寫入共用的 cookie jar
+    if solution.cookies and req.session_id is None:
+        cookie_jar.update(solution.cookies)
+    timings = metrics.current_timings()
+    if timings is not None:
+        for name, ms in phases.items():
+            timings.add(name, ms / 1000)
+    return solution
+
+
+async def fetch_selenium(req: V1RequestBase):
+    """以 SeleniumPool 抓取網頁，worker 模式下交給 worker 行程。
+    Raises:
+        PoolTimeoutError: 等待佇列已滿，或等待可用瀏覽器逾時。
+    """
+    if worker_pool is not None:
+        return await fetch_worker("v1", req)
+    # 在專用線程池中從驅動池取出 SeleniumCrawler 抓取網頁；
+    # 複製 context 讓線程中的階段計時與期限沿用同一個物件
+    with selpool.admit():
+        return await run_in_executor(selenium_executor, selpool.get, req)
+
+
+def fetch_nodriver(req: V1RequestBase):
+    """以 NodriverCrawler 抓取網頁，worker 模式下交給 worker 行程。"""
+    if worker_pool is not None:
+        return fetch_worker("v2", req)
+    return nodcrawl.get(req)
+
 
+async def fetch(req: V1RequestBase, fetch_browser):
+    """fast_path 開啟時先以 HTTP 抓取，需要時才使用瀏覽器。fast_path 須已由 crawl_v1 / crawl_v2 決定。
     Args:
-        request (Request): FastAPI 請求物件。
+        req (V1RequestBase): 包含請求資訊的物件。
+        fetch_browser: fetch_selenium 或 fetch_nodriver。
+    Returns:
+        SolutionResultT: 包含網頁資訊的結果物件。
+    """
+    if req.fast_path:
+        solution = await http_crawler.get(req)
+        if solution is not None:
+            return solution
+    solution = await fetch_browser(req)
+    # 之後的 HTTP 請求使用與瀏覽器相同的 User-Agent
+    http_crawler.remember_user_agent(solution.user_agent)
+    return solution
+
 
+async def fetch_changes(namespace: str, req: V1RequestBase, fetcher):
+    """經過回應快取抓取網頁並更新變更紀錄，條件式請求的內容未變更時回傳不含內容的結果。
+    Args:
+        namespace (str): "v1"、"v2" 或 "v3"。
+        req (V1RequestBase): 包含請求資訊的物件。
+        fetcher: `async (V1RequestBase) -> SolutionResultT` 的抓取函式。
+    Returns:
+        tuple[SolutionResultT, str, bool]: 結果、快取狀態與內容是否未變更。
+    """
+    key = change_key(req)
+    etag = last_modified = None
+    if is_conditional(req):
+        entry = change_store.get(key)
+        if client_is_current(req, entry) and (entry["etag"] or entry["last_modified"]):
+            # 客戶端的版本與紀錄相同，先以 HEAD 探測，伺服器回應 304 時不需要瀏覽器；
+            # 沒有驗證標頭時伺服器無法回應 304，不送出探測
+            probe = await http_crawler.probe(req, entry["etag"], entry["last_modified"])
+            if probe is not None and probe.status_code == 304:
+                metrics.CONDITIONAL.labels("not_modified").inc()
+                return unchanged_solution(req, entry), None, True
+            if probe is not None and probe.status_code == 200:
+                etag, last_modified = probe.headers.get("etag"), probe.headers.get("last-modified")
+
+    solution, cache_status = await response_cache.fetch(namespace, req, lambda: fetcher(req))
+    if solution.status != 200:
+        return solution, cache_status, False
+    # 網頁可能有數 MB，在線程中計算雜湊
+    digest = await asyncio.to_thread(content_hash, solution)
+    if digest is None:
+        return solution, cache_status, False
+    if etag is None and last_modified is None and isinstance(solution.headers, dict):
+        # 快速路徑的回應本身帶有驗證標頭
+        etag, last_modified = solution.headers.get("etag"), solution.headers.get("last-modified")
+    entry = change_store.record(key, digest, etag, last_modified)
+    solution.content_hash = digest
+    solution.changed_at = entry["changed_at"]
+    if not is_conditional(req):
+        return solution, cache_status, False
+    if client_is_current(req, entry):
+        metrics.CONDITIONAL.labels("unchanged").inc()
+        return unchanged_solution(req, entry), cache_status, True
+    metrics.CONDITIONAL.labels("changed").inc()
+    return solution, cache_status, False
+
+
+def unchanged_solution(req: V1RequestBase, entry: dict):
+    """內容未變更時的結果，只帶內容雜湊與最後變更時間。"""
+    return SolutionResultT(url=req.url, status=304, content_hash=entry["hash"], changed_at=entry["changed_at"])
+
+
+async def run_crawl(req: V1RequestBase, namespace: str, backend: str, fetcher, busy_errors: tuple, res=None):
+    """crawl_v1 / crawl_v2 / crawl_v3 共用的流程：預設值、request_id、計時、期限、回應快取與截圖。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+        namespace (str): 回應快取與變更紀錄的名稱，"v1"、"v2" 或 "v3"。
+        backend (str): 計時與指標使用的後端名稱。
+        fetcher: `async (V1RequestBase) -> SolutionResultT` 的抓取函式。
+        busy_errors (tuple): 代表後端忙碌的例外，記錄為 503 後重新拋出。
+        res (V1ResponseBase): 抓取函式需要寫入欄位時由呼叫端建立的回應物件。
     Returns:
         V1ResponseBase: 包含抓取結果的回應物件。
     """
+    if req.block_resources is None:
+        req.block_resources = BLOCK_RESOURCES
+    if req.max_response_bytes is None:
+        req.max_response_bytes = MAX_RESPONSE_BYTES
+
+    # 建立回應物件
+    if res is None:
+        res = V1ResponseBase()
+    res.request_id = bind_request(req)
+    timings = metrics.start_timings(backend)
+    deadline = start_deadline(req.max_timeout / 1000)
+
     try:
-        # 從請求體中讀取 JSON 資料
-        data_str = await request.body()
-        data = json.loads(data_str.decode())
+        res.solution, res.cache_status, unchanged = await fetch_changes(namespace, req, fetcher)
+    except busy_errors:
+        timings.finish(503)
+        raise
+    except DeadlineExceeded as e:
+        # 超過期限時回報用完時間的階段
+        metrics.deadline_exceeded(e.phase)
+        res.solution, unchanged = timeout_solution(req, e), False
+    except asyncio.CancelledError:
+        # 客戶端中斷連線
+        timings.finish(499)
+        raise
+    except Exception:
+        timings.finish(500)
+        raise
+    deadline.finish()
+    if unchanged:
+        res.status = "unchanged"
+    else:
+        await store_screenshot(req, res.solution)
 
-        # 建立請求物件
-        req = V1RequestBase(data)
+    # 設定回應時間戳
+    res.end_timestamp = int(time.time() * 1000)
+    res.timings = timings.finish(res.solution.status, res.cache_status)
+    log_response(req, res)
+    return res
+
+
+async def crawl_v1(req: V1RequestBase):
+    """使用 SeleniumCrawler 抓取網頁。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        V1ResponseBase: 包含抓取結果的回應物件。
+    Raises:
+        PoolTimeoutError: 等待可用瀏覽器逾時。
+        ValueError: 請求帶有 session_id。
+    """
+    if req.session_id is not None:
+        # Selenium 的 WebDriver 綁定在單一瀏覽器情境，無法切換到工作階段的情境
+        raise ValueError("session_id is only supported by the v2 (nodriver) backend")
+    # 快速路徑改變取得的內容，在計算快取鍵前決定
+    if req.fast_path is None:
+        req.fast_path = FAST_PATH
+    # 從驅動池取出 SeleniumCrawler 抓取網頁，結果經過回應快取
+    fetcher = partial(fetch, fetch_browser=fetch_selenium)
+    return await run_crawl(req, "v1", "selenium", fetcher, (PoolTimeoutError,))
+
+
+async def crawl_v2(req: V1RequestBase):
+    """使用 NodriverCrawler 抓取網頁。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        V1ResponseBase: 包含抓取結果的回應物件。
+    Raises:
+        SessionLimitError: 工作階段數量已達上限，且都在使用中。
+    """
+    if req.fast_path is None:
+        req.fast_path = FAST_PATH
+    # 使用 NodriverCrawler 抓取網頁，同時處理的分頁數由 NODRIVER_MAX_TABS 限制，結果經過回應快取
+    fetcher = partial(fetch, fetch_browser=fetch_nodriver)
+    return await run_crawl(req, "v2", "nodriver", fetcher, (SessionLimitError,))
+
+
+# /v3 的後端依成本排序：HTTP 最便宜，nodriver 在共用瀏覽器中開分頁，Selenium 每個請求佔用一個瀏覽器
+router = BackendRouter(
+    [
+        HttpBackend(http_crawler),
+        BrowserBackend("nodriver", 2, fetch_nodriver, sessions=True),
+        BrowserBackend("selenium", 3, fetch_selenium),
+    ],
+    router_stats,
+    ROUTER_MIN_SUCCESS,
+)
+
+
+async def crawl_v3(req: V1RequestBase):
+    """依網域統計選擇後端抓取網頁，失敗時改用下一個後端。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        V1ResponseBase: 包含抓取結果的回應物件，backend 為提供結果的後端（快取命中時為 None）。
+    Raises:
+        PoolTimeoutError: 所有瀏覽器後端都在忙碌。
+        SessionLimitError: 工作階段數量已達上限，且都在使用中。
+        ValueError: 沒有後端可以處理請求。
+    """
+    res = V1ResponseBase()
+
+    async def route(req: V1RequestBase):
+        solution, res.backend = await router.fetch(req)
+        if res.backend != "http":
+            # 之後的 HTTP 請求使用與瀏覽器相同的 User-Agent
+            http_crawler.remember_user_agent(solution.user_agent)
+        return solution
+
+    # 依序嘗試後端，結果經過回應快取
+    return await run_crawl(req, "v3", "router", route, (PoolTimeoutError, SessionLimitError), res)
 
-        # 建立回應物件
-        res = V1ResponseBase()
 
-        with crawl_lock:  # 獲取鎖
-            # 使用 SeleniumCrawler 抓取網頁
-            res.solution = selcrawl.get(req)
+def log_response(req: V1RequestBase, res: V1ResponseBase):
+    """記錄請求結果。"""
+    logger.info(
+        "%s status=%s cache=%s total=%sms",
+        req.url,
+        res.solution.status,
+        res.cache_status,
+        res.timings.get("total"),
+    )
 
-        # 設定回應時間戳
-        res.end_timestamp = int(time.time() * 1000)
 
-        # 回傳回應物件
-        return res
-    except json.JSONDecodeError:
+def render(res: V1ResponseBase):
+    """以 orjson 把回應直接編碼為 bytes，並把編碼時間加入 timings。
+    網頁在暫存檔中時以 StreamingResponse 分段送出內容。
+    """
+    with metrics.phase("serialize"):
+        # 先編碼內容最大的 solution，其餘欄位（含 serialize 耗時）之後再編碼
+        solution = encode(spool.strip(res.solution))
+    envelope = encode(msgspec.structs.replace(res, solution=None))
+    # 其他字串欄位中的引號都經過跳脫，"solution":null 只會是 solution 欄位，不依賴欄位順序
+    head, _, tail = envelope.rpartition(b'"solution":null')
+    content = head + b'"solution":' + solution + tail
+    if spool.is_spooled(res.solution):
+        return StreamingResponse(spool.json_chunks(content, res.solution), media_type="application/json")
+    return Response(content, media_type="application/json")
+
+
+async def wait_disconnected(request: Request):
+    """等待客戶端中斷連線，請求體須已讀取完畢。"""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def respond(request: Request, crawl):
+    """執行抓取並編碼回應，客戶端在完成前中斷連線時取消抓取，讓瀏覽器不再為已離開的客戶端工作。
+    Args:
+        request (Request): FastAPI 請求物件，請求體已讀取。
+        crawl: crawl_v1(req) 等抓取的 coroutine。
+    Returns:
+        Response: 編碼後的回應；客戶端已中斷連線時為 499。
+    """
+
+    async def run():
+        return render(await crawl)
+
+    task = asyncio.create_task(run())
+    watcher = asyncio.create_task(wait_disconnected(request))
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        task.cancel()
+    if not task.done():
+        metrics.DISCONNECTS.inc()
+        logger.info("客戶端中斷連線，取消抓取: %s", request.url.path)
+        return Response(status_code=499)
+    return task.result()
+
+
+def encode_line(res: V1ResponseBase, **extra):
+    """把回應編碼為一行 NDJSON，網頁在暫存檔中時分段產生。
+    Args:
+        res (V1ResponseBase): 回應物件。
+        extra: 加在回應後面的欄位，例如 index。
+    Returns:
+        Iterable[bytes]: 一行 JSON 的片段。
+    """
+    line = to_builtins(msgspec.structs.replace(res, solution=spool.strip(res.solution)))
+    line.update(extra)
+    return spool.json_chunks(orjson.dumps(line) + b"\n", res.solution)
+
+
+async def stream_batch(payloads: list, crawl, capacity: int):
+    """同時抓取多個請求，每完成一個就輸出一行 NDJSON。
+    Args:
+        payloads (list): V1RequestBase 的資料（dict）列表。
+        crawl: crawl_v1 或 crawl_v2。
+        capacity (int): 同時抓取的數量上限。
+    Yields:
+        bytes: 一行 JSON，內容為 V1ResponseBase 加上請求在列表中的 index。
+    """
+    semaphore = asyncio.Semaphore(capacity)
+
+    async def run(index, data):
+        async with semaphore:
+            try:
+                res = await crawl(convert(data))
+            except Exception as e:
+                res = V1ResponseBase(status="error", message=str(e))
+        return index, res
+
+    tasks = [asyncio.create_task(run(index, data)) for index, data in enumerate(payloads)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, res = await next_done
+            for chunk in encode_line(res, index=index):
+                yield chunk
+    finally:
+        # 客戶端中斷連線時取消尚未完成的請求
+        for task in tasks:
+            task.cancel()
+
+
+async def read_batch(request: Request):
+    """讀取批次請求，接受 JSON 列表或 {"requests": [...]}。"""
+    data = msgspec.json.decode(await request.body())
+    if isinstance(data, dict):
+        data = data.get("requests", [])
+    if not isinstance(data, list):
+        raise DecodeError("batch body must be a list")
+    return data
+
+
+async def crawl_v1_safe(req: V1RequestBase):
+    """給工作佇列使用的 crawl_v1，等待可用瀏覽器逾時時重新等待，不讓工作失敗。"""
+    while True:
+        try:
+            return await crawl_v1(req)
+        except PoolTimeoutError:
+            await asyncio.sleep(1)
+
+
+async def stream_site_crawl(site_crawl: SiteCrawl):
+    """整站抓取，每完成一個頁面就輸出一行 NDJSON，最後輸出一行統計。
+    Yields:
+        bytes: 一行 JSON，內容為 V1ResponseBase 加上頁面的 index 與 depth。
+    """
+    index = 0
+    async for depth, res in site_crawl.run():
+        for chunk in encode_line(res, index=index, depth=depth):
+            yield chunk
+        index += 1
+    yield orjson.dumps(site_crawl.summary()) + b"\n"
+
+
+job_queue = JobQueue(
+    JOB_DB,
+    {"v1": crawl_v1_safe, "v2": crawl_v2, "v3": crawl_v3},
+    JOB_MAX_RUNNING,
+    JOB_DOMAIN_LIMIT,
+    JOB_RETENTION,
+)
+
+# 等待中的請求數，在 /metrics 被讀取時計算
+metrics.QUEUE_DEPTH.labels("selenium").set_function(lambda: selpool.waiting)
+metrics.QUEUE_DEPTH.labels("nodriver").set_function(lambda: nodcrawl.waiting)
+metrics.QUEUE_DEPTH.labels("jobs").set_function(job_queue.queued)
+if worker_pool is not None:
+    metrics.QUEUE_DEPTH.labels("workers").set_function(lambda: worker_pool.in_flight)
+
+
+@app.on_event("startup")
+async def startup():
+    """預熱瀏覽器（或啟動 worker 行程），啟動 cookie jar、變更紀錄、路由統計的批次寫入與工作佇列排程器。"""
+    if worker_pool is not None:
+        await worker_pool.start()
+    else:
+        await lifecycle.start()
+    await cookie_jar.start()
+    await change_store.start()
+    await router_stats.start()
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """停止工作佇列排程器，寫入 cookie jar、變更紀錄與路由統計的最後變更並關閉瀏覽器。"""
+    await job_queue.stop()
+    await cookie_jar.stop()
+    await change_store.stop()
+    await router_stats.stop()
+    if worker_pool is not None:
+        await worker_pool.stop()
+    else:
+        await lifecycle.stop()
+    await http_crawler.close()
+
+
+@app.post("/v1")
+async def api_v1(request: Request):
+    """
+    處理 `/v1` 路由的 POST 請求，使用 SeleniumCrawler 抓取網頁。
+
+    Args:
+        request (Request): FastAPI 請求物件。
+
+    Returns:
+        V1ResponseBase: 包含抓取結果的回應物件。
+    """
+    try:
+        # 從請求體中解碼並驗證請求物件
+        req = decode_request(await request.body())
+    except ValidationError as e:
+        # 欄位型別錯誤
+        return JSONResponse({"error": f"無效的請求資料: {e}"}, status_code=400)
+    except DecodeError:
         # 如果請求體不是有效的 JSON 資料，則回傳錯誤訊息
         return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
 
+    try:
+        # 抓取網頁
+        return await respond(request, crawl_v1(req))
+    except PoolTimeoutError as e:
+        # 沒有可用的瀏覽器，回傳服務忙碌
+        return JSONResponse({"error": str(e)}, status_code=503)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
 
 @app.post("/v2")
 async def api_v2(request: Request):
@@ -80,29 +633,240 @@ async def api_v2(request: Request):
         V1ResponseBase: 包含抓取結果的回應物件。
     """
     try:
-        # 從請求體中讀取 JSON 資料
-        data_str = await request.body()
-        data = json.loads(data_str.decode())
+        # 從請求體中解碼並驗證請求物件
+        req = decode_request(await request.body())
+    except ValidationError as e:
+        # 欄位型別錯誤
+        return JSONResponse({"error": f"無效的請求資料: {e}"}, status_code=400)
+    except DecodeError:
+        # 如果請求體不是有效的 JSON 資料，則回傳錯誤訊息
+        return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
 
-        # 建立請求物件
-        req = V1RequestBase(data)
+    try:
+        # 抓取網頁
+        return await respond(request, crawl_v2(req))
+    except SessionLimitError as e:
+        # 工作階段都在使用中，回傳服務忙碌
+        return JSONResponse({"error": str(e)}, status_code=503)
+
+
+@app.post("/v1/batch")
+async def api_v1_batch(request: Request):
+    """
+    處理 `/v1/batch` 路由的 POST 請求，以 SeleniumCrawler 抓取多個網頁，並以 NDJSON 串流回傳。
+
+    Args:
+        request (Request): FastAPI 請求物件。
+
+    Returns:
+        StreamingResponse: 每完成一個請求輸出一行 V1ResponseBase。
+    """
+    try:
+        payloads = await read_batch(request)
+    except DecodeError:
+        return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
+    return StreamingResponse(stream_batch(payloads, crawl_v1, SELENIUM_CAPACITY), media_type="application/x-ndjson")
 
-        # 建立回應物件
-        res = V1ResponseBase()
 
-        with crawl_lock:  # 獲取鎖
-            # 使用 NodriverCrawler 抓取網頁
-            res.solution = await nodcrawl.get(req)
+@app.post("/v2/batch")
+async def api_v2_batch(request: Request):
+    """
+    處理 `/v2/batch` 路由的 POST 請求，以 NodriverCrawler 抓取多個網頁，並以 NDJSON 串流回傳。
+
+    Args:
+        request (Request): FastAPI 請求物件。
+
+    Returns:
+        StreamingResponse: 每完成一個請求輸出一行 V1ResponseBase。
+    """
+    try:
+        payloads = await read_batch(request)
+    except DecodeError:
+        return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
+    return StreamingResponse(stream_batch(payloads, crawl_v2, NODRIVER_CAPACITY), media_type="application/x-ndjson")
 
-        # 設定回應時間戳
-        res.end_timestamp = int(time.time() * 1000)
 
-        # 回傳回應物件
-        return res
-    except json.JSONDecodeError:
+@app.post("/v3")
+async def api_v3(request: Request):
+    """
+    處理 `/v3` 路由的 POST 請求，依網域統計選擇 HTTP、nodriver 或 Selenium 抓取網頁。
+
+    Args:
+        request (Request): FastAPI 請求物件。
+
+    Returns:
+        V1ResponseBase: 包含抓取結果與所用後端的回應物件。
+    """
+    try:
+        # 從請求體中解碼並驗證請求物件
+        req = decode_request(await request.body())
+    except ValidationError as e:
+        # 欄位型別錯誤
+        return JSONResponse({"error": f"無效的請求資料: {e}"}, status_code=400)
+    except DecodeError:
         # 如果請求體不是有效的 JSON 資料，則回傳錯誤訊息
         return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
 
+    try:
+        # 抓取網頁
+        return await respond(request, crawl_v3(req))
+    except (PoolTimeoutError, SessionLimitError) as e:
+        # 所有後端都在忙碌，回傳服務忙碌
+        return JSONResponse({"error": str(e)}, status_code=503)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+@app.post("/v3/batch")
+async def api_v3_batch(request: Request):
+    """
+    處理 `/v3/batch` 路由的 POST 請求，依網域統計選擇後端抓取多個網頁，並以 NDJSON 串流回傳。
+
+    Args:
+        request (Request): FastAPI 請求物件。
+
+    Returns:
+        StreamingResponse: 每完成一個請求輸出一行 V1ResponseBase。
+    """
+    try:
+        payloads = await read_batch(request)
+    except DecodeError:
+        return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
+    capacity = SELENIUM_CAPACITY + NODRIVER_CAPACITY
+    return StreamingResponse(stream_batch(payloads, crawl_v3, capacity), media_type="application/x-ndjson")
+
+
+@app.get("/v3/stats")
+async def api_v3_stats(domain: str = None):
+    """
+    處理 `/v3/stats` 路由的 GET 請求，回傳各網域與後端衰減後的統計與估計成功率。
+
+    Args:
+        domain (str): 只回傳此網域的統計。
+
+    Returns:
+        JSONResponse: 網域對應到各後端統計的物件。
+    """
+    stats = router_stats.snapshot(domain)
+    for backends in stats.values():
+        for entry in backends.values():
+            entry["success_rate"] = round(success_rate(entry), 4)
+    return Response(orjson.dumps(stats), media_type="application/json")
+
+
+@app.post("/crawl")
+async def api_crawl(request: Request):
+    """
+    處理 `/crawl` 路由的 POST 請求，從請求的網址開始沿著連結抓取整個網站，並以 NDJSON 串流回傳。
+
+    請求體為 V1RequestBase 的 JSON 資料，另可指定 CrawlOptionsT 的欄位：`backend`（"v1"、"v2" 或 "v3"，預設 "v2"）、
+    `max_depth`、`max_pages`、`scope`（"domain" 或 "host"）與 `concurrency`。
+
+    Args:
+        request (Request): FastAPI 請求物件。
+
+    Returns:
+        StreamingResponse: 每完成一個頁面輸出一行 V1ResponseBase，最後一行為統計。
+    """
+    try:
+        data = msgspec.json.decode(await request.body())
+        options = {name: data.pop(name) for name in CrawlOptionsT.__struct_fields__ if name in data}
+        options = convert(options, CrawlOptionsT)
+        if options.backend == "v1":
+            crawl, capacity = crawl_v1_safe, SELENIUM_CAPACITY
+        elif options.backend == "v2":
+            crawl, capacity = crawl_v2, NODRIVER_CAPACITY
+        elif options.backend == "v3":
+            crawl, capacity = crawl_v3, SELENIUM_CAPACITY + NODRIVER_CAPACITY
+        else:
+            raise ValueError("backend must be v1, v2 or v3")
+        options.concurrency = min(options.concurrency or capacity, capacity)
+        site_crawl = SiteCrawl(convert(data), crawl, options, CRAWL_FRONTIER_MEMORY, CRAWL_SEEN_EXACT_LIMIT)
+    except ValidationError as e:
+        return JSONResponse({"error": f"無效的請求資料: {e}"}, status_code=400)
+    except DecodeError:
+        return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return StreamingResponse(stream_site_crawl(site_crawl), media_type="application/x-ndjson")
+
+
+@app.post("/jobs")
+async def api_jobs_submit(request: Request):
+    """
+    處理 `/jobs` 路由的 POST 請求，將抓取請求加入工作佇列。
+
+    請求體為 V1RequestBase 的 JSON 資料，另可指定 `backend`（"v1"、"v2" 或 "v3"，預設 "v2"）
+    與 `priority`（數字越大越先執行，預設 0）。
+
+    Args:
+        request (Request): FastAPI 請求物件。
+
+    Returns:
+        JSONResponse: 包含工作 id 的回應。
+    """
+    try:
+        data = msgspec.json.decode(await request.body())
+        backend = data.pop("backend", "v2")
+        priority = data.pop("priority", 0)
+        # 提交前先驗證欄位型別，避免工作執行時才失敗
+        convert(data)
+        job_id = await job_queue.submit(backend, data, priority)
+        return JSONResponse({"id": job_id, "status": "queued"}, status_code=202)
+    except ValidationError as e:
+        return JSONResponse({"error": f"無效的請求資料: {e}"}, status_code=400)
+    except DecodeError:
+        return JSONResponse({"error": "無效的 JSON 資料"}, status_code=400)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+@app.get("/jobs/{job_id}")
+async def api_jobs_get(job_id: str):
+    """
+    處理 `/jobs/{job_id}` 路由的 GET 請求，取得工作狀態或結果。
+
+    Args:
+        job_id (str): 工作 id。
+
+    Returns:
+        V1ResponseBase: 尚未完成時 status 為 queued 或 running，完成後為抓取結果。
+    """
+    res = await job_queue.get(job_id)
+    if res is None:
+        return JSONResponse({"error": "找不到工作"}, status_code=404)
+    return Response(encode(res), media_type="application/json")
+
+
+@app.get("/screenshots/{screenshot_id}")
+async def api_screenshot(screenshot_id: str):
+    """
+    處理 `/screenshots/{screenshot_id}` 路由的 GET 請求，回傳截圖的二進位內容。
+
+    Args:
+        screenshot_id (str): 截圖 id。
+
+    Returns:
+        Response: 圖片內容。
+    """
+    entry = screenshot_store.get(screenshot_id)
+    if entry is None:
+        return JSONResponse({"error": "找不到截圖"}, status_code=404)
+    data, media_type = entry
+    return Response(data, media_type=media_type)
+
+
+@app.get("/metrics")
+async def api_metrics():
+    """
+    處理 `/metrics` 路由的 GET 請求，以 Prometheus 文字格式回傳指標。
+
+    Returns:
+        Response: 各階段延遲、等待數量、瀏覽器重啟、重試次數與狀態碼等指標。
+    """
+    data, content_type = metrics.render_latest()
+    return Response(data, media_type=content_type)
+
 
 # 運行 FastAPI 開發伺服器
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+"""瀏覽器生命週期管理：啟動時預熱、定期健康檢查，並依記憶體用量回收瀏覽器。
+
+依請求次數回收由 SeleniumPool 與 NodriverCrawler 在請求結束時處理；
+本模組定期檢查閒置瀏覽器是否還能回應，以及瀏覽器行程樹的 RSS 是否超過上限。
+回收時先啟動新的瀏覽器，舊瀏覽器等進行中的請求結束後才關閉。
+"""
+
+import asyncio
+
+from log import get_logger
+from nodriver_crawler import NodriverCrawler
+from process_rss import process_tree_rss
+from selenium_pool import SeleniumPool
+
+logger = get_logger(__name__)
+
+
+class BrowserLifecycleManager:
+    """
+    預熱並定期檢查 SeleniumPool 與 NodriverCrawler 的瀏覽器。
+    """
+
+    def __init__(self, selpool: SeleniumPool, nodcrawl: NodriverCrawler, executor, interval=30, max_rss_mb=0):
+        """
+        Args:
+            selpool (SeleniumPool): Selenium 驅動池。
+            nodcrawl (NodriverCrawler): Nodriver crawler。
+            executor: 執行 Selenium 同步操作的線程池。
+            interval (float): 健康檢查間隔秒數。
+            max_rss_mb (int): 單一瀏覽器行程樹的 RSS 上限（MB），0 表示不檢查。
+        """
+        self.selpool = selpool
+        self.nodcrawl = nodcrawl
+        self.executor = executor
+        self.interval = interval
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.task = None
+
+    async def start(self):
+        """預熱瀏覽器並啟動定期健康檢查。"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            loop.run_in_executor(self.executor, self.selpool.start),
+            self.nodcrawl.start(),
+        )
+        logger.info("瀏覽器預熱完成")
+        self.task = asyncio.create_task(self.__run())
+
+    async def stop(self):
+        """停止健康檢查並關閉所有瀏覽器。"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.selpool.close)
+        self.nodcrawl.close()
+
+    def over_limit(self, pid):
+        """檢查行程樹的 RSS 是否超過上限。"""
+        if not self.max_rss:
+            return False
+        rss = process_tree_rss(pid)
+        if rss > self.max_rss:
+            logger.warning("瀏覽器 RSS %dMB 超過上限，回收瀏覽器", rss // (1024 * 1024))
+            return True
+        return False
+
+    async def __run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await loop.run_in_executor(self.executor, self.selpool.health_check, self.over_limit)
+                await self.nodcrawl.health_check(self.over_limit)
+            except Exception as e:
+                logger.exception("健康檢查失敗: %s", e)
@@ -0,0 +1,176 @@
+"""以 CDP 瀏覽器情境（browser context）實作的具名工作階段。
+
+帶有 session_id 的請求在共用的瀏覽器行程中使用自己的瀏覽器情境（與無痕視窗相同的隔離），
+cookies、localStorage 等儲存不與其他工作階段及一般請求共用，情境中的分頁在請求之間保留：
+之後同一工作階段的請求沿用登入後的狀態，網址與目前頁面相同時不重新導航。
+
+同一工作階段的請求依序處理。閒置超過 idle_ttl 秒的工作階段會被關閉；
+數量達到上限時關閉最久未使用的閒置工作階段，全部都在使用中時拋出 SessionLimitError。
+瀏覽器回收後，工作階段在下一個請求時於新瀏覽器中重新建立，之前的登入狀態不會保留。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+import metrics
+from log import get_logger
+from nodriver import cdp
+
+logger = get_logger(__name__)
+
+
+class SessionLimitError(Exception):
+    """工作階段數量已達上限，且都在使用中。"""
+
+
+class BrowserSession:
+    """
+    一個具名工作階段：所屬的瀏覽器、瀏覽器情境與保留的分頁。
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.browser = None
+        self.context_id = None
+        self.tab = None
+        self.lock = asyncio.Lock()
+        # 持有或等待 lock 的請求數，為 0 時才可被關閉
+        self.users = 0
+        self.last_used = time.monotonic()
+
+
+class SessionManager:
+    """
+    管理 NodriverCrawler 的具名工作階段。
+    """
+
+    def __init__(self, max_sessions=16, idle_ttl=600):
+        """
+        Args:
+            max_sessions (int): 同時存在的工作階段數量上限。
+            idle_ttl (float): 閒置多少秒後關閉工作階段。
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions: OrderedDict[str, BrowserSession] = OrderedDict()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    async def acquire(self, session_id: str):
+        """取得工作階段並等待輪到此請求，使用後需呼叫 release。
+        Args:
+            session_id (str): 工作階段名稱。
+        Returns:
+            BrowserSession: 已鎖定的工作階段，尚未開啟或瀏覽器已回收時需先呼叫 open。
+        Raises:
+            SessionLimitError: 工作階段數量已達上限，且都在使用中。
+        """
+        session = self.sessions.get(session_id)
+        victim = None
+        if session is None:
+            # 先同步地騰出空間並登記，避免同時建立相同名稱的工作階段
+            victim = self.__make_room()
+            session = BrowserSession(session_id)
+            self.sessions[session_id] = session
+            metrics.SESSIONS.set(len(self.sessions))
+        self.sessions.move_to_end(session_id)
+        # 在任何 await 之前計入使用者，關閉 victim 期間其他請求不會把新的工作階段當成閒置而移除
+        session.users += 1
+        try:
+            if victim is not None:
+                await self.__close(victim, "limit")
+            await session.lock.acquire()
+        except BaseException:
+            session.users -= 1
+            raise
+        return session
+
+    def release(self, session: BrowserSession):
+        """歸還工作階段，讓同一工作階段的下一個請求繼續。"""
+        session.last_used = time.monotonic()
+        session.users -= 1
+        session.lock.release()
+
+    async def open(self, session: BrowserSession, browser):
+        """在瀏覽器中建立工作階段的瀏覽器情境與分頁，需在持有 lock 時呼叫。
+        Args:
+            session (BrowserSession): acquire 取得的工作階段。
+            browser: 目前使用的 nodriver 瀏覽器。
+        """
+        if session.browser is not None:
+            logger.info("工作階段 %s 的瀏覽器已回收，重新建立", session.session_id)
+            await self.__dispose(session)
+        context_id = await browser.connection.send(cdp.target.create_browser_context())
+        try:
+            target_id = await browser.connection.send(
+                cdp.target.create_target("about:blank", browser_context_id=context_id)
+            )
+            await browser.update_targets()
+            tab = next((tab for tab in browser.targets if tab.target.target_id == target_id), None)
+            if tab is None:
+                raise RuntimeError(f"找不到工作階段 {session.session_id} 的分頁")
+            await tab.attach()
+        except BaseException:
+            try:
+                await browser.connection.send(cdp.target.dispose_browser_context(context_id))
+            except Exception:
+                pass
+            raise
+        session.browser, session.context_id, session.tab = browser, context_id, tab
+        logger.debug("已建立工作階段 %s", session.session_id)
+
+    async def discard(self, session: BrowserSession):
+        """關閉發生錯誤的工作階段的瀏覽器情境，需在持有 lock 時呼叫，下一個請求會重新建立。"""
+        await self.__dispose(session)
+        metrics.SESSIONS_CLOSED.labels("error").inc()
+
+    async def evict_idle(self):
+        """關閉閒置超過 idle_ttl 秒的工作階段。"""
+        deadline = time.monotonic() - self.idle_ttl
+        expired = [
+            session for session in self.sessions.values() if session.users == 0 and session.last_used < deadline
+        ]
+        for session in expired:
+            del self.sessions[session.session_id]
+        metrics.SESSIONS.set(len(self.sessions))
+        for session in expired:
+            await self.__close(session, "idle")
+
+    def clear(self):
+        """忘記所有工作階段，瀏覽器情境隨瀏覽器關閉。"""
+        self.sessions.clear()
+        metrics.SESSIONS.set(0)
+
+    def __make_room(self):
+        """數量達到上限時移除最久未使用的閒置工作階段。
+        Returns:
+            BrowserSession: 被移除、需要關閉的工作階段；不需要時為 None。
+        Raises:
+            SessionLimitError: 所有工作階段都在使用中。
+        """
+        if len(self.sessions) < self.max_sessions:
+            return None
+        for session_id, session in self.sessions.items():
+            if session.users == 0:
+                del self.sessions[session_id]
+                return session
+        raise SessionLimitError(f"工作階段數量已達上限 {self.max_sessions}，且都在使用中")
+
+    async def __close(self, session: BrowserSession, reason: str):
+        logger.info("關閉工作階段 %s (%s)", session.session_id, reason)
+        await self.__dispose(session)
+        metrics.SESSIONS_CLOSED.labels(reason).inc()
+
+    @staticmethod
+    async def __dispose(session: BrowserSession):
+        """關閉瀏覽器情境與其中的分頁，瀏覽器已關閉時忽略錯誤。"""
+        browser, context_id = session.browser, session.context_id
+        session.browser = session.context_id = session.tab = None
+        if browser is None:
+            return
+        try:
+            await asyncio.wait_for(browser.connection.send(cdp.target.dispose_browser_context(context_id)), 5)
+        except Exception as e:
+            logger.debug("關閉瀏覽器情境失敗: %s", e)
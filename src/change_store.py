@@ -0,0 +1,138 @@
+"""以網址索引的內容變更紀錄，用於條件式重新抓取。
+
+每個網址（與 include_html、extract、max_response_bytes / truncate_response 設定）保存最後一次抓取的內容雜湊、
+ETag / Last-Modified 與內容最後變更的時間。請求帶有 `known_hash` 或 `if_changed_since` 時：
+    - 客戶端已知的版本與紀錄相同、且紀錄有 ETag / Last-Modified 時，先送出帶條件標頭的 HEAD 探測，
+      伺服器回應 304 則不啟動瀏覽器；否則保存回應的驗證標頭，供下次探測使用。
+    - 抓取後內容雜湊與 known_hash 相同，或內容在 if_changed_since 之後沒有變更時，
+      回應 status 為 unchanged，且不帶網頁內容。
+紀錄保存在記憶體中（LRU），並由背景工作批次寫入磁碟。
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+import orjson
+import spool
+from data_structures import SolutionResultT, V1RequestBase
+from persistent_store import PersistentStore
+from response_cache import normalize_url
+
+
+def change_key(req: V1RequestBase):
+    """計算請求的變更紀錄鍵，include_html、extract、大小上限與 session_id 會改變內容雜湊，也納入鍵中。"""
+    payload = [
+        normalize_url(req.url),
+        bool(req.include_html),
+        req.extract,
+        req.max_response_bytes,
+        bool(req.truncate_response),
+    ]
+    if req.session_id is not None:
+        # 工作階段看到的內容可能與未登入時不同
+        payload.append(req.session_id)
+    data = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_hash(solution: SolutionResultT):
+    """計算網頁 HTML 與擷取欄位的雜湊。
+    Returns:
+        str: sha256 十六進位字串；沒有內容時為 None。
+    """
+    if solution.response is None and solution.data is None and not spool.is_spooled(solution):
+        return None
+    digest = hashlib.sha256()
+    if solution.response is not None or spool.is_spooled(solution):
+        # 暫存檔分段讀取，不把整份網頁讀入記憶體
+        spool.update_hash(digest, solution)
+    digest.update(b"\0")
+    if solution.data is not None:
+        digest.update(orjson.dumps(solution.data, option=orjson.OPT_SORT_KEYS, default=str))
+    return digest.hexdigest()
+
+
+def is_conditional(req: V1RequestBase):
+    """檢查請求是否帶有 known_hash 或 if_changed_since。"""
+    return req.known_hash is not None or req.if_changed_since is not None
+
+
+def client_is_current(req: V1RequestBase, entry: dict):
+    """檢查客戶端已知的版本是否與紀錄相同。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+        entry (dict): ChangeStore 的紀錄，可為 None。
+    """
+    if entry is None:
+        return False
+    if req.known_hash is not None:
+        return req.known_hash == entry["hash"]
+    return req.if_changed_since is not None and entry["changed_at"] <= req.if_changed_since
+
+
+class ChangeStore(PersistentStore):
+    """
+    以網址索引的內容雜湊與驗證標頭，可同時由多個請求使用。
+    """
+
+    description = "變更紀錄"
+
+    def __init__(self, path="", max_entries=100000, flush_interval=5):
+        """
+        Args:
+            path (str): 保存紀錄的 JSON 檔案，空字串表示不保存。
+            max_entries (int): 最多保存的網址數量，超過時淘汰最久未使用的紀錄。
+            flush_interval (float): 批次寫入磁碟的間隔秒數。
+        """
+        super().__init__(path, flush_interval)
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+        self.load()
+
+    def get(self, key: str):
+        """取得紀錄。
+        Returns:
+            dict: 包含 hash、etag、last_modified、changed_at 與 checked_at（毫秒）的紀錄；沒有時為 None。
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return dict(entry)
+            return None
+
+    def record(self, key: str, digest: str, etag: str = None, last_modified: str = None):
+        """寫入抓取後的內容雜湊。
+        Args:
+            key (str): change_key 的結果。
+            digest (str): content_hash 的結果。
+            etag (str): 伺服器回傳的 ETag。
+            last_modified (str): 伺服器回傳的 Last-Modified。
+        Returns:
+            dict: 更新後的紀錄。
+        """
+        now = int(time.time() * 1000)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["hash"] != digest:
+                # 內容變更時舊的驗證標頭已不適用
+                entry = {"hash": digest, "etag": None, "last_modified": None, "changed_at": now}
+            entry = dict(entry, checked_at=now)
+            if etag or last_modified:
+                entry["etag"], entry["last_modified"] = etag, last_modified
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+            return dict(entry)
+
+    def _dump(self):
+        return dict(self.entries)
+
+    def _restore(self, data):
+        with self.lock:
+            self.entries.update(data)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
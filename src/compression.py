@@ -0,0 +1,181 @@
+"""依 Accept-Encoding 壓縮回應的 ASGI middleware，支援 zstd 與 gzip。
+
+zstd 需要安裝選用套件 `zstandard`，未安裝時只使用 gzip。
+一般回應整份壓縮，較大的內容在線程中壓縮以免阻塞事件迴圈；
+串流回應（例如 NDJSON 批次結果）逐塊壓縮並 flush，客戶端可以立即解壓每一行。
+圖片、影音與壓縮檔等已壓縮過的內容（例如 `/screenshots/{id}`）原樣輸出。
+"""
+
+import asyncio
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 超過此大小的回應改在線程中壓縮
+OFFLOAD_SIZE = 256 * 1024
+
+# 已壓縮過、再壓縮只會浪費 CPU 的內容類型（前綴比對）
+INCOMPRESSIBLE_TYPES = (
+    "image/",
+    "audio/",
+    "video/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/zstd",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/pdf",
+    "application/octet-stream",
+)
+
+
+def is_compressible(content_type: str):
+    """內容類型是否值得壓縮；image/svg+xml 為文字，仍然壓縮。"""
+    content_type = content_type.lower()
+    if content_type.startswith("image/svg"):
+        return True
+    return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: str):
+    """依 Accept-Encoding 選擇壓縮方式。
+    Args:
+        accept_encoding (str): Accept-Encoding 標頭。
+    Returns:
+        str: "zstd"、"gzip"，不壓縮時為 None。
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    if zstandard is not None and accepted.get("zstd", 0) > 0:
+        return "zstd"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class StreamCompressor:
+    """逐塊壓縮，每一塊都 flush，讓串流內容可以立即解壓。"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes):
+        """壓縮一塊資料並 flush。"""
+        if self.encoding == "zstd":
+            return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """結束壓縮串流。"""
+        return self.compressor.flush()
+
+
+def compress_body(encoding: str, level: int, body: bytes):
+    """一次壓縮整份內容。"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    壓縮 HTTP 回應的 ASGI middleware。
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, zstd_level=3):
+        """
+        Args:
+            app: ASGI 應用程式。
+            minimum_size (int): 小於此大小的回應不壓縮。
+            gzip_level (int): gzip 壓縮等級。
+            zstd_level (int): zstd 壓縮等級。
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "zstd": zstd_level}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        level = self.levels[encoding]
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None and start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if (
+                    "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    # 已經壓縮過、內容類型不適合壓縮或內容太小，原樣輸出
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    # 一般回應，整份壓縮
+                    if len(body) > OFFLOAD_SIZE:
+                        body = await asyncio.to_thread(compress_body, encoding, level, body)
+                    else:
+                        body = compress_body(encoding, level, body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                # 串流回應，逐塊壓縮
+                del headers["Content-Length"]
+                compressor = StreamCompressor(encoding, level)
+                await send(start_message)
+                start_message = None
+
+            if len(body) > OFFLOAD_SIZE:
+                data = await asyncio.to_thread(compressor.compress, body)
+            else:
+                data = compressor.compress(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
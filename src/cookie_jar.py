@@ -0,0 +1,142 @@
+"""兩種 crawler 共用、以網域索引的記憶體 cookie jar。
+
+cookie 在第一次導航前以 CDP Network.setCookies 注入，不需要重新整理頁面；
+抓取後取得的 cookie 寫回 jar，並由背景工作批次寫入磁碟。
+
+沒有 Domain 屬性的 cookie（host-only，domain 沒有開頭的 "."）以 hostOnly 標記，
+只套用到完全相同的主機，注入時以 url 取代 domain，避免瀏覽器把它當成子域名也適用的 cookie。
+"""
+
+import time
+
+from domain import domain_of
+from log import get_logger
+from persistent_store import PersistentStore
+
+logger = get_logger(__name__)
+
+COOKIE_FIELDS = ("name", "value", "domain", "path", "expires", "httpOnly", "secure", "sameSite")
+
+
+def normalize_cookie(cookie: dict):
+    """把 Selenium 或 CDP 格式的 cookie 轉成 Network.setCookies 使用的格式。
+    Args:
+        cookie (dict): cookie 資料。
+    Returns:
+        dict: 正規化後的 cookie；SameSite 值不被支持時為 None。
+    """
+    result = {key: cookie[key] for key in COOKIE_FIELDS if cookie.get(key) is not None}
+    if "name" not in result or "value" not in result:
+        return None
+    # Selenium 使用 expiry
+    if "expires" not in result and cookie.get("expiry") is not None:
+        result["expires"] = cookie["expiry"]
+    if result.get("expires", 0) < 0 or cookie.get("session"):
+        result.pop("expires", None)
+
+    # 調整 SameSite 值以匹配允許的選項
+    same_site = result.get("sameSite")
+    if same_site is not None:
+        same_site = same_site.lower()
+        if same_site in ("strict", "no_restriction"):
+            result["sameSite"] = "Strict"
+        elif same_site == "lax":
+            result["sameSite"] = "Lax"
+        elif same_site in ("none", "unspecified"):
+            result["sameSite"] = "None"
+        else:
+            logger.debug("跳過 SameSite 值不被支持的 cookie: %s", same_site)
+            return None
+    if result.get("sameSite") == "None":
+        # SameSite=None 必須搭配 Secure
+        result["secure"] = True
+    return result
+
+
+def request_cookies(cookies: list, url: str):
+    """正規化請求中的 cookies，沒有 domain 的 cookie 套用到目標網址。"""
+    result = []
+    for cookie in cookies:
+        cookie = normalize_cookie(cookie)
+        if cookie is None:
+            continue
+        if not cookie.get("domain"):
+            cookie["url"] = url
+        result.append(cookie)
+    return result
+
+
+class CookieJar(PersistentStore):
+    """
+    以網域索引的 cookie jar，可同時由 Selenium 線程與事件迴圈使用。
+    """
+
+    description = "cookie"
+
+    def __init__(self, path="", flush_interval=5):
+        """
+        Args:
+            path (str): 保存 cookie 的 JSON 檔案，空字串表示不保存。
+            flush_interval (float): 批次寫入磁碟的間隔秒數。
+        """
+        super().__init__(path, flush_interval)
+        self.domains: dict[str, dict[tuple, dict]] = {}
+        self.load()
+
+    def cookies_for(self, url: str):
+        """取得適用於網址的 cookie。
+        Args:
+            url (str): 目標網址。
+        Returns:
+            list: 正規化後的 cookie 列表。
+        """
+        host = domain_of(url)
+        now = time.time()
+        result = []
+        labels = host.split(".")
+        with self.lock:
+            # 依序查詢 a.b.example.com、b.example.com、example.com ...
+            for i in range(len(labels)):
+                for cookie in self.domains.get(".".join(labels[i:]), {}).values():
+                    if cookie.get("expires", now + 1) <= now:
+                        continue
+                    cookie = dict(cookie)
+                    if cookie.pop("hostOnly", False):
+                        # host-only cookie 只適用於完全相同的主機
+                        if i > 0:
+                            continue
+                        del cookie["domain"]
+                        cookie["url"] = url
+                    result.append(cookie)
+        return result
+
+    def update(self, cookies: list):
+        """寫入抓取後取得的 cookie。
+        Args:
+            cookies (list): Selenium 或 CDP 格式的 cookie 列表。
+        """
+        now = time.time()
+        with self.lock:
+            for raw in cookies:
+                cookie = normalize_cookie(raw)
+                if cookie is None or not cookie.get("domain"):
+                    continue
+                # 瀏覽器回傳的 domain 以 "." 開頭表示子域名也適用，否則為 host-only
+                cookie["hostOnly"] = bool(raw.get("hostOnly", not cookie["domain"].startswith(".")))
+                domain = cookie["domain"].lstrip(".").lower()
+                key = (cookie["name"], cookie.get("path", "/"), cookie["domain"])
+                entries = self.domains.setdefault(domain, {})
+                if cookie.get("expires", now + 1) <= now:
+                    # 已過期的 cookie 代表被刪除
+                    if entries.pop(key, None) is not None:
+                        self.dirty = True
+                    continue
+                if entries.get(key) != cookie:
+                    entries[key] = cookie
+                    self.dirty = True
+
+    def _dump(self):
+        return [cookie for entries in self.domains.values() for cookie in entries.values()]
+
+    def _restore(self, data):
+        self.update(data)
@@ -1,106 +1,175 @@
-"""Dataclasses for defining API request and response formats."""
+"""Dataclasses for defining API request and response formats.
+
+模型以 msgspec.Struct 定義（slots、無 __dict__），請求體直接由 bytes 解碼並驗證型別，
+回應以 orjson 直接編碼為 bytes，不經過中間的 dict 與字串。
+"""
 
 import time
 
+import msgspec
+import orjson
+from extraction import normalize_spec
+
 VERSION = "1.0.0"
 DEFAULT_URL = "https://www.google.com/"
 
+# 解碼或驗證失敗時拋出的例外，ValidationError 為 DecodeError 的子類別
+DecodeError = msgspec.DecodeError
+ValidationError = msgspec.ValidationError
 
-class SolutionResultT:
-    """Dataclass for storing solution result."""
 
-    def __init__(self, _dict=None):
-        if _dict is None:
-            _dict = {}
-        self.url: str = None
-        self.status: int = None
-        self.headers: list = None
-        self.response: str = None
-        self.cookies: list = None
-        self.user_agent: str = None
-        self.screenshot_base64: str = None
-        self.__dict__.update(_dict)
+def _now():
+    return int(time.time() * 1000)
 
-    def __repr__(self):
-        return str(self.__dict__)
 
-    def __str__(self):
-        return str(self.__dict__)
+class SolutionResultT(msgspec.Struct, weakref=True):
+    """Dataclass for storing solution result.
 
+    大型網頁的 HTML 在暫存檔中時 response 為 None、response_file 為暫存檔路徑，見 spool 模組。
+    """
 
-class ActionT:
-    """Dataclass for storing event information."""
+    url: str | None = None
+    status: int | None = None
+    headers: list | dict | str | None = None
+    response: str | None = None
+    cookies: list | None = None
+    user_agent: str | None = msgspec.field(default=None, name="userAgent")
+    screenshot_base64: str | None = None
+    screenshot_url: str | None = None
+    wait_time: int | float | None = None
+    blocked_requests: int | None = None
+    blocked_bytes: int | None = None
+    data: dict | None = None
+    action_results: list | None = None
+    content_hash: str | None = None
+    changed_at: int | None = None
+    response_bytes: int | None = None
+    truncated: bool | None = None
+    response_file: str | None = None
+    timeout_phase: str | None = None
 
-    def __init__(self, _dict=None):
-        if _dict is None:
-            _dict = {}
-        self.trigger: str = ""
-        self.xpath: str = ""
-        self.find: str = ""
-        self.select: str = ""
-        self.value: str = ""
-        self.timeout: int = 10
-        self.__dict__.update(_dict)
 
-    def __repr__(self):
-        return str(self.__dict__)
+class ActionT(msgspec.Struct):
+    """Dataclass for storing event information."""
 
-    def __str__(self):
-        return str(self.__dict__)
+    trigger: str = ""
+    xpath: str = ""
+    find: str = ""
+    select: str = ""
+    value: str = ""
+    timeout: int | float = 10
 
 
-class V1RequestBase:
+class V1RequestBase(msgspec.Struct):
     """Base class for V1 requests."""
 
-    def __init__(self, _dict):
-        self.url: str = DEFAULT_URL
-        self.cookies: list = []
-        self.retry_count: int = 3
-        self.page_size: int = 100
-        self.max_timeout: int = 60000
-        self.screenshot: bool = False
-        self.__dict__.update(_dict)
-        self.actions = [ActionT(action) for action in self.actions]
+    url: str = DEFAULT_URL
+    cookies: list[dict] = []
+    actions: list[ActionT] = []
+    retry_count: int = 3
+    page_size: int = 100
+    max_timeout: int = 60000
+    screenshot: bool = False
+    screenshot_format: str = "png"
+    screenshot_quality: int | None = None
+    screenshot_clip: dict | None = None
+    screenshot_mode: str = "base64"
+    wait_until: str = "page_size"
+    wait_selector: str = ""
+    wait_xpath: str = ""
+    idle_time: int = 500
+    cache_ttl: int | float | None = None
+    no_cache: bool = False
+    block_resources: bool | str | list | dict | None = None
+    extract: dict | None = None
+    include_html: bool = True
+    fast_path: bool | None = None
+    request_id: str | None = None
+    known_hash: str | None = None
+    if_changed_since: int | float | None = None
+    session_id: str | None = None
+    max_response_bytes: int | None = None
+    truncate_response: bool = True
+
+    def __post_init__(self):
+        # 解碼時驗證 extract 規則與截圖範圍，錯誤轉為 ValidationError
+        if self.extract is not None:
+            normalize_spec(self.extract)
+        if self.screenshot_clip:
+            _validate_clip(self.screenshot_clip)
+
+
+def _validate_clip(clip: dict):
+    """檢查 screenshot_clip 的範圍。
+    Raises:
+        ValueError: 缺少 width 或 height，或欄位不是數字。
+    """
+    for key in ("x", "y", "width", "height", "scale"):
+        value = clip.get(key)
+        if value is None and key in ("width", "height"):
+            raise ValueError(f"screenshot_clip.{key} is required")
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"screenshot_clip.{key} must be a number")
+    if clip["width"] <= 0 or clip["height"] <= 0 or clip.get("scale", 1) <= 0:
+        raise ValueError("screenshot_clip width, height and scale must be positive")
+
+
+class CrawlOptionsT(msgspec.Struct):
+    """Options of a /crawl request, given next to the V1RequestBase fields."""
+
+    backend: str = "v2"
+    max_depth: int = 2
+    max_pages: int = 100
+    scope: str = "domain"
+    concurrency: int | None = None
+
+
+class V1ResponseBase(msgspec.Struct):
+    """Base class for V1 responses."""
 
-    def __repr__(self):
-        return str(self.__dict__)
+    status: str = "ok"
+    message: str | None = None
+    start_timestamp: int = msgspec.field(default_factory=_now)
+    end_timestamp: int = msgspec.field(default_factory=_now)
+    version: str = VERSION
+    cache_status: str | None = None
+    timings: dict | None = None
+    request_id: str | None = None
+    backend: str | None = None
+    solution: SolutionResultT | None = None
 
-    def __str__(self):
-        return str(self.__dict__)
 
+def decode_request(data: bytes):
+    """解碼並驗證請求體。
+    Args:
+        data (bytes): V1RequestBase 的 JSON 資料。
+    Returns:
+        V1RequestBase: 請求物件。
+    Raises:
+        DecodeError: 不是有效的 JSON。
+        ValidationError: 欄位型別錯誤。
+    """
+    return msgspec.json.decode(data, type=V1RequestBase, strict=False)
+
+
+def convert(data, type=V1RequestBase):
+    """把已解碼的 dict 轉成模型並驗證型別。
+    Raises:
+        ValidationError: 欄位型別錯誤。
+    """
+    return msgspec.convert(data, type, strict=False)
+
+
+def to_builtins(obj):
+    """把模型轉成 dict / list 等內建型別，欄位名稱與 JSON 輸出相同。"""
+    return msgspec.to_builtins(obj)
+
+
+def encode(obj):
+    """以 orjson 把模型或內建型別編碼為 JSON bytes。"""
+    return orjson.dumps(obj, default=msgspec.to_builtins)
 
-class V1ResponseBase:
-    """Base class for V1 responses."""
 
-    def __init__(self, _dict=None):
-        if _dict is None:
-            _dict = {}
-        self.status: str = "ok"
-        self.message: str = None
-        self.start_timestamp: int = int(time.time() * 1000)
-        self.end_timestamp: int = int(time.time() * 1000)
-        self.version: str = VERSION
-        self.solution: SolutionResultT = None
-
-        self.__dict__.update(_dict)
-        if self.solution is not None:
-            self.solution = SolutionResultT(self.solution)
-
-    def update(self, _dict):
-        """更新資料"""
-        self.status: str = "ok"
-        self.message: str = None
-        self.start_timestamp: int = int(time.time() * 1000)
-        self.end_timestamp: int = int(time.time() * 1000)
-        self.version: str = VERSION
-        self.solution: SolutionResultT = None
-
-        self.__dict__.update(_dict)
-        if self.solution is not None:
-            self.solution = SolutionResultT(self.solution)
-
-    def __repr__(self):
-        return str(self.__dict__)
-
-    def __str__(self):
-        return str(self.__dict__)
+def decode(data, type=V1ResponseBase):
+    """把 JSON 解碼為模型，預設為 V1ResponseBase。"""
+    return msgspec.json.decode(data, type=type, strict=False)
@@ -0,0 +1,180 @@
+"""每個請求的端到端期限。
+
+crawl 開始時以 `start_deadline(req.max_timeout / 1000)` 建立期限並放入 contextvar，
+之後等待瀏覽器、導航、等待就緒、actions、截圖與讀取內容等所有階段共用同一個期限：
+
+    metrics.phase 進入每個階段前檢查期限，並記錄目前的階段；期限已過時拋出 DeadlineExceeded，
+    階段內的錯誤發生在期限之後時也轉為 DeadlineExceeded，回應中的 timeout_phase 為用完時間的階段。
+    各階段中會阻塞的呼叫（頁面載入、WebDriverWait、就緒等待、actions 腳本、HTTP 請求）以
+    `remaining(上限)` 取得不超過期限的等待秒數。
+    nodriver 的整個請求以 `run(coro)` 執行，期限到時取消並重置分頁。
+
+客戶端中斷連線時以 `cancel()` 讓期限立即到期：Selenium 在線程中執行無法中斷，
+會在下一個階段開始前放棄；worker 行程收到取消訊息後同樣取消該請求。
+Selenium 在線程池中執行，需以 `contextvars.copy_context().run` 帶入 contextvar（見 run_in_executor）。
+"""
+
+import asyncio
+import contextvars
+import time
+from contextvars import ContextVar
+
+from data_structures import SolutionResultT, V1RequestBase
+
+_deadline: ContextVar = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """請求超過期限或已被取消，args[0] 為用完時間的階段。"""
+
+    @property
+    def phase(self):
+        return self.args[0]
+
+
+class Deadline:
+    """
+    一個請求的期限與目前的階段。
+    """
+
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds
+        self.cancelled = False
+        self.phase = None
+
+    def remaining(self):
+        """剩餘秒數，已過期或已取消時為 0。"""
+        if self.cancelled:
+            return 0
+        return max(self.expires - time.monotonic(), 0)
+
+    def expired(self):
+        """期限是否已過或已取消。"""
+        return self.remaining() <= 0
+
+    def cancel(self):
+        """客戶端中斷連線時讓期限立即到期。"""
+        self.cancelled = True
+
+    def finish(self):
+        """抓取結束，之後的階段（例如編碼回應）不再受期限限制。"""
+        self.expires = float("inf")
+
+    def extend(self, other: "Deadline"):
+        """延長到另一個期限，多個請求共用同一次抓取時使用最晚的期限。"""
+        self.expires = max(self.expires, other.expires)
+
+    def enter(self, name: str):
+        """進入階段前檢查期限，並記錄目前的階段。
+        Raises:
+            DeadlineExceeded: 期限已過，階段為上一個階段。
+        """
+        self.check()
+        self.phase = name
+
+    def check(self, name: str = None):
+        """期限已過時拋出 DeadlineExceeded。
+        Args:
+            name (str): 回報的階段，預設為目前的階段。
+        """
+        if self.expired():
+            raise DeadlineExceeded(name or self.phase or "queue")
+
+
+def start_deadline(seconds: float):
+    """建立目前請求的期限。
+    Args:
+        seconds (float): 從現在起的秒數，通常為 max_timeout / 1000。
+    Returns:
+        Deadline: 期限物件。
+    """
+    deadline = Deadline(seconds)
+    _deadline.set(deadline)
+    return deadline
+
+
+def current_deadline():
+    """取得目前請求的期限，不在請求中時為 None。"""
+    return _deadline.get()
+
+
+def use_deadline(deadline: Deadline):
+    """讓目前的 context 使用指定的期限，例如多個請求共用的抓取。"""
+    _deadline.set(deadline)
+
+
+def remaining(limit: float = None):
+    """取得不超過期限的等待秒數。
+    Args:
+        limit (float): 呼叫端原本的等待上限，None 表示只受期限限制。
+    Returns:
+        float: 等待秒數；沒有期限時為 limit。
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return limit
+    left = deadline.remaining()
+    return left if limit is None else min(limit, left)
+
+
+def check(name: str = None):
+    """期限已過時拋出 DeadlineExceeded，不在請求中時不做任何事。"""
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.check(name)
+
+
+async def run(coro):
+    """在期限內執行 coroutine，期限到時取消它。
+    Raises:
+        DeadlineExceeded: 期限已過，階段為取消時的階段。
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return await coro
+    try:
+        return await asyncio.wait_for(coro, deadline.remaining())
+    except asyncio.TimeoutError:
+        if not deadline.expired():
+            raise
+        raise DeadlineExceeded(deadline.phase or "queue") from None
+
+
+async def wait_shared(future, shared: Deadline = None):
+    """在目前請求的期限內等待共用的抓取，期限到時只放棄等待，抓取繼續供其他請求使用。
+    Args:
+        future: 共用的抓取。
+        shared (Deadline): 共用抓取的期限，回報逾時階段用。
+    Raises:
+        DeadlineExceeded: 期限已過，階段為共用抓取目前的階段。
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return await asyncio.shield(future)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), deadline.remaining())
+    except asyncio.TimeoutError:
+        if future.done() or not deadline.expired():
+            raise
+        phase = (shared.phase if shared is not None else None) or deadline.phase
+        raise DeadlineExceeded(phase or "queue") from None
+
+
+async def run_in_executor(executor, func, *args):
+    """在線程池中以目前的 context 執行同步函式。
+    被取消時線程無法中斷，讓期限立即到期，線程中的請求在下一個階段開始前放棄。
+    """
+    context = contextvars.copy_context()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, context.run, func, *args)
+    except asyncio.CancelledError:
+        deadline = context.get(_deadline)
+        if deadline is not None:
+            deadline.cancel()
+        raise
+
+
+def timeout_solution(req: V1RequestBase, error: DeadlineExceeded):
+    """請求超過期限時的結果。"""
+    msg = f"超過 max_timeout ({req.max_timeout}ms)，逾時階段: {error.phase}"
+    return SolutionResultT(response=msg, status=504, url=req.url, timeout_phase=error.phase)
@@ -0,0 +1,24 @@
+"""網域相關的輔助函數。"""
+
+from urllib.parse import urlparse
+
+
+def is_subdomain(subdomain, domain):
+    """
+    檢查 subdomain 是否為 domain 的子域名
+    """
+    return subdomain == domain or subdomain.endswith(f".{domain}")
+
+
+def domain_of(url):
+    """
+    取得網址的主機名稱（小寫，不含連接埠）
+    """
+    return (urlparse(url).hostname or "").lower()
+
+
+def same_site(domain_a, domain_b):
+    """
+    檢查兩個網域是否互為子域名，例如 www.example.com 與 example.com
+    """
+    return is_subdomain(domain_a, domain_b) or is_subdomain(domain_b, domain_a)
@@ -0,0 +1,109 @@
+"""在頁面內擷取指定欄位，讓回應只帶回需要的資料。
+
+`V1RequestBase.extract` 為欄位名稱對應到擷取規則的 dict，規則可為：
+    字串: 以 "/" 或 "(" 開頭視為 XPath，否則為 CSS selector，取元素文字。
+    dict: {"css" 或 "xpath": 選擇器, "attr": 屬性, "prop": DOM 屬性, "all": 是否取全部符合的元素}
+        attr 可為 "text"（預設）、"html"、"outer_html" 或任意 HTML 屬性名稱；
+        prop 取 DOM 物件的屬性，例如 "href" 會回傳絕對網址。
+
+所有欄位在一次腳本執行中完成，找不到元素時該欄位為 None（all 為 True 時為空列表）。
+規則格式錯誤時解碼請求即拋出 ValidationError（見 V1RequestBase.__post_init__），API 回應 400。
+"""
+
+import json
+
+EXTRACT_JS = """
+(spec) => {
+    const pick = (el, rule) => {
+        if (rule.prop) {
+            const value = el[rule.prop];
+            return value === undefined ? null : value;
+        }
+        const attr = rule.attr || "text";
+        if (attr === "text") return (el.textContent || "").trim();
+        if (attr === "html") return el.innerHTML;
+        if (attr === "outer_html") return el.outerHTML;
+        return el.getAttribute ? el.getAttribute(attr) : null;
+    };
+    const find = (rule) => {
+        if (rule.xpath) {
+            const result = document.evaluate(rule.xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            const nodes = [];
+            const count = rule.all ? result.snapshotLength : Math.min(result.snapshotLength, 1);
+            for (let i = 0; i < count; i++) nodes.push(result.snapshotItem(i));
+            return nodes;
+        }
+        if (rule.all) return Array.from(document.querySelectorAll(rule.css));
+        const node = document.querySelector(rule.css);
+        return node ? [node] : [];
+    };
+    const data = {};
+    for (const [name, rule] of Object.entries(spec)) {
+        try {
+            const nodes = find(rule);
+            data[name] = rule.all ? nodes.map((el) => pick(el, rule)) : (nodes.length ? pick(nodes[0], rule) : null);
+        } catch (e) {
+            data[name] = rule.all ? [] : null;
+        }
+    }
+    return data;
+}
+"""
+
+
+def normalize_spec(extract: dict):
+    """把簡寫的擷取規則轉成完整格式。
+    Args:
+        extract (dict): V1RequestBase.extract。
+    Returns:
+        dict: 欄位名稱對應到 {"css"/"xpath", "attr", "prop", "all"} 的 dict。
+    Raises:
+        ValueError: extract 不是 dict，或規則不是字串也不是帶有 css 或 xpath 的 dict。
+    """
+    if not isinstance(extract, dict):
+        raise ValueError("extract must be an object")
+    spec = {}
+    for name, rule in extract.items():
+        if isinstance(rule, str):
+            rule = {"xpath": rule} if rule.startswith(("/", "(")) else {"css": rule}
+        elif not isinstance(rule, dict) or not (rule.get("css") or rule.get("xpath")):
+            raise ValueError(f"extract rule {name!r} must be a selector or an object with css or xpath")
+        spec[name] = {
+            "css": rule.get("css", ""),
+            "xpath": rule.get("xpath", ""),
+            "attr": rule.get("attr", "text"),
+            "prop": rule.get("prop", ""),
+            "all": bool(rule.get("all", False)),
+        }
+    return spec
+
+
+def extract_selenium(driver, extract: dict):
+    """在 Selenium 頁面中擷取資料。
+    Args:
+        driver: Selenium WebDriver。
+        extract (dict): V1RequestBase.extract。
+    Returns:
+        dict: 欄位名稱對應到擷取結果。
+    """
+    spec = normalize_spec(extract)
+    if not spec:
+        return {}
+    return driver.execute_script(f"return ({EXTRACT_JS})(arguments[0]);", spec) or {}
+
+
+async def extract_nodriver(tab, extract: dict):
+    """在 nodriver 分頁中擷取資料。
+    Args:
+        tab: nodriver 分頁。
+        extract (dict): V1RequestBase.extract。
+    Returns:
+        dict: 欄位名稱對應到擷取結果。
+    """
+    spec = normalize_spec(extract)
+    if not spec:
+        return {}
+    # nodriver 以 deep serialization 回傳物件，結果在頁面中轉成 JSON 字串再解碼
+    data = await tab.evaluate(f"JSON.stringify(({EXTRACT_JS})({json.dumps(spec)}))", return_by_value=True)
+    data = json.loads(data) if isinstance(data, str) else None
+    return data if isinstance(data, dict) else {}
@@ -0,0 +1,143 @@
+"""整站抓取使用的網址去重集合與廣度優先佇列，記憶體用量有上限。
+
+SeenSet 以 Bloom filter 判斷網址是否出現過，並以精確集合（64 位元指紋）排除 Bloom filter 的誤判；
+精確集合達到上限後只依 Bloom filter 判斷，少數新網址可能被誤判為已出現。
+Frontier 為先進先出的佇列，超過記憶體上限的網址寫入暫存檔，依序讀回。
+"""
+
+import hashlib
+import math
+import tempfile
+from collections import deque
+
+
+class BloomFilter:
+    """
+    以 bytearray 實作的 Bloom filter，使用雙重雜湊產生 k 個位置。
+    """
+
+    def __init__(self, capacity: int, error_rate=0.001):
+        """
+        Args:
+            capacity (int): 預期加入的項目數量。
+            error_rate (float): 加入 capacity 個項目後的誤判率。
+        """
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __positions(self, h1: int, h2: int):
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, h1: int, h2: int):
+        """加入以兩個雜湊值表示的項目。"""
+        for position in self.__positions(h1, h2):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def contains(self, h1: int, h2: int):
+        """檢查項目是否可能已加入。"""
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(h1, h2))
+
+
+class SeenSet:
+    """
+    Bloom filter 加上有上限的精確集合。
+    """
+
+    def __init__(self, capacity=1000000, exact_limit=200000, error_rate=0.001):
+        """
+        Args:
+            capacity (int): Bloom filter 預期的網址數量。
+            exact_limit (int): 精確集合最多保存的指紋數量。
+            error_rate (float): Bloom filter 的誤判率。
+        """
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.exact: set[int] = set()
+        self.exact_limit = exact_limit
+        self.count = 0
+
+    def add(self, url: str):
+        """加入網址。
+        Returns:
+            bool: 網址先前沒有出現過時為 True。
+        """
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        if self.bloom.contains(h1, h2):
+            if h1 in self.exact:
+                return False
+            # 精確集合已滿時無法排除誤判，只依 Bloom filter 判斷；
+            # 否則精確集合中沒有代表 Bloom filter 誤判，網址是新的
+            if self.count > self.exact_limit:
+                return False
+        self.bloom.add(h1, h2)
+        if len(self.exact) < self.exact_limit:
+            self.exact.add(h1)
+        self.count += 1
+        return True
+
+    def __len__(self):
+        return self.count
+
+
+class Frontier:
+    """
+    先進先出的網址佇列，超過 memory_limit 的項目寫入暫存檔。
+    """
+
+    def __init__(self, memory_limit=10000):
+        """
+        Args:
+            memory_limit (int): 保存在記憶體中的項目數量上限。
+        """
+        self.memory_limit = memory_limit
+        self.memory: deque[tuple[int, str]] = deque()
+        self.spill = None
+        self.spilled = 0
+        self.read_pos = 0
+
+    def push(self, url: str, depth: int):
+        """加入網址與深度。"""
+        # 暫存檔中還有項目時，新項目也寫入暫存檔，維持先進先出
+        if self.spilled or len(self.memory) >= self.memory_limit:
+            if self.spill is None:
+                self.spill = tempfile.TemporaryFile("w+", encoding="utf-8")
+            self.spill.seek(0, 2)
+            self.spill.write(f"{depth}\t{url}\n")
+            self.spilled += 1
+        else:
+            self.memory.append((depth, url))
+
+    def pop(self):
+        """取出最早加入的項目。
+        Returns:
+            tuple[int, str]: 深度與網址。
+        """
+        if not self.memory and self.spilled:
+            self.__refill()
+        return self.memory.popleft()
+
+    def __refill(self):
+        """從暫存檔讀回最多 memory_limit 個項目。"""
+        self.spill.seek(self.read_pos)
+        for _ in range(min(self.memory_limit, self.spilled)):
+            depth, url = self.spill.readline().rstrip("\n").split("\t", 1)
+            self.memory.append((int(depth), url))
+            self.spilled -= 1
+        self.read_pos = self.spill.tell()
+        if not self.spilled:
+            self.spill.seek(0)
+            self.spill.truncate()
+            self.read_pos = 0
+
+    def close(self):
+        """刪除暫存檔。"""
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def __len__(self):
+        return len(self.memory) + self.spilled
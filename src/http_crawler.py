@@ -0,0 +1,290 @@
+"""不啟動瀏覽器、直接以 HTTP 抓取網頁的快速路徑。
+
+請求帶有 `fast_path` 時，先以共用連線池的 httpx.AsyncClient 抓取，
+使用 cookie jar 中瀏覽器取得的 cookies 與瀏覽器回報的 User-Agent。
+以下情況改由瀏覽器處理（升級）：
+    - 請求需要瀏覽器：有 actions、screenshot、extract，或 wait_until 不是 page_size。
+    - 網域先前曾升級，且仍在記憶期限內。
+    - 回應為挑戰頁面（Cloudflare、Incapsula 等），或狀態碼為 401 / 403 / 429 / 503。
+    - HTML 內容短於 page_size（通常代表內容由 JavaScript 產生）。
+升級的網域會被記住 memory_ttl 秒，期間直接使用瀏覽器。
+"""
+
+import time
+from collections import OrderedDict
+from http.cookiejar import CookieJar as HttpCookieJar
+from http.cookiejar import DefaultCookiePolicy
+
+import httpx
+from cookie_jar import CookieJar, request_cookies
+from data_structures import SolutionResultT, V1RequestBase
+from deadline import DeadlineExceeded, check, remaining
+from domain import domain_of
+from log import get_logger
+from metrics import FAST_PATH, phase
+from page_content import reject_oversize
+from spool import PageBody
+
+logger = get_logger(__name__)
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+# 出現在挑戰頁面中的字串（小寫比對）
+CHALLENGE_MARKERS = (
+    "cf-browser-verification",
+    "cf_chl_opt",
+    "challenge-platform",
+    "<title>just a moment",
+    "<title>attention required",
+    "checking your browser",
+    "_incapsula_resource",
+    "px-captcha",
+    "ddos-guard",
+)
+ESCALATE_STATUS = (401, 403, 429, 503)
+# 檢查挑戰頁面字串的內容長度
+CHALLENGE_HEAD = 20000
+
+
+def needs_browser(req: V1RequestBase):
+    """檢查請求本身是否需要瀏覽器。
+    Returns:
+        str: 需要瀏覽器的原因，不需要時為空字串。
+    """
+    if req.session_id is not None:
+        return "session"
+    if req.actions:
+        return "actions"
+    if req.screenshot:
+        return "screenshot"
+    if req.extract:
+        return "extract"
+    if req.wait_until != "page_size":
+        return "wait_until"
+    return ""
+
+
+def is_challenge_html(html: str):
+    """檢查 HTML 開頭是否含有挑戰頁面的字串。"""
+    head = html[:CHALLENGE_HEAD].lower()
+    return any(marker in head for marker in CHALLENGE_MARKERS)
+
+
+def is_challenge(response: httpx.Response, head: str):
+    """檢查回應是否為挑戰頁面。
+    Args:
+        response (httpx.Response): 回應。
+        head (str): 回應內容的開頭。
+    """
+    if response.headers.get("cf-mitigated") == "challenge":
+        return True
+    return is_challenge_html(head)
+
+
+class HttpCrawler:
+    """
+    以 HTTP 抓取網頁，需要時回傳 None 讓呼叫端改用瀏覽器。
+    """
+
+    def __init__(
+        self, cookie_jar: CookieJar = None, max_connections=100, memory_ttl=3600, memory_size=10000, transport=None
+    ):
+        """
+        Args:
+            cookie_jar (CookieJar): 與瀏覽器共用的 cookie jar。
+            max_connections (int): 連線池大小。
+            memory_ttl (float): 記住需要瀏覽器的網域的秒數。
+            memory_size (int): 最多記住的網域數量。
+            transport (httpx.AsyncBaseTransport): 取代預設連線的傳輸層，測試時使用。
+        """
+        self.cookie_jar = cookie_jar
+        self.user_agent = DEFAULT_USER_AGENT
+        self.memory_ttl = memory_ttl
+        self.memory_size = memory_size
+        self.browser_domains: OrderedDict[str, float] = OrderedDict()
+        # cookies 由 cookie jar 管理，連線池本身不保存任何 cookie
+        no_cookies = HttpCookieJar(DefaultCookiePolicy(allowed_domains=[]))
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            cookies=no_cookies,
+            transport=transport,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections // 4 or 1),
+        )
+
+    def remember_user_agent(self, user_agent: str):
+        """記錄瀏覽器回報的 User-Agent，之後的請求使用相同的值。"""
+        if user_agent:
+            self.user_agent = user_agent
+
+    def needs_browser_domain(self, url: str):
+        """檢查網域是否在記憶期限內曾升級到瀏覽器。"""
+        domain = domain_of(url)
+        expires = self.browser_domains.get(domain)
+        if expires is None:
+            return False
+        if expires < time.time():
+            del self.browser_domains[domain]
+            return False
+        return True
+
+    async def get(self, req: V1RequestBase):
+        """以 HTTP 抓取網頁。
+        Args:
+            req (V1RequestBase): 包含請求資訊的物件。
+        Returns:
+            SolutionResultT: 包含網頁資訊的結果物件；需要瀏覽器時為 None。
+        """
+        solution, _ = await self.fetch(req)
+        return solution
+
+    async def fetch(self, req: V1RequestBase, use_memory=True):
+        """以 HTTP 抓取網頁，並回傳需要瀏覽器的原因。
+        Args:
+            req (V1RequestBase): 包含請求資訊的物件。
+            use_memory (bool): 是否略過記憶期限內曾升級的網域。
+        Returns:
+            tuple[SolutionResultT, str]: 結果與原因。需要瀏覽器時結果為 None，
+                原因為 needs_browser 的結果，或 domain、error、challenge、page_size。
+        Raises:
+            DeadlineExceeded: 請求超過期限。
+        """
+        reason = needs_browser(req)
+        if not reason and use_memory and self.needs_browser_domain(req.url):
+            reason = "domain"
+        if reason:
+            FAST_PATH.labels("skipped", reason).inc()
+            return None, reason
+
+        # 內容分段讀入 PageBody，大型網頁寫入暫存檔
+        body = PageBody(req.max_response_bytes)
+        head, length = "", 0
+        try:
+            with phase("http"):
+                async with self.client.stream(
+                    "GET",
+                    req.url,
+                    headers=self.__headers(req),
+                    timeout=remaining(req.max_timeout / 1000),
+                ) as response:
+                    if response.status_code not in ESCALATE_STATUS:
+                        async for text in response.aiter_text():
+                            # httpx 的 timeout 只限制每次讀取，緩慢送出的內容以期限中止
+                            check()
+                            if len(head) < CHALLENGE_HEAD:
+                                head += text[: CHALLENGE_HEAD - len(head)]
+                            length += len(text)
+                            if not body.write(text):
+                                break
+        except DeadlineExceeded:
+            body.discard()
+            raise
+        except httpx.HTTPError as e:
+            body.discard()
+            # 連線錯誤可能是暫時的，不記住網域
+            logger.debug("fast path error: %s %s", req.url, e)
+            FAST_PATH.labels("escalated", "error").inc()
+            return None, "error"
+
+        if response.status_code in ESCALATE_STATUS or is_challenge(response, head):
+            body.discard()
+            self.__escalate(req.url, "challenge")
+            return None, "challenge"
+        content_type = response.headers.get("content-type", "")
+        # 404 等錯誤頁面通常很短，但瀏覽器也只會得到相同的頁面，不需要升級
+        if response.status_code < 400 and "html" in content_type and length <= req.page_size:
+            body.discard()
+            self.__escalate(req.url, "page_size")
+            return None, "page_size"
+        rejected = reject_oversize(req, body)
+        if rejected is not None:
+            return rejected, ""
+
+        cookies = self.__cookies(response)
+        if self.cookie_jar is not None:
+            self.cookie_jar.update(cookies)
+        FAST_PATH.labels("served", "").inc()
+        solution = SolutionResultT(
+            cookies=cookies,
+            headers=dict(response.headers),
+            status=response.status_code,
+            url=req.url,
+            user_agent=self.user_agent,
+            screenshot_base64="",
+            wait_time=0,
+        )
+        if not req.include_html:
+            body.discard()
+            return solution, ""
+        return body.fill(solution), ""
+
+    async def probe(self, req: V1RequestBase, etag: str = None, last_modified: str = None):
+        """以 HEAD 請求檢查網頁是否變更，有驗證標頭時帶入 If-None-Match / If-Modified-Since。
+        Args:
+            req (V1RequestBase): 包含請求資訊的物件。
+            etag (str): 先前保存的 ETag。
+            last_modified (str): 先前保存的 Last-Modified。
+        Returns:
+            httpx.Response: HEAD 回應；連線錯誤時為 None。
+        """
+        headers = self.__headers(req)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            with phase("probe"):
+                return await self.client.head(req.url, headers=headers, timeout=remaining(req.max_timeout / 1000))
+        except httpx.HTTPError as e:
+            logger.debug("probe error: %s %s", req.url, e)
+            return None
+
+    async def close(self):
+        """關閉連線池。"""
+        await self.client.aclose()
+
+    def __headers(self, req: V1RequestBase):
+        """建立請求標頭，帶入 cookie jar 與請求中的 cookies。"""
+        headers = {
+            "User-Agent": self.user_agent,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "zh-TW,zh;q=0.9,en;q=0.8",
+        }
+        cookies = self.cookie_jar.cookies_for(req.url) if self.cookie_jar is not None else []
+        cookies += request_cookies(req.cookies, req.url)
+        if cookies:
+            headers["Cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+        return headers
+
+    def __cookies(self, response: httpx.Response):
+        """把回應的 Set-Cookie 轉成 cookie jar 使用的格式。"""
+        jar = httpx.Cookies()
+        # 重新導向過程中設定的 cookies 也一併保存
+        for r in (*response.history, response):
+            jar.extract_cookies(r)
+        cookies = []
+        for cookie in jar.jar:
+            entry = {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "httpOnly": cookie.has_nonstandard_attr("HttpOnly"),
+                # Set-Cookie 沒有 Domain 屬性
+                "hostOnly": not cookie.domain_specified,
+            }
+            if cookie.expires is not None:
+                entry["expires"] = cookie.expires
+            cookies.append(entry)
+        return cookies
+
+    def __escalate(self, url: str, reason: str):
+        """記住網域需要瀏覽器。"""
+        FAST_PATH.labels("escalated", reason).inc()
+        domain = domain_of(url)
+        logger.debug("fast path escalated: %s (%s)", domain, reason)
+        self.browser_domains[domain] = time.time() + self.memory_ttl
+        self.browser_domains.move_to_end(domain)
+        while len(self.browser_domains) > self.memory_size:
+            self.browser_domains.popitem(last=False)
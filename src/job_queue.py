@@ -0,0 +1,229 @@
+"""以 SQLite 保存的非同步工作佇列。
+
+`POST /jobs` 送出的請求會寫入資料庫，由排程器依 priority 派發給 crawler，
+並限制同一網域（互為子域名者視為同一網域）同時執行的工作數量。
+服務重啟時，尚未完成的工作會重新排入佇列。
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+import msgspec
+import spool
+from data_structures import V1ResponseBase, decode, decode_request, encode
+from domain import domain_of, same_site
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# 工作狀態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    以 SQLite 保存的工作佇列與排程器。
+    """
+
+    def __init__(self, path, crawlers: dict, max_running=4, domain_limit=2, retention=86400):
+        """
+        Args:
+            path (str): SQLite 資料庫路徑。
+            crawlers (dict): backend 名稱對應到 `async (V1RequestBase) -> V1ResponseBase` 的函式。
+            max_running (int): 同時執行的工作數量上限。
+            domain_limit (int): 同一網域同時執行的工作數量上限。
+            retention (int): 已完成工作保留的秒數。
+        """
+        self.crawlers = crawlers
+        self.max_running = max_running
+        self.domain_limit = domain_limit
+        self.retention = retention
+        self.running: dict[str, str] = {}
+        self.tasks: dict[str, asyncio.Task] = {}
+        self.wakeup = None
+        self.scheduler = None
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, backend TEXT, priority INTEGER, domain TEXT, "
+                "payload TEXT, status TEXT, result TEXT, created REAL, updated REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)")
+
+    async def submit(self, backend: str, data: dict, priority=0):
+        """新增工作。
+        Args:
+            backend (str): 要使用的 crawler 名稱。
+            data (dict): V1RequestBase 的 JSON 資料。
+            priority (int): 優先權，數字越大越先執行。
+        Returns:
+            str: 工作 id。
+        Raises:
+            ValueError: backend 不存在。
+        """
+        if backend not in self.crawlers:
+            raise ValueError(f"未知的 backend: {backend}")
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.__insert, job_id, backend, data, int(priority))
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return job_id
+
+    def __insert(self, job_id, backend, data, priority):
+        """寫入新工作。"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (id, backend, priority, domain, payload, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, backend, priority, domain_of(data.get("url", "")), json.dumps(data), QUEUED, now, now),
+            )
+
+    async def get(self, job_id: str):
+        """取得工作狀態與結果。
+        Args:
+            job_id (str): 工作 id。
+        Returns:
+            V1ResponseBase: 工作的回應物件；工作不存在時為 None。
+        """
+        row = await asyncio.to_thread(self.__fetch, job_id)
+        if row is None:
+            return None
+        status, result = row
+        if result is None:
+            return V1ResponseBase(status=status, message=f"job {job_id} {status}")
+        return decode(result)
+
+    def __fetch(self, job_id):
+        """讀取工作的狀態與結果。"""
+        with self.lock:
+            return self.conn.execute("SELECT status, result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def queued(self):
+        """取得等待中的工作數量。"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    async def start(self):
+        """啟動排程器。"""
+        # 上次關閉時仍在執行的工作重新排入佇列；在啟動時才處理，
+        # 避免 worker 行程匯入主模組時影響正在執行的工作
+        await asyncio.to_thread(self.__requeue)
+        self.wakeup = asyncio.Event()
+        self.scheduler = asyncio.create_task(self.__run())
+
+    def __requeue(self):
+        """將執行中的工作重新排入佇列。"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, RUNNING))
+
+    async def stop(self):
+        """停止排程器，執行中的工作會在下次啟動時重新排入佇列。"""
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+        for task in list(self.tasks.values()):
+            task.cancel()
+
+    async def __run(self):
+        """派發工作，直到有新工作或工作完成時再次檢查。"""
+        last_purge = 0
+        while True:
+            self.wakeup.clear()
+            await self.__dispatch()
+            if time.time() - last_purge > 60:
+                await asyncio.to_thread(self.__purge)
+                last_purge = time.time()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __dispatch(self):
+        """在容量限制內派發優先權最高的工作。"""
+        while len(self.running) < self.max_running:
+            job = await asyncio.to_thread(self.__next_job, list(self.running.values()))
+            if job is None:
+                return
+            job_id, backend, domain, payload = job
+            self.running[job_id] = domain
+            self.tasks[job_id] = asyncio.create_task(self.__execute(job_id, backend, payload))
+
+    def __next_job(self, running: list):
+        """找出網域尚未達到上限、優先權最高的工作，並標記為執行中。
+
+        已達上限的網域直接在 SQL 中排除；互為子域名的網域無法以 SQL 比對，
+        逐頁讀取直到找到可執行的工作，避免前段被同一網域佔滿時後面的工作永遠排不到。
+        Args:
+            running (list): 執行中工作的網域。
+        Returns:
+            tuple: (id, backend, domain, payload)；沒有可執行的工作時為 None。
+        """
+        saturated = sorted({domain for domain in running if self.__saturated(running, domain)})
+        placeholders = ", ".join("?" * len(saturated))
+        query = (
+            "SELECT id, backend, domain, payload FROM jobs WHERE status = ? "
+            f"AND domain NOT IN ({placeholders}) ORDER BY priority DESC, created LIMIT ? OFFSET ?"
+        )
+        offset = 0
+        with self.lock:
+            while True:
+                rows = self.conn.execute(query, (QUEUED, *saturated, 500, offset)).fetchall()
+                for row in rows:
+                    if not self.__saturated(running, row[2]):
+                        with self.conn:
+                            self.conn.execute(
+                                "UPDATE jobs SET status = ?, updated = ? WHERE id = ?", (RUNNING, time.time(), row[0])
+                            )
+                        return row
+                if len(rows) < 500:
+                    return None
+                offset += len(rows)
+
+    def __saturated(self, running: list, domain: str):
+        """網域（含互為子域名者）同時執行的工作是否已達上限。"""
+        return sum(1 for other in running if same_site(other, domain)) >= self.domain_limit
+
+    async def __execute(self, job_id, backend, payload):
+        """執行工作並保存結果。"""
+        try:
+            res = await self.crawlers[backend](decode_request(payload))
+            status = DONE
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("job %s failed: %s", job_id, e)
+            res = V1ResponseBase(status="error", message=str(e))
+            status = FAILED
+        finally:
+            self.running.pop(job_id, None)
+            self.tasks.pop(job_id, None)
+            if self.wakeup is not None:
+                self.wakeup.set()
+        # 結果保存在資料庫中，暫存檔的內容讀回字串
+        result = encode(msgspec.structs.replace(res, solution=spool.materialize(res.solution))).decode()
+        await asyncio.to_thread(self.__finish, job_id, status, result)
+
+    def __finish(self, job_id, status, result):
+        """保存工作結果。"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated = ? WHERE id = ?",
+                (status, result, time.time(), job_id),
+            )
+
+    def __purge(self):
+        """刪除超過保留時間的已完成工作。"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?",
+                (DONE, FAILED, time.time() - self.retention),
+            )
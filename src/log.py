@@ -0,0 +1,117 @@
+"""結構化日誌，以 JSON lines 輸出到 stderr。
+
+各模組以 `logger = get_logger(__name__)` 取得 logger，並使用 `%` 佔位符延遲格式化：
+    logger.debug("wait_until: %s state: %s", req.wait_until, state)
+停用的等級只會做一次等級檢查。啟用的紀錄放入佇列，由背景線程格式化並寫出，
+不會在事件迴圈或 Selenium 線程中阻塞於 I/O。
+
+每個請求的 request_id 以 contextvar 傳遞（Selenium 線程透過 `copy_context` 帶入），
+該請求期間的所有紀錄都會帶有 request_id。
+
+環境變數：
+    LOG_LEVEL: DEBUG、INFO（預設）、WARNING 或 ERROR。
+    LOG_FORMAT: "json"（預設）或 "text"。
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import uuid
+from contextvars import ContextVar
+
+from data_structures import V1RequestBase
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+ROOT = "crawler"
+
+request_id_var: ContextVar = ContextVar("request_id", default=None)
+_listener = None
+
+
+def get_logger(name: str):
+    """取得模組的 logger。
+    Args:
+        name (str): 模組名稱，通常為 __name__。
+    Returns:
+        logging.Logger: 位於 "crawler" 之下的 logger。
+    """
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def bind_request(req: V1RequestBase):
+    """設定目前請求的 request_id，請求沒有帶 request_id 時產生一個。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        str: request_id。
+    """
+    if not req.request_id:
+        req.request_id = uuid.uuid4().hex
+    request_id_var.set(req.request_id)
+    return req.request_id
+
+
+class ContextFilter(logging.Filter):
+    """在產生紀錄的線程中取得 request_id。"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """把紀錄格式化為一行 JSON。"""
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name[len(ROOT) + 1 :],
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """不在呼叫端格式化訊息，交由背景線程處理。"""
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, output=None):
+    """設定 "crawler" logger，重複呼叫時不做任何事。
+    Args:
+        level (str): 日誌等級。
+        fmt (str): "json" 或 "text"。
+        output: 寫出的檔案物件，None 表示 stderr。
+    """
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(output)
+    if fmt == "text":
+        stream.setFormatter(logging.Formatter("[%(asctime)s][%(levelname)s][%(name)s][%(request_id)s] %(message)s"))
+    else:
+        stream.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(ContextFilter())
+
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,162 @@
+"""每個請求的階段計時與 Prometheus 指標。
+
+crawl 開始時以 `start_timings` 建立計時物件並放入 contextvar，
+crawler 內部以 `with phase("navigation"):` 記錄各階段耗時（毫秒，重試時累加），
+結果放在回應的 `timings` 欄位，並同時寫入 `crawler_phase_seconds` histogram。
+每個階段開始前檢查請求的期限，期限已過時拋出 DeadlineExceeded（見 deadline 模組）。
+Selenium 在線程池中執行，需以 `contextvars.copy_context().run` 帶入 contextvar。
+
+階段名稱：
+    queue: 等待可用的瀏覽器、分頁或工作階段。
+    http: 快速路徑的 HTTP 請求（fast_path）。
+    probe: 條件式重新抓取的 HEAD 探測。
+    launch: 啟動瀏覽器。
+    session: 建立具名工作階段的瀏覽器情境與分頁。
+    cookies: 注入與讀取 cookies。
+    navigation: 導航到網址。
+    wait: 等待頁面就緒（wait_until 策略）。
+    actions: 執行 actions。
+    screenshot: 擷取截圖。
+    extract: 在頁面內擷取欄位。
+    content: 取得網頁 HTML。
+    serialize: 把回應編碼為 JSON。
+    total: 整個請求。
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from deadline import DeadlineExceeded, current_deadline
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+PHASE_SECONDS = Histogram(
+    "crawler_phase_seconds", "Time spent in each phase of a crawl", ["backend", "phase"], buckets=BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "crawler_request_seconds", "End-to-end crawl latency", ["backend", "cache_status"], buckets=BUCKETS
+)
+RESPONSES = Counter("crawler_responses_total", "Crawl responses by status code", ["backend", "status"])
+RETRIES = Counter("crawler_retries_total", "Page load retries", ["backend"])
+BROWSER_RESTARTS = Counter("browser_restarts_total", "Browsers restarted or recycled", ["backend", "reason"])
+FAST_PATH = Counter(
+    "fast_path_total", "HTTP fast path outcomes (served, skipped or escalated to a browser)", ["result", "reason"]
+)
+CONDITIONAL = Counter(
+    "conditional_requests_total", "Conditional recrawl outcomes (not_modified, unchanged or changed)", ["result"]
+)
+SESSIONS = Gauge("browser_sessions", "Open named browser sessions")
+SESSIONS_CLOSED = Counter(
+    "browser_sessions_closed_total", "Named browser sessions closed (idle, limit or error)", ["reason"]
+)
+ROUTER = Counter(
+    "router_attempts_total", "Backend attempts made by the /v3 router by outcome", ["backend", "outcome"]
+)
+DEADLINES = Counter(
+    "crawler_deadline_exceeded_total", "Requests that ran out of max_timeout by phase", ["backend", "phase"]
+)
+DISCONNECTS = Counter("crawler_client_disconnects_total", "Crawls cancelled because the client disconnected")
+QUEUE_DEPTH = Gauge("crawler_queue_depth", "Requests waiting for a browser, tab or job slot", ["queue"])
+
+_timings: ContextVar = ContextVar("timings", default=None)
+
+
+class Timings:
+    """
+    一個請求各階段的耗時。
+    """
+
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        """累加階段耗時並寫入 histogram。"""
+        self.phases[name] = round(self.phases.get(name, 0) + seconds * 1000, 3)
+        PHASE_SECONDS.labels(self.backend, name).observe(seconds)
+
+    def finish(self, status, cache_status=None):
+        """記錄整個請求的耗時與狀態碼。
+        Args:
+            status: HTTP 狀態碼。
+            cache_status (str): 回應快取狀態。
+        Returns:
+            dict: 各階段耗時（毫秒）。
+        """
+        seconds = time.perf_counter() - self.started
+        self.phases["total"] = round(seconds * 1000, 3)
+        REQUEST_SECONDS.labels(self.backend, cache_status or "none").observe(seconds)
+        RESPONSES.labels(self.backend, str(status)).inc()
+        return self.phases
+
+
+def start_timings(backend: str):
+    """建立目前請求的計時物件。
+    Args:
+        backend (str): "selenium" 或 "nodriver"。
+    Returns:
+        Timings: 計時物件。
+    """
+    timings = Timings(backend)
+    _timings.set(timings)
+    return timings
+
+
+def current_timings():
+    """取得目前請求的計時物件，不在請求中時為 None。"""
+    return _timings.get()
+
+
+@contextmanager
+def phase(name: str):
+    """記錄區塊的耗時，不在請求中時不做任何事。
+    Raises:
+        DeadlineExceeded: 進入階段時期限已過，或階段中的錯誤發生在期限之後。
+    """
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.enter(name)
+    timings = _timings.get()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        # 逾時的等待（頁面載入、WebDriverWait、HTTP 等）以期限回報
+        if deadline is not None and deadline.expired() and not isinstance(e, DeadlineExceeded):
+            raise DeadlineExceeded(name) from e
+        raise
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - started)
+
+
+def deadline_exceeded(phase_name: str):
+    """記錄一次超過期限的請求。"""
+    timings = _timings.get()
+    DEADLINES.labels(timings.backend if timings is not None else "unknown", phase_name).inc()
+
+
+def retried():
+    """記錄一次頁面載入重試。"""
+    timings = _timings.get()
+    RETRIES.labels(timings.backend if timings is not None else "unknown").inc()
+
+
+def browser_restarted(backend: str, reason: str):
+    """記錄一次瀏覽器重啟或回收。
+    Args:
+        backend (str): "selenium" 或 "nodriver"。
+        reason (str): "error"、"max_requests"、"unresponsive" 或 "rss"。
+    """
+    BROWSER_RESTARTS.labels(backend, reason).inc()
+
+
+def render_latest():
+    """以 Prometheus 文字格式輸出所有指標。
+    Returns:
+        tuple[bytes, str]: 內容與 content type。
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
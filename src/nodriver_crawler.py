@@ -3,155 +3,460 @@
 import asyncio
 import os
 import platform
-import time
 
+import deadline
 import nodriver as uc
+from actions import run_actions_nodriver
+from browser_sessions import SessionManager
+from cookie_jar import CookieJar, request_cookies
 from data_structures import ActionT, SolutionResultT, V1RequestBase
-from dbg import dbg
+from domain import is_subdomain
+from extraction import extract_nodriver
+from log import get_logger
+from metrics import browser_restarted, phase, retried
+from nodriver import cdp
+from page_content import read_content_nodriver, reject_oversize
+from readiness import READY, NetworkIdleTracker, wait_ready_nodriver
+from resource_blocking import ResourceBlocker
+from response_cache import normalize_url
+from screenshot import capture_nodriver
+
+logger = get_logger(__name__)
 
 if platform.system() == "Windows":
     COOKIES_FILE = "X:\\windows\\cookies.dat"
 else:
     COOKIES_FILE = "/app/cookies.dat"
 
+# 期限到時重置分頁的上限秒數
+RESET_TIMEOUT = 10
+
 
 class NodriverCrawler:
     """
     提供網頁操作相關功能的類別。
     """
 
-    def __init__(self):
+    def __init__(self, max_tabs=4, cookie_jar: CookieJar = None, max_requests=0, max_sessions=16, session_ttl=600):
+        """
+        Args:
+            max_tabs (int): 同一個瀏覽器中可同時使用的分頁數量（不含工作階段的分頁）。
+            cookie_jar (CookieJar): 與其他 crawler 共用的 cookie jar。
+            max_requests (int): 瀏覽器處理多少請求後回收，0 表示不回收。
+            max_sessions (int): 具名工作階段的數量上限。
+            session_ttl (float): 工作階段閒置多少秒後關閉。
+        """
         self.browser = None
+        self.cookie_jar = cookie_jar
         self.solution = None
+        self.max_tabs = max_tabs
+        self.max_requests = max_requests
+        self.request_count = 0
+        self.idle_tabs: list[uc.Tab] = []
+        # 使用中的分頁對應到所屬的瀏覽器，回收後舊瀏覽器等分頁歸還才關閉
+        self.in_use: dict[uc.Tab, uc.Browser] = {}
+        self.recycling = None
+        self.waiting = 0
+        self.tab_semaphore = None
+        self.start_lock = None
+        self.sessions = SessionManager(max_sessions, session_ttl)
+
+    async def start(self):
+        """啟動瀏覽器（預熱）。"""
+        await self.__start_browser()
+
+    def close(self):
+        """關閉瀏覽器。"""
+        browsers = set(self.in_use.values())
+        if self.browser is not None:
+            browsers.add(self.browser)
+        self.browser = None
+        self.idle_tabs = []
+        self.sessions.clear()
+        for browser in browsers:
+            browser.stop()
+
+    async def health_check(self, over_limit, timeout=10):
+        """關閉閒置的工作階段，並檢查瀏覽器是否還能回應，無回應或超過記憶體上限時回收。
+        Args:
+            over_limit: 接受瀏覽器行程 id，回傳是否超過記憶體上限的函式，在線程中呼叫。
+            timeout (float): 等待瀏覽器回應的秒數。
+        """
+        await self.sessions.evict_idle()
+        browser = self.browser
+        if browser is None:
+            return
+        try:
+            # 以 SystemInfo.getProcessInfo 確認瀏覽器能回應，同時取得 Chrome 主行程 id
+            processes = await asyncio.wait_for(browser.connection.send(cdp.system_info.get_process_info()), timeout)
+        except Exception as e:
+            logger.warning("瀏覽器沒有回應，回收瀏覽器: %s", e)
+            await self.recycle("unresponsive")
+            return
+        pid = next((process.id_ for process in processes if process.type_ == "browser"), None)
+        # 讀取行程樹的記憶體用量需要走訪 /proc，在線程中執行
+        if await asyncio.to_thread(over_limit, pid):
+            await self.recycle("rss")
+
+    async def recycle(self, reason="error"):
+        """啟動新的瀏覽器取代目前的瀏覽器，舊瀏覽器在沒有使用中的分頁後關閉。
+        Args:
+            reason (str): 回收原因，記錄在指標中。
+        """
+        browser_restarted("nodriver", reason)
+        async with self.__lock():
+            old = self.browser
+            self.browser = None
+            self.idle_tabs = []
+            await self.__launch()
+        if old is not None and old not in self.in_use.values():
+            old.stop()
+        logger.info("已回收瀏覽器")
 
     async def get(self, req: V1RequestBase):
-        """載入指定網址並取得網頁資訊。
+        """載入指定網址並取得網頁資訊，等待分頁與所有階段共用請求的期限。
         Args:
             req (V1RequestBase): 包含請求資訊的物件。
         Returns:
             SolutionResultT: 包含網頁資訊的結果物件。
+        Raises:
+            DeadlineExceeded: 請求超過期限，分頁已重置。
         """
-        dbg(f"get: {req.url}")
+        logger.debug("get: %s", req.url)
 
-        if self.browser is None:
-            browser = self.browser = await uc.start()
-            if os.path.exists(COOKIES_FILE):
-                await browser.cookies.load(COOKIES_FILE)
-        else:
-            browser = self.browser
+        # 期限到時取消請求，分頁在歸還時重置（工作階段的分頁保留，下一個請求重新導航）
+        if req.session_id is not None:
+            return await deadline.run(self.__get_session(req))
+        return await deadline.run(self.__get_tab(req))
+
+    async def __get_tab(self, req: V1RequestBase):
+        """使用閒置分頁載入網址，同時使用的分頁數由 max_tabs 限制。"""
+        if self.tab_semaphore is None:
+            self.tab_semaphore = asyncio.Semaphore(self.max_tabs)
+        self.waiting += 1
+        try:
+            with phase("queue"):
+                await self.tab_semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            with phase("launch"):
+                browser = await self.__start_browser()
+            tab = await self.__checkout_tab(browser)
+            self.in_use[tab] = browser
+            self.request_count += 1
+            blocker = ResourceBlocker.from_option(req.block_resources)
+            try:
+                if blocker is not None:
+                    await blocker.attach(tab)
+                solution = await self.__get(browser, tab, req)
+                if blocker is not None:
+                    solution.blocked_requests = blocker.blocked_requests
+                    solution.blocked_bytes = blocker.blocked_bytes
+                return solution
+            finally:
+                if blocker is not None:
+                    await blocker.detach()
+                del self.in_use[tab]
+                await self.__checkin_tab(browser, tab)
+                self.__schedule_recycle()
+        finally:
+            self.tab_semaphore.release()
+
+    async def __get_session(self, req: V1RequestBase):
+        """使用工作階段的瀏覽器情境與分頁載入網址，同一工作階段的請求依序處理。
+        工作階段的分頁不放回閒置列表，也不計入 max_tabs。
+        """
+        with phase("launch"):
+            browser = await self.__start_browser()
+        self.waiting += 1
+        try:
+            with phase("queue"):
+                session = await self.sessions.acquire(req.session_id)
+        finally:
+            self.waiting -= 1
+        try:
+            if session.browser is not self.browser:
+                browser = self.browser or browser
+                with phase("session"):
+                    await self.sessions.open(session, browser)
+            browser, tab = session.browser, session.tab
+            self.in_use[tab] = browser
+            self.request_count += 1
+            blocker = ResourceBlocker.from_option(req.block_resources)
+            try:
+                if blocker is not None:
+                    await blocker.attach(tab)
+                solution = await self.__get(browser, tab, req, session=True)
+                if blocker is not None:
+                    solution.blocked_requests = blocker.blocked_requests
+                    solution.blocked_bytes = blocker.blocked_bytes
+                return solution
+            except deadline.DeadlineExceeded:
+                raise
+            except Exception:
+                # 分頁可能已損壞，下一個請求重新建立工作階段
+                await self.sessions.discard(session)
+                raise
+            finally:
+                if blocker is not None:
+                    await blocker.detach()
+                del self.in_use[tab]
+                # 瀏覽器已回收時，沒有使用中的分頁後關閉
+                if browser is not self.browser and browser not in self.in_use.values():
+                    browser.stop()
+                self.__schedule_recycle()
+        finally:
+            self.sessions.release(session)
+
+    def __schedule_recycle(self):
+        """處理的請求數達到上限時在背景回收瀏覽器。"""
+        if self.max_requests and self.request_count >= self.max_requests and self.recycling is None:
+            logger.info("瀏覽器已處理 %d 個請求，回收瀏覽器", self.request_count)
+            self.recycling = asyncio.create_task(self.__recycle_in_background())
+
+    def __lock(self):
+        if self.start_lock is None:
+            self.start_lock = asyncio.Lock()
+        return self.start_lock
+
+    async def __launch(self):
+        """啟動新的瀏覽器，需在 start_lock 中呼叫。"""
+        browser = await uc.start()
+        if os.path.exists(COOKIES_FILE):
+            await browser.cookies.load(COOKIES_FILE)
+        self.idle_tabs.append(browser.main_tab)
+        self.request_count = 0
+        self.browser = browser
+
+    async def __start_browser(self):
+        """啟動瀏覽器，多個請求同時呼叫時只會啟動一次。"""
+        async with self.__lock():
+            if self.browser is None:
+                await self.__launch()
+        return self.browser
 
+    async def __recycle_in_background(self):
+        try:
+            await self.recycle("max_requests")
+        except Exception as e:
+            logger.error("回收瀏覽器失敗: %s", e)
+        finally:
+            self.recycling = None
+
+    async def __checkout_tab(self, browser: uc.Browser):
+        """取出閒置的分頁，沒有閒置分頁時開啟新分頁。"""
+        if self.idle_tabs:
+            return self.idle_tabs.pop()
+        return await browser.get("about:blank", new_tab=True)
+
+    async def __checkin_tab(self, browser: uc.Browser, tab: uc.Tab):
+        """重置分頁並放回閒置列表，重置失敗時關閉分頁。
+        分頁屬於已回收的瀏覽器時直接關閉，該瀏覽器沒有使用中的分頁後一併關閉。
+        """
+        if browser is not self.browser:
+            if browser not in self.in_use.values():
+                browser.stop()
+            else:
+                try:
+                    await tab.close()
+                except Exception:
+                    pass
+            return
+        try:
+            # 期限到時分頁可能還在載入，重置不等待超過 RESET_TIMEOUT 秒
+            await asyncio.wait_for(tab.get("about:blank"), RESET_TIMEOUT)
+            self.idle_tabs.append(tab)
+        except Exception as e:
+            logger.warning("重置分頁失敗: %s", e)
+            try:
+                await tab.close()
+            except Exception:
+                pass
+
+    async def __get(self, browser: uc.Browser, tab: uc.Tab, req: V1RequestBase, session=False):
+        """使用指定分頁載入網址並取得網頁資訊。
+        session 為 True 時分頁屬於工作階段：不使用共用的 cookie jar，分頁已在該網址時不重新導航。
+        """
         for attempt in range(req.retry_count + 1):
+            if attempt > 0:
+                retried()
             if attempt > 1:
-                dbg(f"嘗試次數: {attempt}/{req.retry_count - 1}")
+                logger.debug("嘗試次數: %d/%d", attempt, req.retry_count - 1)
+            tracker = NetworkIdleTracker() if req.wait_until == "network_idle" else None
+            # 在導航前注入 cookies
+            with phase("cookies"):
+                await self.__handle_cookies(tab, req, session)
             try:
-                page = await browser.get(req.url)
+                if tracker is not None:
+                    await tracker.attach(tab)
+                with phase("navigation"):
+                    if session and attempt == 0 and await self.__is_current(tab, req.url):
+                        # 沿用工作階段分頁目前的頁面與狀態
+                        page = tab
+                    else:
+                        page = await tab.get(req.url)
+                # 依 wait_until 策略判斷頁面載入情況，等待時間不超過期限
+                timeout = deadline.remaining(req.max_timeout / 1000)
+                with phase("wait"):
+                    state, wait_time = await wait_ready_nodriver(page, req, timeout, tracker)
+            except deadline.DeadlineExceeded:
+                raise
             except Exception as e:
                 msg = f"get url error: {req.url}\n{e}\n"
-                dbg(msg)
-                return SolutionResultT({"response": msg, "status": 500, "url": req.url})
-
-            # 用page_size判斷頁面載入情況
-            page_loaded = False
-            timeout = int(req.max_timeout / 1000)
-            for i in range(timeout):
-                page_size = len(await page.get_content())
-                dbg(f"[{i}]page size: {page_size}")
-                if page_size == 39:
-                    break
-                if page_size > req.page_size:
-                    page_loaded = True
-                    break
-                time.sleep(1)
-            if not page_loaded:
+                logger.warning(msg)
+                return SolutionResultT(response=msg, status=500, url=req.url)
+            finally:
+                if tracker is not None:
+                    tracker.detach()
+            logger.debug("wait_until: %s state: %s wait_time: %sms", req.wait_until, state, wait_time)
+            if state != READY:
                 continue
 
-            msg = await self.__handle_actions(page, req.actions)
+            # 以單一頁面腳本執行 actions，失敗時退回逐步執行
+            msg, action_results = "", None
+            if req.actions:
+                with phase("actions"):
+                    msg, action_results = await run_actions_nodriver(
+                        page, req.actions, lambda actions: self.__handle_actions(page, actions)
+                    )
             if msg:
-                return SolutionResultT({"response": msg, "status": 500, "url": req.url})
+                return SolutionResultT(response=msg, status=500, url=req.url, action_results=action_results)
 
             # 取得截圖
             screenshot_base64 = ""
+            if req.screenshot:
+                with phase("screenshot"):
+                    screenshot_base64 = await capture_nodriver(page, req)
 
-            # 取得網頁資訊
-            solution = {
-                "cookies": [],
-                "headers": "",
-                "response": await page.get_content(),
-                "status": 200,
-                "url": req.url,
-                "userAgent": "",
-                "screenshot_base64": screenshot_base64,
-            }
-
-            await browser.cookies.save(COOKIES_FILE)
+            # 在頁面內擷取指定欄位
+            data = None
+            if req.extract:
+                with phase("extract"):
+                    data = await extract_nodriver(page, req.extract)
+
+            # 取得 cookies 並寫回 cookie jar
+            with phase("cookies"):
+                cookies = [cookie.to_json() for cookie in await page.send(cdp.network.get_cookies(urls=[req.url]))]
+                if self.cookie_jar is not None and not session:
+                    self.cookie_jar.update(cookies)
+
+            # 取得網頁資訊，大型網頁分段讀取並寫入暫存檔
+            body = None
+            if req.include_html:
+                with phase("content"):
+                    body = await read_content_nodriver(page, req)
+                rejected = reject_oversize(req, body)
+                if rejected is not None:
+                    return rejected
             # 回傳網頁資訊
-            return SolutionResultT(solution)
+            solution = SolutionResultT(
+                cookies=cookies,
+                headers="",
+                data=data,
+                status=200,
+                url=req.url,
+                user_agent="",
+                screenshot_base64=screenshot_base64,
+                wait_time=wait_time,
+                action_results=action_results,
+            )
+            return body.fill(solution) if body is not None else solution
+        msg = "達到最大重試次數，放棄操作"
+        logger.warning(msg)
+        return SolutionResultT(response=msg, status=500, url=req.url)
+
+    async def __handle_cookies(self, tab: uc.Tab, req: V1RequestBase, session=False):
+        """以 CDP Network.setCookies 注入請求中的 cookies 與 cookie jar 中適用的 cookies。
+        Args:
+            tab (uc.Tab): 要導航的分頁。
+            req (V1RequestBase): 包含請求資訊的物件。
+            session (bool): 分頁屬於工作階段，只注入請求中的 cookies。
+        """
+        cookies = self.cookie_jar.cookies_for(req.url) if self.cookie_jar is not None and not session else []
+        cookies += request_cookies(req.cookies, req.url)
+        if not cookies:
+            return
+        try:
+            await tab.send(cdp.network.set_cookies([cdp.network.CookieParam.from_json(cookie) for cookie in cookies]))
+        except Exception as e:
+            logger.warning("設定 cookies 失敗: %s", e)
 
     async def __handle_actions(self, tab: uc.Tab, actions: list[ActionT]):
-        """處理 actions 事件。
+        """逐步處理 actions 事件，批次腳本失敗時使用。
         Args:
             actions (list): actions 列表。
         Returns:
             str: 發生錯誤時的錯誤訊息，否則為空字串。
         """
         for action in actions:
+            if action.trigger not in ("clickable", "input", "located"):
+                continue
+            path = action.select or action.xpath or action.find
+            if not path:
+                return "action path is empty"
             if action.trigger == "clickable":
                 try:
-                    if action.select:
-                        enter_button = await tab.select(action.select, timeout=action.timeout)
-                    elif action.find:
-                        enter_button = await tab.find(action.find, timeout=action.timeout)
-                    else:
-                        return "action path is empty"
+                    enter_button = await self.__locate(tab, action)
                     # 點擊連結
                     await enter_button.click()
-                    dbg(f"成功點擊{action.xpath}連結")
+                    logger.debug("成功點擊%s連結", path)
                 except asyncio.TimeoutError:
-                    dbg(f"找不到{action.xpath}連結")
+                    logger.debug("找不到%s連結", path)
                 except Exception as e:
-                    msg = f"點擊{action.xpath}，連結失敗: {e}"
-                    dbg(msg)
+                    msg = f"點擊{path}，連結失敗: {e}"
+                    logger.warning(msg)
                     return msg
             elif action.trigger == "input":
                 try:
-                    if action.select:
-                        enter_button = await tab.select(action.select, timeout=action.timeout)
-                    elif action.find:
-                        enter_button = await tab.find(action.find, timeout=action.timeout)
-                    else:
-                        return "action path is empty"
+                    enter_button = await self.__locate(tab, action)
                     await enter_button.send_keys(action.value)
                 except asyncio.TimeoutError:
-                    pass
-                    # dbg(f"等不到{event.xpath}連結")
+                    logger.debug("找不到%s輸入框", path)
                 except Exception as e:
-                    msg = f"等待{action.xpath}連結失敗: {e}"
-                    dbg(msg)
+                    msg = f"輸入{path}失敗: {e}"
+                    logger.warning(msg)
                     return msg
             elif action.trigger == "located":
                 try:
-                    if action.select:
-                        enter_button = await tab.select(action.select, timeout=action.timeout)
-                    elif action.find:
-                        enter_button = await tab.find(action.find, timeout=action.timeout)
-                    else:
-                        return "action path is empty"
-                    # dbg(f"等到{event.xpath}連結")
+                    await self.__locate(tab, action)
                 except asyncio.TimeoutError:
-                    pass
-                    # dbg(f"等不到{event.xpath}連結")
+                    logger.debug("等不到%s連結", path)
                 except Exception as e:
-                    msg = f"等待{action.xpath}連結失敗: {e}"
-                    dbg(msg)
+                    msg = f"等待{path}連結失敗: {e}"
+                    logger.warning(msg)
                     return msg
 
         return ""
 
+    @staticmethod
+    async def __is_current(tab: uc.Tab, url: str):
+        """檢查分頁目前是否已在指定網址。"""
+        try:
+            current = await tab.evaluate("location.href", return_by_value=True)
+        except Exception:
+            return False
+        return isinstance(current, str) and normalize_url(current) == normalize_url(url)
+
+    @staticmethod
+    async def __locate(tab: uc.Tab, action: ActionT):
+        """依 select、xpath、find 的順序尋找元素，逾時拋出 asyncio.TimeoutError。"""
+        if action.select:
+            element = await tab.select(action.select, timeout=action.timeout)
+        elif action.xpath:
+            elements = await tab.xpath(action.xpath, timeout=action.timeout)
+            element = elements[0] if elements else None
+        else:
+            element = await tab.find(action.find, timeout=action.timeout)
+        if element is None:
+            raise asyncio.TimeoutError()
+        return element
+
     def is_subdomain(self, subdomain, domain):
         """
         檢查 subdomain 是否為 domain 的子域名
         """
-        return subdomain == domain or subdomain.endswith(f".{domain}")
+        return is_subdomain(subdomain, domain)
 
 
 async def main_test():
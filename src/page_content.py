@@ -0,0 +1,130 @@
+"""分段讀取網頁 HTML，供 SeleniumCrawler 與 NodriverCrawler 共用。
+
+HTML 不超過 CHUNK_CHARS 個字元時以原本的方式（page_source / get_content）一次取得；
+較大的網頁先在頁面中序列化並暫存在 window 變數，再以每次最多 CHUNK_CHARS 個字元的切片讀回，
+避免單一協定訊息帶著整份 HTML。讀回的內容交給 PageBody：超過門檻時寫入暫存檔，
+超過 max_response_bytes 時停止讀取。
+切片以 JSON 字串回傳：nodriver 以 deep serialization 回傳陣列，無法直接取得值。
+"""
+
+import orjson
+from data_structures import SolutionResultT, V1RequestBase
+from spool import PageBody
+
+CHUNK_CHARS = 256 * 1024
+PAGE_VAR = "__crawlerPage"
+
+# 序列化頁面並回傳長度，超過 CHUNK_CHARS 時暫存在 window 變數中
+STASH_JS = f"""
+(() => {{
+    const doctype = document.doctype ? new XMLSerializer().serializeToString(document.doctype) : "";
+    const page = doctype + (document.documentElement ? document.documentElement.outerHTML : "");
+    if (page.length > {CHUNK_CHARS}) window.{PAGE_VAR} = page;
+    return page.length;
+}})()
+"""
+
+# 回傳 [切片, 下一個位置] 的 JSON，不在代理對（surrogate pair）中間切開
+SLICE_JS = f"""
+((start, size) => {{
+    const page = window.{PAGE_VAR};
+    let end = Math.min(start + size, page.length);
+    if (end < page.length) {{
+        const code = page.charCodeAt(end - 1);
+        if (code >= 0xD800 && code <= 0xDBFF) end -= 1;
+    }}
+    return JSON.stringify([page.slice(start, end), end]);
+}})
+"""
+
+CLEANUP_JS = f"delete window.{PAGE_VAR};"
+
+
+def _decode_slice(result):
+    """解碼 SLICE_JS 的結果。
+    Returns:
+        tuple[str, int]: 切片與下一個位置。
+    Raises:
+        RuntimeError: 結果不是預期的 JSON（例如暫存的頁面已被導航清除）。
+    """
+    try:
+        chunk, end = orjson.loads(result)
+    except (orjson.JSONDecodeError, TypeError, ValueError):
+        raise RuntimeError(f"讀取網頁內容失敗: {result!r}") from None
+    return chunk, end
+
+
+def read_content_selenium(driver, req: V1RequestBase):
+    """讀取 Selenium 頁面的 HTML。
+    Args:
+        driver: Selenium WebDriver。
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        PageBody: 網頁內容。
+    """
+    body = PageBody(req.max_response_bytes)
+    length = driver.execute_script(f"return ({STASH_JS.strip()});")
+    if not isinstance(length, (int, float)) or length <= CHUNK_CHARS:
+        body.write(driver.page_source)
+        return body
+    try:
+        start = 0
+        while start < length:
+            result = driver.execute_script(
+                f"return ({SLICE_JS.strip()})(arguments[0], arguments[1]);", start, CHUNK_CHARS
+            )
+            chunk, start = _decode_slice(result)
+            if not body.write(chunk):
+                break
+    except BaseException:
+        body.discard()
+        raise
+    finally:
+        try:
+            driver.execute_script(CLEANUP_JS)
+        except Exception:
+            pass
+    return body
+
+
+async def read_content_nodriver(tab, req: V1RequestBase):
+    """讀取 nodriver 分頁的 HTML。
+    Args:
+        tab: nodriver 分頁。
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        PageBody: 網頁內容。
+    """
+    body = PageBody(req.max_response_bytes)
+    length = await tab.evaluate(STASH_JS, return_by_value=True)
+    if not isinstance(length, (int, float)) or length <= CHUNK_CHARS:
+        body.write(await tab.get_content())
+        return body
+    try:
+        start = 0
+        while start < length:
+            result = await tab.evaluate(f"{SLICE_JS}({start}, {CHUNK_CHARS})", return_by_value=True)
+            chunk, start = _decode_slice(result)
+            if not body.write(chunk):
+                break
+    except BaseException:
+        body.discard()
+        raise
+    finally:
+        try:
+            await tab.evaluate(CLEANUP_JS)
+        except Exception:
+            pass
+    return body
+
+
+def reject_oversize(req: V1RequestBase, body: PageBody):
+    """網頁超過 max_response_bytes 且請求不接受截斷時，丟棄內容並回傳 413 結果。
+    Returns:
+        SolutionResultT: 413 結果；不需要拒絕時為 None。
+    """
+    if not body.truncated or req.truncate_response:
+        return None
+    body.discard()
+    msg = f"網頁內容超過 max_response_bytes ({req.max_response_bytes})"
+    return SolutionResultT(response=msg, status=413, url=req.url)
@@ -0,0 +1,93 @@
+"""保存在 JSON 檔案中的記憶體資料，變更由背景工作批次寫入磁碟。
+
+CookieJar、ChangeStore 與 RouterStats 共用的載入與批次寫入：
+子類別實作 `_dump()`（在鎖內呼叫，回傳要保存的資料）與 `_restore(data)`（載入檔案內容），
+並在鎖內修改資料時設定 `self.dirty = True`。寫入先寫到暫存檔再取代原檔，失敗時保留 dirty 等待下次寫入。
+"""
+
+import asyncio
+import json
+import os
+import threading
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class PersistentStore:
+    """
+    以 JSON 檔案保存、可同時由多個線程使用的資料。
+    """
+
+    # 記錄在日誌中的資料名稱
+    description = "資料"
+
+    def __init__(self, path="", flush_interval=5):
+        """
+        Args:
+            path (str): 保存資料的 JSON 檔案，空字串表示不保存。
+            flush_interval (float): 批次寫入磁碟的間隔秒數。
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.flusher = None
+
+    def _dump(self):
+        """取得要保存的資料，在鎖內呼叫。"""
+        raise NotImplementedError
+
+    def _restore(self, data):
+        """載入檔案內容。"""
+        raise NotImplementedError
+
+    def load(self):
+        """從磁碟載入資料，子類別初始化完成後呼叫。"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._restore(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning("讀取%s檔案失敗: %s", self.description, e)
+        with self.lock:
+            self.dirty = False
+
+    def flush(self):
+        """有變更時寫入磁碟。"""
+        if not self.path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            data = self._dump()
+            self.dirty = False
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("寫入%s檔案失敗: %s", self.description, e)
+            with self.lock:
+                self.dirty = True
+
+    async def start(self):
+        """啟動背景批次寫入。"""
+        if self.path:
+            self.flusher = asyncio.create_task(self.__run_flusher())
+
+    async def stop(self):
+        """停止背景批次寫入，並寫入最後的變更。"""
+        if self.flusher is not None:
+            self.flusher.cancel()
+            self.flusher = None
+        await asyncio.to_thread(self.flush)
+
+    async def __run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.dirty:
+                await asyncio.to_thread(self.flush)
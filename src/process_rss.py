@@ -0,0 +1,65 @@
+"""計算行程樹的 RSS，只依賴標準函式庫（有安裝 psutil 時使用 psutil）。
+
+由 browser_lifecycle 判斷瀏覽器是否超過記憶體上限，
+也由 bench/run.py 取樣 API 伺服器的 RSS，基準測試不需要匯入 crawler 的相依套件。
+"""
+
+import os
+import platform
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def process_tree_rss(pid):
+    """計算行程及其所有子行程的 RSS。
+    Args:
+        pid (int): 根行程 id。
+    Returns:
+        int: RSS 位元組數；無法取得時為 0。
+    """
+    if not pid:
+        return 0
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    if platform.system() != "Linux":
+        return 0
+
+    # 沒有 psutil 時從 /proc 讀取行程樹
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 行程名稱可能含有空白，從最後一個 ")" 之後解析
+        ppid = int(stat[stat.rindex(")") + 2 :].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    total = 0
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/statm", "r", encoding="utf-8") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            pass
+    return total
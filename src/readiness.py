@@ -0,0 +1,227 @@
+"""判斷網頁是否載入完成的策略，供 SeleniumCrawler 與 NodriverCrawler 共用。
+
+可用策略（V1RequestBase.wait_until）：
+    page_size: 頁面 HTML 長度超過 page_size（預設，與舊版行為相同）。
+    dom_content_loaded: DOMContentLoaded 事件已觸發。
+    network_idle: 連續 idle_time 毫秒沒有進行中的網路請求。
+    mutation_idle: 連續 idle_time 毫秒 DOM 沒有任何變動。
+    selector: 出現符合 wait_selector (CSS) 或 wait_xpath 的元素。
+
+頁面內的判斷以 JavaScript 執行，只回傳狀態字串，不需要把整個 DOM 傳回 Python。
+"""
+
+import asyncio
+import json
+import time
+
+from data_structures import V1RequestBase
+from nodriver import cdp
+
+STRATEGIES = ("page_size", "dom_content_loaded", "network_idle", "mutation_idle", "selector")
+
+# 等待結果
+READY = "ready"
+EMPTY = "empty"
+TIMEOUT = "timeout"
+
+# 接受一個 opts 物件並回傳 Promise<string> 的頁面腳本
+READY_JS = """
+(opts) => new Promise((resolve) => {
+    const cleanups = [];
+    let finished = false;
+    const finish = (state) => {
+        if (finished) return;
+        finished = true;
+        cleanups.forEach((fn) => fn());
+        resolve(state);
+    };
+    const later = (fn, ms) => {
+        const id = setTimeout(fn, ms);
+        cleanups.push(() => clearTimeout(id));
+    };
+    const observe = (callback) => {
+        const observer = new MutationObserver(callback);
+        observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        cleanups.push(() => observer.disconnect());
+    };
+    const onDomReady = (fn) => {
+        if (document.readyState !== "loading") {
+            fn();
+        } else {
+            const listener = () => fn();
+            document.addEventListener("DOMContentLoaded", listener, {once: true});
+            cleanups.push(() => document.removeEventListener("DOMContentLoaded", listener));
+        }
+    };
+    later(() => finish("timeout"), Math.max(opts.timeout, 0));
+
+    if (opts.strategy === "dom_content_loaded") {
+        onDomReady(() => finish("ready"));
+    } else if (opts.strategy === "mutation_idle") {
+        onDomReady(() => {
+            let idle = null;
+            const arm = () => {
+                if (idle !== null) clearTimeout(idle);
+                idle = setTimeout(() => finish("ready"), opts.idle_time);
+            };
+            cleanups.push(() => clearTimeout(idle));
+            observe(arm);
+            arm();
+        });
+    } else if (opts.strategy === "network_idle") {
+        // 頁面內無法取得進行中的請求，以 Resource Timing 的最後一筆紀錄作為網路活動時間
+        let last = performance.now();
+        const perf = new PerformanceObserver(() => { last = performance.now(); });
+        perf.observe({type: "resource", buffered: false});
+        cleanups.push(() => perf.disconnect());
+        const check = () => {
+            if (document.readyState === "complete" && performance.now() - last >= opts.idle_time) {
+                finish("ready");
+            } else {
+                later(check, 50);
+            }
+        };
+        check();
+    } else if (opts.strategy === "selector") {
+        const found = () => {
+            if (opts.selector && document.querySelector(opts.selector)) return true;
+            if (opts.xpath) {
+                const result = document.evaluate(opts.xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null);
+                if (result.singleNodeValue) return true;
+            }
+            return false;
+        };
+        if (found()) {
+            finish("ready");
+        } else {
+            observe(() => { if (found()) finish("ready"); });
+        }
+    } else {
+        const check = () => {
+            const size = document.documentElement ? document.documentElement.outerHTML.length : 0;
+            // 分頁重置後的 about:blank 也是 39 字元，導航尚未開始時繼續等待
+            if (size === 39 && location.href !== "about:blank") {
+                finish("empty");
+            } else if (size > opts.page_size) {
+                finish("ready");
+            } else {
+                later(check, opts.interval);
+            }
+        };
+        check();
+    }
+})
+"""
+
+
+def build_options(req: V1RequestBase, timeout: float):
+    """建立傳給 READY_JS 的參數。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+        timeout (float): 最長等待秒數。
+    Returns:
+        dict: 頁面腳本的參數。
+    """
+    strategy = req.wait_until if req.wait_until in STRATEGIES else "page_size"
+    return {
+        "strategy": strategy,
+        "timeout": int(timeout * 1000),
+        "idle_time": req.idle_time,
+        "page_size": req.page_size,
+        "selector": req.wait_selector,
+        "xpath": req.wait_xpath,
+        "interval": 250,
+    }
+
+
+def wait_ready_selenium(driver, req: V1RequestBase, timeout: float):
+    """在 Selenium 中等待頁面載入完成。
+    Args:
+        driver: Selenium WebDriver。
+        req (V1RequestBase): 包含請求資訊的物件。
+        timeout (float): 最長等待秒數。
+    Returns:
+        tuple[str, int]: 等待結果（ready / empty / timeout）與等待毫秒數。
+    """
+    start = time.monotonic()
+    opts = build_options(req, timeout)
+    driver.set_script_timeout(timeout + 5)
+    state = driver.execute_async_script(
+        f"const done = arguments[arguments.length - 1]; ({READY_JS})(arguments[0]).then(done);",
+        opts,
+    )
+    return state, int((time.monotonic() - start) * 1000)
+
+
+class NetworkIdleTracker:
+    """以 CDP Network 事件追蹤分頁中進行中的請求。"""
+
+    def __init__(self):
+        self.inflight = set()
+        self.last_activity = time.monotonic()
+        self.tab = None
+
+    async def attach(self, tab):
+        """在導航前註冊 Network 事件。"""
+        self.tab = tab
+        await tab.send(cdp.network.enable())
+        tab.add_handler(cdp.network.RequestWillBeSent, self.on_request)
+        tab.add_handler(cdp.network.LoadingFinished, self.on_done)
+        tab.add_handler(cdp.network.LoadingFailed, self.on_done)
+
+    def detach(self):
+        """移除 Network 事件。"""
+        if self.tab is None:
+            return
+        self.tab.remove_handler(cdp.network.RequestWillBeSent, self.on_request)
+        self.tab.remove_handler(cdp.network.LoadingFinished, self.on_done)
+        self.tab.remove_handler(cdp.network.LoadingFailed, self.on_done)
+        self.tab = None
+
+    def on_request(self, event, tab=None):
+        """請求開始。"""
+        self.inflight.add(event.request_id)
+        self.last_activity = time.monotonic()
+
+    def on_done(self, event, tab=None):
+        """請求完成或失敗。"""
+        self.inflight.discard(event.request_id)
+        self.last_activity = time.monotonic()
+
+    async def wait_idle(self, idle_time: int, timeout: float):
+        """等待連續 idle_time 毫秒沒有進行中的請求。"""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            if not self.inflight and time.monotonic() - self.last_activity >= idle_time / 1000:
+                return READY
+            await asyncio.sleep(0.05)
+        return TIMEOUT
+
+
+async def wait_ready_nodriver(tab, req: V1RequestBase, timeout: float, tracker: NetworkIdleTracker = None):
+    """在 nodriver 分頁中等待頁面載入完成。
+    Args:
+        tab: nodriver 分頁。
+        req (V1RequestBase): 包含請求資訊的物件。
+        timeout (float): 最長等待秒數。
+        tracker (NetworkIdleTracker): network_idle 策略使用的事件追蹤器，須在導航前 attach。
+    Returns:
+        tuple[str, int]: 等待結果（ready / empty / timeout）與等待毫秒數。
+    """
+    start = time.monotonic()
+    opts = build_options(req, timeout)
+    if opts["strategy"] == "network_idle" and tracker is not None:
+        state = await tracker.wait_idle(req.idle_time, timeout)
+        return state, int((time.monotonic() - start) * 1000)
+
+    end = start + timeout
+    state = TIMEOUT
+    while time.monotonic() < end:
+        opts["timeout"] = int((end - time.monotonic()) * 1000)
+        state = await tab.evaluate(f"({READY_JS})({json.dumps(opts)})", await_promise=True, return_by_value=True)
+        if state in (READY, EMPTY, TIMEOUT):
+            break
+        # 導航中執行環境被替換時腳本會失敗，稍候在新的頁面重新執行
+        state = TIMEOUT
+        await asyncio.sleep(0.1)
+    return state, int((time.monotonic() - start) * 1000)
@@ -0,0 +1,196 @@
+"""導航時封鎖不需要的資源（圖片、字型、影音、樣式表、追蹤腳本）。
+
+`V1RequestBase.block_resources` 可為：
+    None: 使用伺服器預設值（環境變數 BLOCK_RESOURCES）。
+    True / "true": 封鎖 DEFAULT_TYPES。
+    False / "": 不封鎖。
+    list 或逗號分隔字串: 要封鎖的資源類型，例如 ["image", "font", "tracker"]。
+    dict: {"types": [...], "patterns": [...]}，patterns 為 CDP 網址萬用字元（* 與 ?）。
+
+資源類型 "tracker" 代表 TRACKER_PATTERNS 中的常見追蹤網域。
+"""
+
+import json
+
+from log import get_logger
+from nodriver import cdp
+
+logger = get_logger(__name__)
+
+DEFAULT_TYPES = ["image", "font", "media", "tracker"]
+
+# CDP Network.ResourceType 名稱
+RESOURCE_TYPES = {
+    "image": "Image",
+    "font": "Font",
+    "media": "Media",
+    "stylesheet": "Stylesheet",
+    "script": "Script",
+    "xhr": "XHR",
+    "fetch": "Fetch",
+    "websocket": "WebSocket",
+    "manifest": "Manifest",
+    "ping": "Ping",
+    "other": "Other",
+}
+
+TRACKER_PATTERNS = [
+    "*://*.google-analytics.com/*",
+    "*://*.googletagmanager.com/*",
+    "*://*.doubleclick.net/*",
+    "*://*.googlesyndication.com/*",
+    "*://connect.facebook.net/*",
+    "*://*.hotjar.com/*",
+    "*://*.scorecardresearch.com/*",
+    "*://*.clarity.ms/*",
+]
+
+# Selenium 無法依資源類型攔截，改以網址路徑的副檔名封鎖
+TYPE_EXTENSIONS = {
+    "Image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"],
+    "Font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "Media": ["mp4", "webm", "mp3", "m4a", "ogg", "m3u8"],
+    "Stylesheet": ["css"],
+}
+
+
+def extension_patterns(extension: str):
+    """網址路徑以副檔名結尾（或接著查詢字串）的萬用字元。
+    以 "://*/" 跳過主機名稱，避免 www.giftcards.com 之類的網域符合 .gif 而封鎖網頁本身。
+    """
+    return [f"*://*/*.{extension}", f"*://*/*.{extension}?*"]
+
+
+def resolve_block_options(option):
+    """解析 block_resources 設定。
+    Args:
+        option: V1RequestBase.block_resources 或 BLOCK_RESOURCES 的值。
+    Returns:
+        tuple[list, list]: CDP 資源類型列表與網址萬用字元列表；不封鎖時為 None。
+    """
+    if option is None or option is False:
+        return None
+    if isinstance(option, str):
+        option = option.strip()
+        if option.lower() in ("", "0", "false", "no"):
+            return None
+        option = True if option.lower() in ("1", "true", "yes") else option.split(",")
+    if option is True:
+        option = DEFAULT_TYPES
+    if isinstance(option, list):
+        option = {"types": option}
+    if not isinstance(option, dict):
+        return None
+
+    types = []
+    patterns = list(option.get("patterns") or [])
+    for name in option.get("types") or []:
+        name = str(name).strip().lower()
+        if name == "tracker":
+            patterns.extend(TRACKER_PATTERNS)
+        elif name in RESOURCE_TYPES:
+            types.append(RESOURCE_TYPES[name])
+        else:
+            logger.debug("忽略未知的資源類型: %s", name)
+    if not types and not patterns:
+        return None
+    return types, patterns
+
+
+def selenium_blocked_urls(types: list, patterns: list):
+    """轉換成 Network.setBlockedURLs 使用的網址列表。"""
+    urls = list(patterns)
+    for resource_type in types:
+        for extension in TYPE_EXTENSIONS.get(resource_type, []):
+            urls.extend(extension_patterns(extension))
+    return urls
+
+
+def count_blocked_selenium(entries: list):
+    """從 Chrome performance log 計算被 Network.setBlockedURLs 封鎖的請求數。
+    封鎖發生在請求送出前，沒有回應標頭可以計算流量。
+    Args:
+        entries (list): `driver.get_log("performance")` 的記錄。
+    Returns:
+        int: Network.loadingFailed 且帶有 blockedReason 的請求數。
+    """
+    count = 0
+    for entry in entries:
+        message = entry.get("message", "")
+        if "Network.loadingFailed" not in message:
+            continue
+        try:
+            event = json.loads(message)["message"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if event.get("method") == "Network.loadingFailed" and event.get("params", {}).get("blockedReason"):
+            count += 1
+    return count
+
+
+class ResourceBlocker:
+    """
+    以 CDP Fetch 攔截 nodriver 分頁的請求。
+
+    符合網址萬用字元的請求在送出前封鎖；符合資源類型的請求在收到回應標頭時封鎖，
+    以 Content-Length 計算節省的流量，回應內容不會被下載。
+    """
+
+    def __init__(self, types: list, patterns: list):
+        self.types = types
+        self.patterns = patterns
+        self.blocked_requests = 0
+        self.blocked_bytes = 0
+        self.tab = None
+
+    @classmethod
+    def from_option(cls, option):
+        """依 block_resources 設定建立，不封鎖時回傳 None。"""
+        resolved = resolve_block_options(option)
+        if resolved is None:
+            return None
+        return cls(*resolved)
+
+    async def attach(self, tab):
+        """在導航前啟用請求攔截。"""
+        self.tab = tab
+        request_patterns = [
+            cdp.fetch.RequestPattern(url_pattern=pattern, request_stage=cdp.fetch.RequestStage.REQUEST)
+            for pattern in self.patterns
+        ]
+        request_patterns += [
+            cdp.fetch.RequestPattern(
+                url_pattern="*",
+                resource_type=cdp.network.ResourceType(resource_type),
+                request_stage=cdp.fetch.RequestStage.RESPONSE,
+            )
+            for resource_type in self.types
+        ]
+        tab.add_handler(cdp.fetch.RequestPaused, self.on_paused)
+        await tab.send(cdp.fetch.enable(patterns=request_patterns))
+
+    async def detach(self):
+        """停用請求攔截。"""
+        if self.tab is None:
+            return
+        tab, self.tab = self.tab, None
+        tab.remove_handler(cdp.fetch.RequestPaused, self.on_paused)
+        try:
+            await tab.send(cdp.fetch.disable())
+        except Exception as e:
+            logger.debug("停用請求攔截失敗: %s", e)
+
+    async def on_paused(self, event: cdp.fetch.RequestPaused, tab=None):
+        """封鎖被攔截的請求。"""
+        self.blocked_requests += 1
+        if event.response_status_code is not None:
+            for header in event.response_headers or []:
+                if header.name.lower() == "content-length" and header.value.isdigit():
+                    self.blocked_bytes += int(header.value)
+                    break
+        try:
+            await (tab or self.tab).send(
+                cdp.fetch.fail_request(event.request_id, cdp.network.ErrorReason.BLOCKED_BY_CLIENT)
+            )
+        except Exception as e:
+            logger.debug("封鎖請求失敗: %s", e)
@@ -0,0 +1,267 @@
+"""放在 crawler 前方的回應快取。
+
+- 以正規化後的 url、actions、cookies、screenshot、wait_until 策略、block_resources、extract 設定
+  與 max_response_bytes / truncate_response 作為快取鍵。
+- 記憶體層使用 LRU，依回應大小限制總容量；可選的磁碟層保存被淘汰或重啟前的結果。
+- 相同的請求同時進行時只會抓取一次，其餘請求共用同一個結果：
+  抓取在獨立的 task 中執行，期限為所有等待者中最晚的期限；每個等待者只在自己的期限內等待，
+  客戶端中斷連線時只放棄自己的等待，所有等待者都離開後才取消抓取。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+import msgspec
+import orjson
+import spool
+from data_structures import SolutionResultT, V1RequestBase, convert, encode
+from deadline import Deadline, current_deadline, use_deadline, wait_shared
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# 回報於 V1ResponseBase.cache_status 的狀態
+HIT = "hit"
+MISS = "miss"
+SHARED = "shared"
+BYPASS = "bypass"
+
+
+def normalize_url(url: str):
+    """正規化網址：scheme 與 host 轉小寫、移除 fragment。"""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+def cache_key(namespace: str, req: V1RequestBase):
+    """計算請求的快取鍵。
+    Args:
+        namespace (str): 區分不同 crawler 的名稱，例如 "v1"、"v2"。
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        str: 快取鍵。
+    """
+    payload = {
+        "namespace": namespace,
+        "url": normalize_url(req.url),
+        "actions": [msgspec.structs.asdict(action) for action in req.actions],
+        "cookies": sorted(json.dumps(cookie, sort_keys=True) for cookie in req.cookies),
+        "screenshot": bool(req.screenshot),
+        "screenshot_options": [req.screenshot_format, req.screenshot_quality, req.screenshot_clip] if req.screenshot else None,
+        # 擷取規則會改變回應內容，也必須納入快取鍵
+        "extract": req.extract,
+        "include_html": bool(req.include_html),
+        # 等待策略與資源封鎖會改變取得的 HTML
+        "wait": [req.wait_until, req.wait_selector, req.wait_xpath],
+        "block_resources": req.block_resources,
+        # 快速路徑的結果是未執行 JavaScript 的原始 HTML
+        "fast_path": req.fast_path,
+        # 大小上限決定內容是否被截斷或拒絕
+        "max_response_bytes": [req.max_response_bytes, bool(req.truncate_response)],
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def solution_size(solution: SolutionResultT):
+    """估計結果的大小，暫存檔的大小也計入，讓容量上限同時限制暫存檔佔用的空間。"""
+    size = 256 + sum(len(value) for value in msgspec.structs.astuple(solution) if isinstance(value, str))
+    if spool.is_spooled(solution):
+        size += solution.response_bytes or 0
+    if solution.data:
+        size += len(json.dumps(solution.data, ensure_ascii=False, default=str))
+    return size
+
+
+def copy_solution(solution: SolutionResultT):
+    """複製結果，避免共用的物件被個別請求修改，暫存檔以硬連結複製。"""
+    return spool.copy(solution)
+
+
+class InflightFetch:
+    """
+    進行中的共用抓取：抓取的 task、共用的期限與等待者數量。
+    """
+
+    def __init__(self, deadline: Deadline):
+        self.task = None
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class ResponseCache:
+    """
+    TTL + LRU 的回應快取，並合併相同的進行中請求。
+    """
+
+    def __init__(self, default_ttl=0, max_bytes=256 * 1024 * 1024, disk_dir="", disk_max_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            default_ttl (int): 請求未指定 cache_ttl 時的快取秒數，0 表示不快取。
+            max_bytes (int): 記憶體層的容量上限。
+            disk_dir (str): 磁碟層目錄，空字串表示不使用磁碟層。
+            disk_max_bytes (int): 磁碟層的容量上限。
+        """
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.inflight: dict[str, InflightFetch] = {}
+        self.disk_writes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    async def fetch(self, namespace: str, req: V1RequestBase, fetcher):
+        """取得快取結果，沒有時呼叫 fetcher 抓取。
+        Args:
+            namespace (str): 區分不同 crawler 的名稱。
+            req (V1RequestBase): 包含請求資訊的物件。
+            fetcher: 不帶參數、回傳 awaitable 的函式，結果為 SolutionResultT。
+        Returns:
+            tuple[SolutionResultT, str]: 結果與快取狀態（hit / miss / shared / bypass）。
+        """
+        # 工作階段的頁面內容取決於登入等狀態，不經過快取
+        if req.no_cache or req.session_id is not None:
+            return await fetcher(), BYPASS
+
+        key = cache_key(namespace, req)
+        ttl = self.default_ttl if req.cache_ttl is None else req.cache_ttl
+        if ttl > 0:
+            solution = self.__get_memory(key)
+            if solution is None and self.disk_dir:
+                entry = await asyncio.to_thread(self.__get_disk, key)
+                if entry is not None:
+                    solution = entry[0]
+                    self.__put_memory(key, solution, entry[1])
+            if solution is not None:
+                return copy_solution(solution), HIT
+
+        # 相同的請求正在抓取中時等待同一個結果，否則在獨立的 task 中抓取
+        own = current_deadline()
+        flight = self.inflight.get(key)
+        status = SHARED
+        if flight is None:
+            shared = Deadline(own.remaining()) if own is not None else None
+            flight = InflightFetch(shared)
+            flight.task = asyncio.create_task(self.__run(key, fetcher, ttl, shared))
+            flight.task.add_done_callback(lambda _: self.__done(key, flight))
+            self.inflight[key] = flight
+            status = MISS
+        elif flight.deadline is not None and own is not None:
+            # 共用的抓取持續到最晚的等待者的期限
+            flight.deadline.extend(Deadline(own.remaining()))
+        flight.waiters += 1
+        try:
+            solution = await wait_shared(flight.task, flight.deadline)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 沒有等待者了，不再為已離開的客戶端抓取
+                flight.task.cancel()
+        return copy_solution(solution), status
+
+    async def __run(self, key, fetcher, ttl, deadline: Deadline):
+        """抓取並寫入快取，在與等待者分開的 task 中執行，使用共用的期限。"""
+        if deadline is not None:
+            use_deadline(deadline)
+        solution = await fetcher()
+        if ttl > 0 and solution.status == 200:
+            self.__put_memory(key, solution, time.time() + ttl)
+            if self.disk_dir:
+                await asyncio.to_thread(self.__put_disk, key, solution, time.time() + ttl)
+        return solution
+
+    def __done(self, key, flight: InflightFetch):
+        """抓取結束時移除進行中的紀錄，並取出例外避免沒有等待者時的警告。"""
+        if self.inflight.get(key) is flight:
+            del self.inflight[key]
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def __get_memory(self, key):
+        """從記憶體層取得未過期的結果。"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, size, solution = entry
+        if expires < time.time():
+            del self.entries[key]
+            self.size -= size
+            return None
+        self.entries.move_to_end(key)
+        return solution
+
+    def __put_memory(self, key, solution: SolutionResultT, expires: float):
+        """寫入記憶體層，超過容量時淘汰最久未使用的結果。"""
+        size = solution_size(solution)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self.entries[key] = (expires, size, solution)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, old_size, _) = self.entries.popitem(last=False)
+            self.size -= old_size
+
+    def __disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def __get_disk(self, key):
+        """從磁碟層取得未過期的結果與到期時間。"""
+        path = self.__disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return convert(entry["solution"], SolutionResultT), entry["expires"]
+
+    def __put_disk(self, key, solution: SolutionResultT, expires: float):
+        """寫入磁碟層，每 100 次寫入清理一次超過容量的舊檔案。"""
+        path = self.__disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                # 暫存檔中的網頁分段寫入，不整份讀入記憶體
+                f.write(b'{"expires":' + orjson.dumps(expires) + b',"solution":')
+                f.writelines(spool.json_chunks(encode(spool.strip(solution)), solution))
+                f.write(b"}")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("寫入磁碟快取失敗: %s", e)
+            return
+        self.disk_writes += 1
+        if self.disk_writes % 100 == 0:
+            self.__prune_disk()
+
+    def __prune_disk(self):
+        """刪除過舊的檔案，讓磁碟層維持在容量上限內。"""
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,323 @@
+"""依網域的即時統計，為每個請求選擇 HTTP、nodriver 或 Selenium 後端。
+
+三種後端以 Backend 的共同介面包裝：HttpBackend 包裝 HttpCrawler，BrowserBackend 包裝
+NodriverCrawler 與 SeleniumPool 的抓取函式。每個網域與後端保存衰減的統計：
+成功、挑戰頁面、page_size（內容過短）與其他錯誤的次數，以及成功時的延遲。
+次數以 half_life 秒為半衰期衰減，較久以前的結果影響逐漸變小，網域行為改變後會重新嘗試較便宜的後端。
+
+選擇方式：
+    1. 略過無法處理請求的後端（例如有 actions 時不使用 HTTP，帶 session_id 時只使用 nodriver）。
+    2. 成功率估計值 (成功 + 1) / (總次數 + 2) 不低於 min_success 的後端依成本排序，
+       成本相同時延遲較低者優先；其餘後端依成功率排在後面。
+    3. 依序嘗試，後端失敗時自動改用下一個，並記錄結果。
+       兩種後端以相同規則分類狀態碼（見 classify_status）：404 等 4xx 是最終答案，不改用下一個後端。
+統計保存在記憶體中（LRU），並由背景工作批次寫入磁碟，重新啟動後沿用。
+"""
+
+import abc
+import asyncio
+import time
+from collections import OrderedDict
+
+import metrics
+import spool
+from browser_sessions import SessionLimitError
+from data_structures import SolutionResultT, V1RequestBase
+from deadline import check
+from domain import domain_of
+from http_crawler import CHALLENGE_HEAD, ESCALATE_STATUS, HttpCrawler, is_challenge_html, needs_browser
+from log import get_logger
+from persistent_store import PersistentStore
+from selenium_pool import PoolTimeoutError
+
+logger = get_logger(__name__)
+
+SUCCESS = "success"
+CHALLENGE = "challenge"
+PAGE_SIZE = "page_size"
+ERROR = "error"
+BUSY = "busy"
+FAILURES = (CHALLENGE, PAGE_SIZE, ERROR)
+
+
+class Backend(abc.ABC):
+    """
+    抓取後端的共同介面。
+    """
+
+    name = ""
+    # 相對成本，越低越優先
+    cost = 0
+
+    def unsupported(self, req: V1RequestBase):
+        """檢查後端能否處理請求。
+        Returns:
+            str: 無法處理的原因，可以處理時為空字串。
+        """
+        return ""
+
+    @abc.abstractmethod
+    async def fetch(self, req: V1RequestBase):
+        """抓取網頁。
+        Returns:
+            tuple[SolutionResultT, str]: 結果與分類（success、challenge、page_size 或 error），失敗時結果可為 None。
+        """
+
+
+class HttpBackend(Backend):
+    """
+    以 HttpCrawler 抓取，不啟動瀏覽器。
+    """
+
+    name = "http"
+    cost = 1
+
+    def __init__(self, http_crawler: HttpCrawler):
+        self.http_crawler = http_crawler
+
+    def unsupported(self, req: V1RequestBase):
+        if req.fast_path is False:
+            return "fast_path"
+        return needs_browser(req)
+
+    async def fetch(self, req: V1RequestBase):
+        # 網域是否需要瀏覽器由路由器的統計判斷，不使用 HttpCrawler 的網域記憶
+        solution, reason = await self.http_crawler.fetch(req, use_memory=False)
+        if solution is None:
+            return None, reason if reason in FAILURES else ERROR
+        return solution, classify_status(solution.status) or SUCCESS
+
+
+class BrowserBackend(Backend):
+    """
+    以瀏覽器抓取，包裝 fetch_nodriver 或 fetch_selenium。
+    """
+
+    def __init__(self, name: str, cost: int, fetch, sessions=False):
+        """
+        Args:
+            name (str): 後端名稱，例如 "nodriver"。
+            cost (int): 相對成本。
+            fetch: `async (V1RequestBase) -> SolutionResultT` 的抓取函式。
+            sessions (bool): 是否支援 session_id。
+        """
+        self.name = name
+        self.cost = cost
+        self.fetch_browser = fetch
+        self.sessions = sessions
+
+    def unsupported(self, req: V1RequestBase):
+        if req.session_id is not None and not self.sessions:
+            return "session"
+        return ""
+
+    async def fetch(self, req: V1RequestBase):
+        solution = await self.fetch_browser(req)
+        return solution, classify(req, solution)
+
+
+def classify_status(status: int):
+    """依狀態碼分類抓取結果，HTTP 與瀏覽器後端共用。
+    Returns:
+        str: 401、403、429、503 為 challenge，其他 5xx 為 error，改用下一個後端；
+            其他 4xx 是網站的最終答案（例如 404），換後端也不會不同，視為 success；
+            2xx 與 3xx 為 None，由呼叫端依內容判斷。
+    """
+    if status in ESCALATE_STATUS:
+        return CHALLENGE
+    if status >= 500:
+        return ERROR
+    if status >= 400:
+        return SUCCESS
+    return None
+
+
+def classify(req: V1RequestBase, solution: SolutionResultT):
+    """判斷瀏覽器抓取的結果是否成功。"""
+    outcome = classify_status(solution.status)
+    if outcome is not None:
+        return outcome
+    if spool.is_spooled(solution):
+        # 暫存檔中的網頁一定超過 page_size，只讀取開頭檢查挑戰頁面
+        return CHALLENGE if is_challenge_html(spool.head(solution, CHALLENGE_HEAD)) else SUCCESS
+    if solution.response:
+        if is_challenge_html(solution.response):
+            return CHALLENGE
+        if len(solution.response) <= req.page_size:
+            return PAGE_SIZE
+    return SUCCESS
+
+
+class RouterStats(PersistentStore):
+    """
+    以網域與後端索引的衰減統計，可同時由多個請求使用。
+    """
+
+    description = "路由統計"
+
+    def __init__(self, path="", half_life=3600, max_domains=10000, flush_interval=5):
+        """
+        Args:
+            path (str): 保存統計的 JSON 檔案，空字串表示不保存。
+            half_life (float): 次數衰減的半衰期秒數。
+            max_domains (int): 最多保存的網域數量，超過時淘汰最久未使用的網域。
+            flush_interval (float): 批次寫入磁碟的間隔秒數。
+        """
+        super().__init__(path, flush_interval)
+        self.half_life = half_life
+        self.max_domains = max_domains
+        self.domains: OrderedDict[str, dict] = OrderedDict()
+        self.load()
+
+    def get(self, domain: str, backend: str):
+        """取得衰減到目前時間的統計。
+        Returns:
+            dict: 包含 success、challenge、page_size、error 次數與 latency_ms 的統計；沒有時為 None。
+        """
+        with self.lock:
+            entry = self.domains.get(domain, {}).get(backend)
+            return self.__decayed(entry, time.time()) if entry is not None else None
+
+    def record(self, domain: str, backend: str, outcome: str, latency_ms: float = None):
+        """記錄一次抓取的結果。
+        Args:
+            domain (str): 網域。
+            backend (str): 後端名稱。
+            outcome (str): success、challenge、page_size 或 error。
+            latency_ms (float): 成功時的延遲（毫秒）。
+        """
+        now = time.time()
+        with self.lock:
+            backends = self.domains.setdefault(domain, {})
+            self.domains.move_to_end(domain)
+            entry = backends.get(backend)
+            if entry is None:
+                entry = {SUCCESS: 0.0, CHALLENGE: 0.0, PAGE_SIZE: 0.0, ERROR: 0.0, "latency_ms": None}
+            else:
+                entry = self.__decayed(entry, now)
+            entry[outcome] += 1
+            if outcome == SUCCESS and latency_ms is not None:
+                previous = entry["latency_ms"]
+                entry["latency_ms"] = latency_ms if previous is None else previous * 0.8 + latency_ms * 0.2
+            entry["updated"] = now
+            backends[backend] = entry
+            while len(self.domains) > self.max_domains:
+                self.domains.popitem(last=False)
+            self.dirty = True
+
+    def snapshot(self, domain: str = None):
+        """取得衰減到目前時間的所有統計，可只取一個網域。"""
+        now = time.time()
+        with self.lock:
+            domains = [domain] if domain is not None else list(self.domains)
+            return {
+                name: {backend: self.__decayed(entry, now) for backend, entry in self.domains[name].items()}
+                for name in domains
+                if name in self.domains
+            }
+
+    def _dump(self):
+        return {name: dict(backends) for name, backends in self.domains.items()}
+
+    def _restore(self, data):
+        with self.lock:
+            self.domains.update(data)
+            while len(self.domains) > self.max_domains:
+                self.domains.popitem(last=False)
+
+    def __decayed(self, entry: dict, now: float):
+        """依經過的時間衰減次數，回傳新的 dict。"""
+        factor = 0.5 ** (max(now - entry.get("updated", now), 0) / self.half_life)
+        decayed = {outcome: entry[outcome] * factor for outcome in (SUCCESS, *FAILURES)}
+        decayed["latency_ms"] = entry["latency_ms"]
+        decayed["updated"] = now
+        return decayed
+
+
+def success_rate(entry: dict):
+    """以 (成功 + 1) / (總次數 + 2) 估計成功率，沒有統計時為 0.5。"""
+    if entry is None:
+        return 0.5
+    total = entry[SUCCESS] + sum(entry[outcome] for outcome in FAILURES)
+    return (entry[SUCCESS] + 1) / (total + 2)
+
+
+class BackendRouter:
+    """
+    為每個請求選擇後端，失敗時改用下一個後端。
+    """
+
+    def __init__(self, backends: list[Backend], stats: RouterStats, min_success=0.5):
+        """
+        Args:
+            backends (list[Backend]): 可用的後端。
+            stats (RouterStats): 網域統計。
+            min_success (float): 視為可能成功的成功率下限。
+        """
+        self.backends = backends
+        self.stats = stats
+        self.min_success = min_success
+
+    def plan(self, req: V1RequestBase):
+        """依網域統計排列可以處理請求的後端。
+        Returns:
+            list[Backend]: 嘗試的順序。
+        """
+        domain = domain_of(req.url)
+        likely, unlikely = [], []
+        for backend in self.backends:
+            if backend.unsupported(req):
+                continue
+            entry = self.stats.get(domain, backend.name)
+            rate = success_rate(entry)
+            latency = entry["latency_ms"] if entry is not None and entry["latency_ms"] is not None else 0
+            if rate >= self.min_success:
+                likely.append(((backend.cost, latency), backend))
+            else:
+                unlikely.append(((-rate, backend.cost), backend))
+        likely.sort(key=lambda item: item[0])
+        unlikely.sort(key=lambda item: item[0])
+        return [backend for _, backend in likely + unlikely]
+
+    async def fetch(self, req: V1RequestBase):
+        """依序嘗試後端，直到有一個成功。
+        Args:
+            req (V1RequestBase): 包含請求資訊的物件。
+        Returns:
+            tuple[SolutionResultT, str]: 結果與提供結果的後端名稱；全部失敗時為最後一個結果。
+        Raises:
+            PoolTimeoutError: 所有瀏覽器後端都在忙碌，且沒有任何結果。
+            SessionLimitError: 工作階段數量已達上限，且沒有任何結果。
+            ValueError: 沒有後端可以處理請求。
+            DeadlineExceeded: 請求超過期限，且沒有任何結果。
+        """
+        domain = domain_of(req.url)
+        plan = self.plan(req)
+        if not plan:
+            raise ValueError("no backend can serve this request")
+        solution, served_by, error = None, None, None
+        for backend in plan:
+            # 期限已過時不再嘗試其他後端
+            check()
+            started = time.perf_counter()
+            try:
+                result, outcome = await backend.fetch(req)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 等待瀏覽器逾時代表容量不足，與網域無關，不計入統計
+                outcome = BUSY if isinstance(e, (PoolTimeoutError, SessionLimitError)) else ERROR
+                result, error = None, e
+                logger.warning("backend %s failed: %s %s", backend.name, req.url, e)
+            latency_ms = (time.perf_counter() - started) * 1000
+            metrics.ROUTER.labels(backend.name, outcome).inc()
+            if outcome != BUSY:
+                self.stats.record(domain, backend.name, outcome, latency_ms)
+            if result is not None:
+                solution, served_by = result, backend.name
+            if outcome == SUCCESS:
+                return solution, served_by
+            logger.debug("backend %s: %s (%s)，改用下一個後端", backend.name, req.url, outcome)
+        if solution is None:
+            raise error if error is not None else RuntimeError(f"all backends failed: {req.url}")
+        return solution, served_by
@@ -0,0 +1,120 @@
+"""以 CDP Page.captureScreenshot 擷取截圖，並提供截圖的暫存區。
+
+請求欄位：
+    screenshot_format: "png"（預設）、"jpeg" 或 "webp"。
+    screenshot_quality: jpeg / webp 的品質（0-100）。
+    screenshot_clip: {"x", "y", "width", "height", "scale"} 擷取範圍（CSS 像素）。
+    screenshot_mode: "base64"（預設，放在 screenshot_base64）或 "url"
+        （存放在 ScreenshotStore，回應只帶 screenshot_url，由 `/screenshots/{id}` 取得二進位內容）。
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from data_structures import V1RequestBase
+from nodriver import cdp
+
+FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+def capture_params(req: V1RequestBase):
+    """建立 Page.captureScreenshot 的參數。
+    Args:
+        req (V1RequestBase): 包含請求資訊的物件。
+    Returns:
+        dict: CDP 參數。
+    """
+    fmt = req.screenshot_format if req.screenshot_format in FORMATS else "png"
+    params = {"format": fmt}
+    if fmt != "png" and req.screenshot_quality is not None:
+        params["quality"] = max(0, min(100, int(req.screenshot_quality)))
+    clip = req.screenshot_clip
+    if clip:
+        params["clip"] = {
+            "x": float(clip.get("x", 0)),
+            "y": float(clip.get("y", 0)),
+            "width": float(clip["width"]),
+            "height": float(clip["height"]),
+            "scale": float(clip.get("scale", 1)),
+        }
+        # 擷取範圍可能在可視區域之外
+        params["captureBeyondViewport"] = True
+    return params
+
+
+def capture_selenium(driver, req: V1RequestBase):
+    """在 Selenium 中擷取截圖。
+    Returns:
+        str: base64 編碼的圖片。
+    """
+    return driver.execute_cdp_cmd("Page.captureScreenshot", capture_params(req))["data"]
+
+
+async def capture_nodriver(tab, req: V1RequestBase):
+    """在 nodriver 分頁中擷取截圖。
+    Returns:
+        str: base64 編碼的圖片。
+    """
+    params = capture_params(req)
+    clip = params.get("clip")
+    return await tab.send(
+        cdp.page.capture_screenshot(
+            format_=params["format"],
+            quality=params.get("quality"),
+            clip=cdp.page.Viewport(**clip) if clip else None,
+            capture_beyond_viewport=params.get("captureBeyondViewport"),
+        )
+    )
+
+
+class ScreenshotStore:
+    """
+    存放截圖二進位內容的記憶體暫存區，依容量淘汰最舊的截圖，並在 ttl 秒後過期。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def put(self, data: bytes, media_type: str):
+        """存放截圖。
+        Returns:
+            str: 截圖 id。
+        """
+        screenshot_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            # 所有截圖的 ttl 相同，最舊的在最前面
+            while self.entries:
+                expires, _, old = next(iter(self.entries.values()))
+                if expires >= now:
+                    break
+                self.entries.popitem(last=False)
+                self.size -= len(old)
+            self.entries[screenshot_id] = (now + self.ttl, media_type, data)
+            self.size += len(data)
+            while self.size > self.max_bytes and self.entries:
+                _, (_, _, old) = self.entries.popitem(last=False)
+                self.size -= len(old)
+        return screenshot_id
+
+    def get(self, screenshot_id: str):
+        """取得截圖。
+        Returns:
+            tuple[bytes, str]: 圖片內容與 media type；不存在或已過期時為 None。
+        """
+        with self.lock:
+            entry = self.entries.get(screenshot_id)
+            if entry is None:
+                return None
+            expires, media_type, data = entry
+            if expires < time.time():
+                del self.entries[screenshot_id]
+                self.size -= len(data)
+                return None
+        return data, media_type
@@ -1,93 +1,159 @@
 """使用 SeleniumCrawler 來抓取網頁數據"""
 
-import base64
-import time
-from urllib.parse import urlparse
-
+from actions import run_actions_selenium, text_xpath
+from cookie_jar import CookieJar, request_cookies
 from data_structures import ActionT, SolutionResultT, V1RequestBase
-from dbg import dbg
+from deadline import DeadlineExceeded, remaining
+from domain import is_subdomain
+from extraction import extract_selenium
+from log import get_logger
+from metrics import browser_restarted, phase, retried
+from page_content import read_content_selenium, reject_oversize
+from readiness import READY, wait_ready_selenium
+from resource_blocking import count_blocked_selenium, resolve_block_options, selenium_blocked_urls
+from screenshot import capture_selenium
 from selenium import webdriver as uc
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+logger = get_logger(__name__)
+
+# 沒有期限時的頁面載入上限（與 ChromeDriver 預設相同）與期限到時重置分頁的上限秒數
+PAGE_LOAD_TIMEOUT = 300
+RESET_TIMEOUT = 10
+
 
 class SeleniumCrawler:
     """
     提供網頁操作相關功能的類別。
     """
 
-    def __init__(self):
+    def __init__(self, auto_restart=True, cookie_jar: CookieJar = None):
+        """
+        Args:
+            auto_restart (bool): 發生錯誤時是否直接重啟瀏覽器；
+                由 SeleniumPool 管理時設為 False，改由驅動池在背景替換。
+            cookie_jar (CookieJar): 與其他 crawler 共用的 cookie jar。
+        """
         self.driver = None
+        self.auto_restart = auto_restart
+        self.cookie_jar = cookie_jar
+        self.broken = False
+        self.request_count = 0
+        self.blocked_urls = []
         self.__start_driver()
         self.show_chrome_versions()
 
     def get(self, req: V1RequestBase):
-        """載入指定網址並取得網頁資訊。
+        """載入指定網址並取得網頁資訊，所有階段與重試共用請求的期限。
         Args:
             req (V1RequestBase): 包含請求資訊的物件。
         Returns:
             SolutionResultT: 包含網頁資訊的結果物件。
+        Raises:
+            DeadlineExceeded: 請求超過期限或已被取消，分頁已停止載入。
         """
-        timeout = int(req.max_timeout / 1000)
-        dbg(f"get: {req.url}")
+        logger.debug("get: %s", req.url)
+        self.request_count += 1
+        self.__handle_blocking(req.block_resources)
+        try:
+            return self.__get(req)
+        except DeadlineExceeded:
+            self.__stop_loading()
+            raise
+
+    def __get(self, req: V1RequestBase):
+        """載入網址並取得網頁資訊，重試直到 retry_count 或期限。"""
         for attempt in range(req.retry_count + 1):
+            if attempt > 0:
+                retried()
             if attempt > 1:
-                dbg(f"嘗試次數: {attempt}/{req.retry_count - 1}")
+                logger.debug("嘗試次數: %d/%d", attempt, req.retry_count - 1)
+            # 在導航前注入 cookies，不需要載入後再重新整理
+            with phase("cookies"):
+                self.__handle_cookies(req)
+            # 清除先前請求的 performance log，之後只計算這次導航封鎖的請求
+            self.__read_performance_log()
             try:
-                # 載入目標URL
-                self.driver.get(req.url)
+                # 載入目標URL，頁面載入時間不超過期限
+                with phase("navigation"):
+                    self.driver.set_page_load_timeout(remaining(PAGE_LOAD_TIMEOUT))
+                    self.driver.get(req.url)
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                self.__start_driver()
+                self.__restart_driver()
                 msg = f"get url error: {req.url}\n{e}\n"
-                dbg(msg)
-                return SolutionResultT({"response": msg, "status": 500, "url": req.url})
-
-            # 等待頁面載入完成
-            WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, "html")))
-
-            self.__handle_cookies(req.cookies)
-
-            # 用page_size判斷頁面載入情況
-            page_loaded = False
-            for i in range(timeout):
-                page_size = len(self.driver.page_source)
-                dbg(f"[{i}]page size: {page_size}")
-                if page_size == 39:
-                    break
-                if page_size > req.page_size:
-                    page_loaded = True
-                    break
-                time.sleep(1)
-            if not page_loaded:
+                logger.warning(msg)
+                return SolutionResultT(response=msg, status=500, url=req.url)
+
+            # 依 wait_until 策略判斷頁面載入情況
+            with phase("wait"):
+                # 等待頁面載入完成
+                timeout = remaining(req.max_timeout / 1000)
+                WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, "html")))
+                state, wait_time = wait_ready_selenium(self.driver, req, remaining(timeout))
+            logger.debug("wait_until: %s state: %s wait_time: %sms", req.wait_until, state, wait_time)
+            if state != READY:
                 continue
-            msg = self.__handle_actions(req.actions)
+            # 以單一頁面腳本執行 actions，失敗時退回逐步執行
+            msg, action_results = "", None
+            if req.actions:
+                with phase("actions"):
+                    msg, action_results = run_actions_selenium(self.driver, req.actions, self.__handle_actions)
             if msg:
-                return SolutionResultT({"response": msg, "status": 500, "url": req.url})
+                return SolutionResultT(response=msg, status=500, url=req.url, action_results=action_results)
 
             # 取得截圖
             screenshot_base64 = ""
             if req.screenshot:
-                screenshot = self.driver.get_screenshot_as_png()
-                screenshot_base64 = base64.b64encode(screenshot).decode("utf-8")
-
-            # 取得網頁資訊
-            solution = {
-                "cookies": self.driver.get_cookies(),
-                "headers": "",
-                "response": self.driver.page_source,
-                "status": 200,
-                "url": req.url,
-                "userAgent": self.driver.execute_script("return navigator.userAgent"),
-                "screenshot_base64": screenshot_base64,
-            }
+                with phase("screenshot"):
+                    screenshot_base64 = capture_selenium(self.driver, req)
+
+            # 在頁面內擷取指定欄位
+            data = None
+            if req.extract:
+                with phase("extract"):
+                    data = extract_selenium(self.driver, req.extract)
+
+            # 取得 cookies 並寫回 cookie jar
+            with phase("cookies"):
+                cookies = self.driver.get_cookies()
+                if self.cookie_jar is not None:
+                    self.cookie_jar.update(cookies)
+
+            # 取得網頁資訊，大型網頁分段讀取並寫入暫存檔
+            body = None
+            with phase("content"):
+                if req.include_html:
+                    body = read_content_selenium(self.driver, req)
+                    rejected = reject_oversize(req, body)
+                    if rejected is not None:
+                        return rejected
+                solution = SolutionResultT(
+                    cookies=cookies,
+                    headers="",
+                    data=data,
+                    status=200,
+                    url=req.url,
+                    user_agent=self.driver.execute_script("return navigator.userAgent"),
+                    screenshot_base64=screenshot_base64,
+                    wait_time=wait_time,
+                    action_results=action_results,
+                )
+                if body is not None:
+                    body.fill(solution)
+                if self.blocked_urls:
+                    solution.blocked_requests = count_blocked_selenium(self.__read_performance_log())
+                    solution.blocked_bytes = 0
 
             # 回傳網頁資訊
-            return SolutionResultT(solution)
+            return solution
         msg = "達到最大重試次數，放棄操作"
-        dbg(msg)
-        return SolutionResultT({"response": msg, "status": 500, "url": req.url})
+        logger.warning(msg)
+        return SolutionResultT(response=msg, status=500, url=req.url)
 
     def __start_driver(self):
         """重新啟動瀏覽器。"""
@@ -102,92 +168,165 @@ class SeleniumCrawler:
         options.add_argument("--ignore-certificate-errors")  # 忽略證書錯誤，避免因證書問題導致爬蟲中斷
         options.add_argument("--ignore-ssl-errors")  # 忽略證書錯誤，避免因證書問題導致爬蟲中斷
         # options.add_argument("--auto-open-devtools-for-tabs")  # 自動打開開發者工具，方便調試
+        # 以 performance log 接收 Network 事件，統計被封鎖的請求
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
         self.driver = uc.Chrome(options=options)
+        self.request_count = 0
+        self.blocked_urls = []
+
+    def __handle_blocking(self, option):
+        """依 block_resources 設定封鎖資源。
+        Selenium 無法攔截請求，只能以 Network.setBlockedURLs 依網址封鎖，
+        封鎖數量由 performance log 中的 Network.loadingFailed 事件計算。
+        Args:
+            option: V1RequestBase.block_resources。
+        """
+        resolved = resolve_block_options(option)
+        blocked_urls = selenium_blocked_urls(*resolved) if resolved else []
+        if blocked_urls == self.blocked_urls:
+            return
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls})
+        self.blocked_urls = blocked_urls
+
+    def __read_performance_log(self):
+        """讀取並清空 performance log，讀取失敗時為空列表。"""
+        try:
+            return self.driver.get_log("performance")
+        except Exception as e:
+            logger.debug("讀取 performance log 失敗: %s", e)
+            return []
+
+    def __stop_loading(self):
+        """請求超過期限時停止載入並回到空白頁，失敗時重啟或標記瀏覽器需要替換。"""
+        try:
+            self.driver.set_page_load_timeout(RESET_TIMEOUT)
+            self.driver.get("about:blank")
+        except Exception as e:
+            logger.warning("重置分頁失敗: %s", e)
+            self.__restart_driver()
+
+    def __restart_driver(self):
+        """瀏覽器發生錯誤時重啟，或標記為需要由驅動池替換。"""
+        if self.auto_restart:
+            browser_restarted("selenium", "error")
+            self.__start_driver()
+        else:
+            self.broken = True
+
+    def is_alive(self):
+        """檢查瀏覽器是否還能回應。"""
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def browser_pid(self):
+        """取得 chromedriver 行程 id，Chrome 為其子行程。"""
+        try:
+            return self.driver.service.process.pid
+        except AttributeError:
+            return None
+
+    def quit(self):
+        """關閉瀏覽器。"""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                logger.warning("quit driver error: %s", e)
+            self.driver = None
 
     def __handle_actions(self, actions: list[ActionT]):
-        """處理 actions 事件。
+        """逐步處理 actions 事件，批次腳本失敗時使用。
         Args:
             actions (list): actions 列表。
         Returns:
             str: 發生錯誤時的錯誤訊息，否則為空字串。
         """
         for action in actions:
+            if action.trigger not in ("clickable", "input", "located"):
+                continue
+            locator = self.__locator(action)
+            if locator is None:
+                return "action path is empty"
+            path = locator[1]
+            # 等待時間不超過請求的期限，逾時的 action 與原本相同被略過
+            timeout = remaining(action.timeout)
             if action.trigger == "clickable":
                 try:
-                    # 尋找XPATH的連結
-                    enter_button = WebDriverWait(self.driver, action.timeout).until(EC.element_to_be_clickable((By.XPATH, action.xpath)))
-                    # dbg(f"enter_button type: {type(enter_button)}")
+                    # 尋找可點擊的連結
+                    enter_button = WebDriverWait(self.driver, timeout).until(EC.element_to_be_clickable(locator))
                     # 點擊連結
                     enter_button.click()
-                    dbg(f"成功點擊{action.xpath}連結")
+                    logger.debug("成功點擊%s連結", path)
                 except TimeoutException:
-                    dbg(f"找不到{action.xpath}連結")
+                    logger.debug("找不到%s連結", path)
                 except Exception as e:
-                    msg = f"點擊{action.xpath}，連結失敗: {e}"
-                    dbg(msg)
-                    self.__start_driver()
+                    msg = f"點擊{path}，連結失敗: {e}"
+                    logger.warning(msg)
+                    self.__restart_driver()
+                    return msg
+            elif action.trigger == "input":
+                try:
+                    enter_button = WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located(locator))
+                    enter_button.send_keys(action.value)
+                except TimeoutException:
+                    logger.debug("找不到%s輸入框", path)
+                except Exception as e:
+                    msg = f"輸入{path}失敗: {e}"
+                    logger.warning(msg)
+                    self.__restart_driver()
                     return msg
             elif action.trigger == "located":
                 try:
-                    # 尋找XPATH的連結
-                    enter_button = WebDriverWait(self.driver, action.timeout).until(EC.presence_of_element_located((By.XPATH, action.xpath)))
-                    # dbg(f"等到{event.xpath}連結")
+                    WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located(locator))
                 except TimeoutException:
-                    pass
-                    # dbg(f"等不到{event.xpath}連結")
+                    logger.debug("等不到%s連結", path)
                 except Exception as e:
-                    msg = f"等待{action.xpath}連結失敗: {e}"
-                    dbg(msg)
-                    self.__start_driver()
+                    msg = f"等待{path}連結失敗: {e}"
+                    logger.warning(msg)
+                    self.__restart_driver()
                     return msg
         return ""
 
-    def __handle_cookies(self, cookies):
-        """處理 cookies 設定。
+    @staticmethod
+    def __locator(action: ActionT):
+        """依 select、xpath、find 的順序建立元素定位，三者皆空時為 None。"""
+        if action.select:
+            return By.CSS_SELECTOR, action.select
+        if action.xpath:
+            return By.XPATH, action.xpath
+        if action.find:
+            return By.XPATH, text_xpath(action.find)
+        return None
+
+    def __handle_cookies(self, req: V1RequestBase):
+        """以 CDP Network.setCookies 注入請求中的 cookies 與 cookie jar 中適用的 cookies。
         Args:
-            cookies (list): cookies 列表。
+            req (V1RequestBase): 包含請求資訊的物件。
         """
-        # 載入cookies
-        for cookie in cookies:
-            # 獲取 cookie 的 domain 屬性
-            cookie_domain = cookie.get("domain")
-            # 獲取當前網站域名
-            current_domain = urlparse(self.driver.current_url).netloc
-            # 檢查 cookie domain 是否與當前域名匹配
-            if cookie_domain:
-                if not self.is_subdomain(cookie_domain, current_domain):
-                    # dbg(f"跳過域名不匹配的 cookie: {cookie}")
-                    continue
-
-            # 獲取 SameSite 屬性，如果不存在則默認為 None
-            same_site = cookie.get("sameSite", None)
-            # 調整 SameSite 值以匹配允許的選項
-            if same_site is not None and same_site.lower() not in ["Strict", "Lax", "None"]:
-                if same_site.lower() == "strict" or same_site.lower() == "no_restriction":
-                    cookie["sameSite"] = "Strict"
-                elif same_site.lower() == "lax":
-                    cookie["sameSite"] = "Lax"
-                elif same_site.lower() == "none" or same_site.lower() == "unspecified":
-                    cookie["sameSite"] = "None"
-                else:
-                    dbg(f"跳過 SameSite 值不被支持的 cookie: {same_site}")
-                    continue  # 跳過到下一個 cookie
-            # dbg(f"add_cookie: {cookie.get('name')}: {cookie.get('value')}")
-            self.driver.add_cookie(cookie)
-        self.driver.refresh()
-        WebDriverWait(self.driver, 60).until(EC.presence_of_element_located((By.TAG_NAME, "html")))
+        cookies = self.cookie_jar.cookies_for(req.url) if self.cookie_jar is not None else []
+        cookies += request_cookies(req.cookies, req.url)
+        if not cookies:
+            return
+        try:
+            self.driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        except Exception as e:
+            logger.warning("設定 cookies 失敗: %s", e)
 
     def show_chrome_versions(self):
         """顯示 Chrome 瀏覽器和 ChromeDriver 的版本信息。"""
         chrome_version = self.driver.capabilities["browserVersion"]
         chromedriver_version = self.driver.capabilities["chrome"]["chromedriverVersion"].split(" ")[0]
-        dbg(f"chrome_version:{chrome_version} chromedriver_version:{chromedriver_version}")
+        logger.info("chrome_version:%s chromedriver_version:%s", chrome_version, chromedriver_version)
 
     def is_subdomain(self, subdomain, domain):
         """
         檢查 subdomain 是否為 domain 的子域名
         """
-        return subdomain == domain or subdomain.endswith(f".{domain}")
+        return is_subdomain(subdomain, domain)
 
 
 def main_test():
@@ -207,7 +346,7 @@ def main_test():
 
     chrome_version = driver.capabilities["browserVersion"]
     chromedriver_version = driver.capabilities["chrome"]["chromedriverVersion"].split(" ")[0]
-    dbg(f"chrome_version:{chrome_version} chromedriver_version:{chromedriver_version}")
+    print(f"chrome_version:{chrome_version} chromedriver_version:{chromedriver_version}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+"""管理多個 SeleniumCrawler 的驅動池，讓 `/v1` 可以同時處理多個請求。"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from cookie_jar import CookieJar
+from data_structures import V1RequestBase
+from deadline import remaining
+from log import get_logger
+from metrics import browser_restarted, phase
+from selenium_crawler import SeleniumCrawler
+
+logger = get_logger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """等待可用瀏覽器逾時，或等待佇列已滿時拋出。"""
+
+
+class SeleniumPool:
+    """
+    固定數量的 SeleniumCrawler 驅動池，提供 checkout / checkin 機制。
+
+    發生錯誤或處理超過 max_requests 個請求的 crawler 在歸還時會被標記為 broken，
+    由背景執行緒建立新的 crawler 補回池中後再關閉，不會阻塞其他正在工作的 crawler。
+    """
+
+    def __init__(self, size=1, max_waiting=16, queue_timeout=30, cookie_jar: CookieJar = None, max_requests=0):
+        """
+        Args:
+            size (int): 驅動池中的瀏覽器數量。
+            max_waiting (int): 同時等待 checkout 的最大請求數，超過時直接拒絕。
+            queue_timeout (float): 等待可用瀏覽器的秒數。
+            cookie_jar (CookieJar): 所有 crawler 共用的 cookie jar。
+            max_requests (int): 每個瀏覽器處理多少請求後回收，0 表示不回收。
+        """
+        self.size = size
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.cookie_jar = cookie_jar
+        self.max_requests = max_requests
+        self.idle = queue.Queue()
+        self.crawlers: set[SeleniumCrawler] = set()
+        self.waiting = 0
+        # 已交給線程池（執行中或在線程池佇列中）的請求數
+        self.admitted = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        """啟動所有瀏覽器（預熱）。"""
+        while len(self.crawlers) < self.size:
+            self.idle.put(self.__new_crawler())
+
+    def close(self):
+        """關閉所有瀏覽器。"""
+        with self.lock:
+            crawlers = list(self.crawlers)
+            self.crawlers.clear()
+        for crawler in crawlers:
+            crawler.quit()
+
+    def health_check(self, over_limit):
+        """檢查閒置的瀏覽器，無回應或超過記憶體上限時替換。
+        Args:
+            over_limit: 接受瀏覽器行程 id，回傳是否超過記憶體上限的函式。
+        """
+        for _ in range(self.idle.qsize()):
+            try:
+                crawler = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if not crawler.is_alive():
+                logger.warning("瀏覽器沒有回應，替換瀏覽器")
+                self.__retire(crawler, "unresponsive")
+            elif over_limit(crawler.browser_pid()):
+                self.__retire(crawler, "rss")
+            else:
+                self.idle.put(crawler)
+
+    def checkout(self, timeout=None):
+        """取出一個可用的 crawler。
+        Args:
+            timeout (float): 等待秒數，預設使用 queue_timeout。
+        Returns:
+            SeleniumCrawler: 可用的 crawler。
+        Raises:
+            PoolTimeoutError: 等待佇列已滿或等待逾時。
+        """
+        if timeout is None:
+            timeout = self.queue_timeout
+        with self.lock:
+            if self.waiting >= self.max_waiting:
+                raise PoolTimeoutError(f"等待佇列已滿 ({self.max_waiting})")
+            self.waiting += 1
+        try:
+            return self.idle.get(timeout=timeout)
+        except queue.Empty as e:
+            raise PoolTimeoutError(f"等待可用瀏覽器逾時 ({timeout}s)") from e
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    @contextmanager
+    def admit(self):
+        """登記一個要交給線程池執行 get 的請求，離開時釋放。
+        線程池的線程數為 size + max_waiting，登記的請求達到此數量時直接拒絕，
+        避免多出的請求在線程池的佇列中無限期等待，拿不到 checkout 的逾時錯誤。
+        Raises:
+            PoolTimeoutError: 登記的請求數已達上限。
+        """
+        with self.lock:
+            if self.admitted >= self.size + self.max_waiting:
+                raise PoolTimeoutError(f"等待佇列已滿 ({self.max_waiting})")
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.admitted -= 1
+
+    def checkin(self, crawler: SeleniumCrawler):
+        """歸還 crawler，若已損壞則在背景替換。
+        Args:
+            crawler (SeleniumCrawler): 要歸還的 crawler。
+        """
+        if crawler.broken:
+            self.__retire(crawler, "error")
+        elif self.max_requests and crawler.request_count >= self.max_requests:
+            logger.info("瀏覽器已處理 %d 個請求，回收瀏覽器", crawler.request_count)
+            self.__retire(crawler, "max_requests")
+        else:
+            self.idle.put(crawler)
+
+    def get(self, req: V1RequestBase):
+        """從池中取出 crawler 抓取網頁，完成後歸還。
+        Args:
+            req (V1RequestBase): 包含請求資訊的物件。
+        Returns:
+            SolutionResultT: 包含網頁資訊的結果物件。
+        Raises:
+            PoolTimeoutError: 等待可用瀏覽器逾時。
+            DeadlineExceeded: 請求在等待瀏覽器或抓取時超過期限。
+        """
+        # 等待時間不超過請求的期限，期限先到時由 phase 轉為 DeadlineExceeded
+        with phase("queue"):
+            crawler = self.checkout(remaining(self.queue_timeout))
+        try:
+            return crawler.get(req)
+        finally:
+            self.checkin(crawler)
+
+    def __new_crawler(self):
+        """建立新的 crawler，失敗時每 5 秒重試。"""
+        while True:
+            try:
+                crawler = SeleniumCrawler(auto_restart=False, cookie_jar=self.cookie_jar)
+                break
+            except Exception as e:
+                logger.error("建立瀏覽器失敗，5 秒後重試: %s", e)
+                time.sleep(5)
+        with self.lock:
+            self.crawlers.add(crawler)
+        return crawler
+
+    def __retire(self, crawler: SeleniumCrawler, reason: str):
+        """在背景替換 crawler。"""
+        browser_restarted("selenium", reason)
+        threading.Thread(target=self.__replace, args=(crawler,), daemon=True).start()
+
+    def __replace(self, crawler: SeleniumCrawler):
+        """建立新的 crawler 放回池中，再關閉被替換的 crawler。"""
+        with self.lock:
+            self.crawlers.discard(crawler)
+        self.idle.put(self.__new_crawler())
+        logger.info("已替換瀏覽器")
+        crawler.quit()
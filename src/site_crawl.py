@@ -0,0 +1,139 @@
+"""從一個請求開始，沿著頁面中的連結抓取整個網站。
+
+每個頁面以種子請求的設定抓取，並在 extract 中加入擷取所有連結的欄位（a[href] 的 href 屬性，
+為絕對網址）。連結正規化後以 SeenSet 去重，範圍內且未超過深度的網址加入 Frontier，
+以廣度優先的順序交給既有的 crawl_v1 / crawl_v2，同時抓取的數量由 concurrency 限制。
+擷取連結需要瀏覽器，因此 v3 只在最大深度的頁面（不擷取連結）才可能使用 HTTP 後端。
+
+範圍（scope）：
+    domain: 種子網址的網域（去掉 www.）及其子域名。
+    host: 只限種子網址的主機名稱。
+"""
+
+import asyncio
+
+import msgspec
+from data_structures import CrawlOptionsT, V1RequestBase, V1ResponseBase
+from domain import domain_of, is_subdomain
+from frontier import Frontier, SeenSet
+from log import get_logger
+from response_cache import normalize_url
+
+logger = get_logger(__name__)
+
+SCOPES = ("domain", "host")
+# 加入 extract 的連結欄位名稱，回應前移除
+LINKS_FIELD = "__links"
+LINKS_RULE = {"css": "a[href]", "prop": "href", "all": True}
+
+
+def normalize_link(link):
+    """正規化連結，不是 http / https 網址時為 None。"""
+    if not isinstance(link, str) or not link.startswith(("http://", "https://")):
+        return None
+    if "\n" in link or "\t" in link:
+        return None
+    return normalize_url(link)
+
+
+class SiteCrawl:
+    """
+    一次整站抓取的狀態：已出現的網址、待抓取的網址與進行中的頁面。
+    """
+
+    def __init__(self, seed: V1RequestBase, crawl, options: CrawlOptionsT, memory_limit=10000, exact_limit=200000):
+        """
+        Args:
+            seed (V1RequestBase): 種子請求，其他頁面沿用它的設定。
+            crawl: `async (V1RequestBase) -> V1ResponseBase` 的抓取函式。
+            options (CrawlOptionsT): 深度、頁數、範圍與同時抓取數量，concurrency 須已設定。
+            memory_limit (int): Frontier 保存在記憶體中的網址數量上限。
+            exact_limit (int): SeenSet 精確集合的大小上限。
+        Raises:
+            ValueError: 參數不正確。
+        """
+        if options.scope not in SCOPES:
+            raise ValueError(f"scope must be one of {', '.join(SCOPES)}")
+        if options.max_depth < 0 or options.max_pages < 1 or not options.concurrency or options.concurrency < 1:
+            raise ValueError("max_depth must be >= 0, max_pages and concurrency must be >= 1")
+        self.seed = seed
+        self.crawl = crawl
+        self.options = options
+        seed_url = normalize_link(seed.url)
+        if seed_url is None:
+            raise ValueError("url must be an http or https URL")
+        host = domain_of(seed_url)
+        self.scope_domain = host.removeprefix("www.") if options.scope == "domain" else host
+        # 預期出現的網址數量約為頁數的數十倍
+        self.seen = SeenSet(capacity=min(max(options.max_pages * 50, 100000), 10000000), exact_limit=exact_limit)
+        self.frontier = Frontier(memory_limit)
+        self.seen.add(seed_url)
+        self.frontier.push(seed_url, 0)
+        self.pages = 0
+
+    def in_scope(self, url: str):
+        """檢查網址是否在抓取範圍內。"""
+        host = domain_of(url)
+        if self.options.scope == "host":
+            return host == self.scope_domain
+        return is_subdomain(host, self.scope_domain)
+
+    async def run(self):
+        """依廣度優先的順序抓取，每完成一個頁面就產生結果。
+        Yields:
+            tuple[int, V1ResponseBase]: 頁面深度與回應物件。
+        """
+        pending = set()
+        try:
+            while True:
+                while len(pending) < self.options.concurrency and self.pages < self.options.max_pages and self.frontier:
+                    depth, url = self.frontier.pop()
+                    pending.add(asyncio.create_task(self.__fetch(url, depth)))
+                    self.pages += 1
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # 客戶端中斷連線時取消尚未完成的頁面
+            for task in pending:
+                task.cancel()
+            self.frontier.close()
+
+    def summary(self):
+        """抓取結束時的統計。"""
+        return {
+            "status": "finished",
+            "pages": self.pages,
+            "discovered": len(self.seen),
+            "remaining": len(self.frontier),
+        }
+
+    async def __fetch(self, url: str, depth: int):
+        """抓取一個頁面，把範圍內的新連結加入 Frontier。"""
+        extract = dict(self.seed.extract or {})
+        if depth < self.options.max_depth:
+            extract[LINKS_FIELD] = LINKS_RULE
+        # 條件式欄位只適用於單一頁面，未變更的頁面也沒有連結可以展開
+        req = msgspec.structs.replace(
+            self.seed, url=url, extract=extract or None, request_id=None, known_hash=None, if_changed_since=None
+        )
+        try:
+            res = await self.crawl(req)
+        except Exception as e:
+            logger.warning("crawl %s failed: %s", url, e)
+            return depth, V1ResponseBase(status="error", message=str(e))
+
+        solution = res.solution
+        links = []
+        if solution is not None and isinstance(solution.data, dict) and LINKS_FIELD in solution.data:
+            # data 可能與回應快取共用，不直接修改
+            data = dict(solution.data)
+            links = data.pop(LINKS_FIELD) or []
+            solution.data = data if data or self.seed.extract else None
+        for link in links:
+            link = normalize_link(link)
+            if link is not None and self.in_scope(link) and self.seen.add(link):
+                self.frontier.push(link, depth + 1)
+        return depth, res
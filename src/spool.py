@@ -0,0 +1,236 @@
+"""大型網頁的暫存：超過門檻的 HTML 寫入暫存檔，回應時分段串流，不在記憶體中保留整份內容。
+
+PageBody 接收分段讀取的 HTML，累積的 UTF-8 位元組數超過 threshold 時改寫入暫存檔，
+並依 max_bytes 截斷。寫入暫存檔的結果 response 為 None，response_file 為暫存檔路徑。
+
+暫存檔由持有它的 SolutionResultT 物件擁有：物件被回收時刪除（weakref.finalize）。
+複製結果（copy）時為副本建立硬連結，每個副本各自擁有一個連結，最後一個連結刪除時才釋放空間。
+在行程之間傳遞時，送出端以 detach 放棄擁有權，接收端以 attach 取得擁有權。
+
+輸出 JSON 時先以 strip 去掉 response_file 編碼其餘欄位，再以 json_chunks 把
+`"response":null` 換成暫存檔的內容，逐段產生 bytes。
+"""
+
+import codecs
+import os
+import tempfile
+import time
+import uuid
+import weakref
+
+import msgspec
+import orjson
+from data_structures import SolutionResultT
+
+# 讀取與串流暫存檔的區塊大小
+CHUNK_BYTES = 256 * 1024
+# 暫存檔中的 response 在 JSON 中的位置
+RESPONSE_NULL = b'"response":null'
+
+_config = {"threshold": 1024 * 1024, "directory": os.path.join(tempfile.gettempdir(), "crawler-spool")}
+# 暫存檔路徑對應到刪除它的 finalizer
+_finalizers: dict[str, weakref.finalize] = {}
+
+
+def configure(threshold: int = None, directory: str = None, stale_after=3600):
+    """設定暫存門檻與目錄，並刪除之前的行程留下的舊暫存檔。
+    Args:
+        threshold (int): HTML 超過多少位元組時寫入暫存檔。
+        directory (str): 暫存檔目錄，多個 worker 行程共用。
+        stale_after (float): 刪除超過多少秒的暫存檔。
+    """
+    if threshold is not None:
+        _config["threshold"] = threshold
+    if directory:
+        _config["directory"] = directory
+    os.makedirs(_config["directory"], exist_ok=True)
+    deadline = time.time() - stale_after
+    for entry in os.scandir(_config["directory"]):
+        try:
+            if entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def threshold():
+    """目前的暫存門檻（位元組）。"""
+    return _config["threshold"]
+
+
+class PageBody:
+    """
+    分段接收網頁 HTML，超過門檻時寫入暫存檔，超過上限時截斷。
+    """
+
+    def __init__(self, max_bytes=0):
+        """
+        Args:
+            max_bytes (int): HTML 的位元組數上限，0 或 None 表示不限制。
+        """
+        self.max_bytes = max_bytes or 0
+        self.size = 0
+        self.truncated = False
+        self.chunks: list[bytes] = []
+        self.file = None
+        self.path = None
+
+    def write(self, text: str):
+        """加入一段 HTML。
+        Returns:
+            bool: 還可以繼續寫入時為 True；達到上限後為 False。
+        """
+        if self.truncated:
+            return False
+        data = text.encode("utf-8", "replace")
+        if self.max_bytes and self.size + len(data) > self.max_bytes:
+            # 在字元邊界截斷
+            data = data[: self.max_bytes - self.size].decode("utf-8", "ignore").encode("utf-8")
+            self.truncated = True
+        self.size += len(data)
+        if self.file is None and self.size > _config["threshold"]:
+            fd, self.path = tempfile.mkstemp(suffix=".html", dir=_config["directory"])
+            self.file = os.fdopen(fd, "wb")
+            self.file.writelines(self.chunks)
+            self.chunks = []
+        if self.file is not None:
+            self.file.write(data)
+        else:
+            self.chunks.append(data)
+        return not self.truncated
+
+    def fill(self, solution: SolutionResultT):
+        """把內容放入結果：未超過門檻時為 response 字串，否則為 response_file 暫存檔。"""
+        solution.response_bytes = self.size
+        solution.truncated = self.truncated or None
+        if self.file is None:
+            solution.response = b"".join(self.chunks).decode("utf-8")
+            self.chunks = []
+            return solution
+        self.file.close()
+        self.file = None
+        solution.response = None
+        solution.response_file = self.path
+        self.path = None
+        attach(solution)
+        return solution
+
+    def discard(self):
+        """放棄內容並刪除暫存檔。"""
+        self.chunks = []
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            _remove(self.path)
+            self.path = None
+
+
+def _remove(path: str):
+    _finalizers.pop(path, None)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def is_spooled(solution: SolutionResultT):
+    """檢查結果的 HTML 是否在暫存檔中。"""
+    return solution is not None and solution.response_file is not None
+
+
+def attach(solution: SolutionResultT):
+    """讓結果擁有它的暫存檔，結果被回收時刪除。"""
+    if is_spooled(solution) and solution.response_file not in _finalizers:
+        _finalizers[solution.response_file] = weakref.finalize(solution, _remove, solution.response_file)
+
+
+def detach(solution: SolutionResultT):
+    """放棄結果對暫存檔的擁有權，交給其他行程的結果物件。"""
+    if is_spooled(solution):
+        finalizer = _finalizers.pop(solution.response_file, None)
+        if finalizer is not None:
+            finalizer.detach()
+
+
+def copy(solution: SolutionResultT):
+    """複製結果，暫存檔以硬連結複製，副本擁有自己的連結。"""
+    if not is_spooled(solution):
+        return msgspec.structs.replace(solution)
+    path = os.path.join(_config["directory"], f"{uuid.uuid4().hex}.html")
+    os.link(solution.response_file, path)
+    duplicate = msgspec.structs.replace(solution, response_file=path)
+    attach(duplicate)
+    return duplicate
+
+
+def strip(solution: SolutionResultT):
+    """去掉 response_file 的結果，供編碼其餘欄位使用，不擁有暫存檔。"""
+    if not is_spooled(solution):
+        return solution
+    return msgspec.structs.replace(solution, response_file=None)
+
+
+def iter_file(solution: SolutionResultT):
+    """逐段讀取暫存檔的位元組。"""
+    with open(solution.response_file, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def read_text(solution: SolutionResultT):
+    """取得完整的 HTML，暫存檔會被整份讀入記憶體，只用於無法串流的地方。"""
+    if not is_spooled(solution):
+        return solution.response
+    with open(solution.response_file, "rb") as f:
+        return f.read().decode("utf-8")
+
+
+def head(solution: SolutionResultT, chars: int):
+    """取得 HTML 開頭的 chars 個字元。"""
+    if not is_spooled(solution):
+        return (solution.response or "")[:chars]
+    with open(solution.response_file, "rb") as f:
+        return f.read(chars * 4).decode("utf-8", "ignore")[:chars]
+
+
+def materialize(solution: SolutionResultT):
+    """把暫存檔讀回 response 字串，回傳新的結果。"""
+    if not is_spooled(solution):
+        return solution
+    return msgspec.structs.replace(solution, response=read_text(solution), response_file=None)
+
+
+def update_hash(digest, solution: SolutionResultT):
+    """把 HTML 的 UTF-8 位元組加入雜湊，暫存檔分段讀取。"""
+    if not is_spooled(solution):
+        digest.update(solution.response.encode("utf-8", "surrogatepass"))
+        return
+    for chunk in iter_file(solution):
+        digest.update(chunk)
+
+
+def json_chunks(encoded: bytes, solution: SolutionResultT):
+    """把 JSON 中結果的 `"response":null` 換成暫存檔的內容，逐段產生。
+    Args:
+        encoded (bytes): 以 strip 後的結果編碼的 JSON。
+        solution (SolutionResultT): 擁有暫存檔的結果。
+    Yields:
+        bytes: JSON 片段。
+    """
+    if not is_spooled(solution):
+        yield encoded
+        return
+    # 其他字串欄位中的引號都經過跳脫，第一個 "response":null 就是結果的欄位
+    index = encoded.index(RESPONSE_NULL)
+    yield encoded[:index] + b'"response":"'
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    for chunk in iter_file(solution):
+        text = decoder.decode(chunk)
+        if text:
+            yield orjson.dumps(text)[1:-1]
+    text = decoder.decode(b"", final=True)
+    yield (orjson.dumps(text)[1:-1] if text else b"") + b'"' + encoded[index + len(RESPONSE_NULL) :]
+
@@ -0,0 +1,318 @@
+"""多行程 worker 模式。
+
+設定 WORKERS 後，API 行程只負責接收請求、回應快取、截圖暫存區與工作佇列，
+瀏覽器抓取交給 M 個 worker 行程執行。每個 worker 擁有自己的 SeleniumPool、
+NodriverCrawler、cookie jar 與瀏覽器生命週期管理，彼此不共用狀態；
+結果中的 cookies 由 API 行程寫入它自己的 cookie jar，供 HTTP 快速路徑使用。
+
+API 行程與 worker 之間以 multiprocessing 佇列溝通：每個 worker 有自己的工作佇列，
+所有 worker 共用一個結果佇列。工作派發給進行中工作最少的 worker，帶有 session_id 的請求
+依名稱固定派發給同一個 worker（工作階段的瀏覽器情境只存在於該 worker）；
+worker 意外結束時會重新啟動，它進行中的工作重新派發，超過 max_requeues 次則回傳錯誤。
+請求的期限以絕對時間傳給 worker；API 行程中的請求被取消（客戶端中斷連線）時，
+以 ("cancel", task_id) 通知 worker 取消該工作。
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import spool
+from browser_lifecycle import BrowserLifecycleManager
+from browser_sessions import SessionLimitError
+from cookie_jar import CookieJar
+from data_structures import V1RequestBase
+from deadline import DeadlineExceeded, current_deadline, run_in_executor, start_deadline
+from log import bind_request, get_logger, setup_logging
+from metrics import start_timings
+from nodriver_crawler import NodriverCrawler
+from selenium_pool import PoolTimeoutError, SeleniumPool
+
+logger = get_logger(__name__)
+
+_mp = multiprocessing.get_context("spawn")
+
+
+class WorkerCrashedError(Exception):
+    """worker 多次在處理同一個工作時結束。"""
+
+
+def worker_main(index: int, tasks, results, config: dict):
+    """worker 行程的進入點。
+    Args:
+        index (int): worker 編號。
+        tasks: 此 worker 的工作佇列，收到 None 時結束，收到 ("cancel", task_id) 時取消工作。
+        results: 共用的結果佇列。
+        config (dict): 驅動池與瀏覽器設定，見 WorkerPool。
+    """
+    asyncio.run(_serve(index, tasks, results, config))
+
+
+async def _serve(index, tasks, results, config):
+    setup_logging()
+    spool.configure(config["spool_bytes"], config["spool_dir"])
+    # 每個 worker 使用自己的 cookie 檔案，例如 cookies.0.json
+    cookie_jar_file = config["cookie_jar_file"]
+    if cookie_jar_file:
+        root, ext = os.path.splitext(cookie_jar_file)
+        cookie_jar_file = f"{root}.{index}{ext}"
+    cookie_jar = CookieJar(cookie_jar_file, config["cookie_jar_flush_interval"])
+    nodcrawl = NodriverCrawler(
+        config["nodriver_max_tabs"],
+        cookie_jar,
+        config["browser_max_requests"],
+        config["session_max"],
+        config["session_ttl"],
+    )
+    selpool = SeleniumPool(
+        config["selenium_pool_size"],
+        config["selenium_queue_size"],
+        config["selenium_queue_timeout"],
+        cookie_jar,
+        config["browser_max_requests"],
+    )
+    executor = ThreadPoolExecutor(
+        max_workers=config["selenium_pool_size"] + config["selenium_queue_size"],
+        thread_name_prefix="selenium",
+    )
+    lifecycle = BrowserLifecycleManager(
+        selpool, nodcrawl, executor, config["health_check_interval"], config["browser_max_rss_mb"]
+    )
+    await lifecycle.start()
+    await cookie_jar.start()
+    logger.info("worker %d 已啟動 (pid %d)", index, os.getpid())
+
+    async def run(task_id, backend, req: V1RequestBase, expires):
+        bind_request(req)
+        timings = start_timings("selenium" if backend == "v1" else "nodriver")
+        if expires is not None:
+            start_deadline(expires - time.time())
+        try:
+            if backend == "v1":
+                with selpool.admit():
+                    solution = await run_in_executor(executor, selpool.get, req)
+            else:
+                solution = await nodcrawl.get(req)
+            # 暫存檔交給 API 行程的結果物件刪除
+            spool.detach(solution)
+            results.put((task_id, solution, timings.phases, None))
+        except Exception as e:
+            results.put((task_id, None, timings.phases, (type(e).__name__, str(e))))
+
+    loop = asyncio.get_running_loop()
+    running: dict[int, asyncio.Task] = {}
+    try:
+        while True:
+            task = await loop.run_in_executor(None, tasks.get)
+            if task is None:
+                break
+            if task[0] == "cancel":
+                job = running.get(task[1])
+                if job is not None:
+                    job.cancel()
+                continue
+            # 每個工作在自己的 context 中執行，request_id、計時物件與期限互不干擾
+            job = asyncio.create_task(run(*task))
+            running[task[0]] = job
+            job.add_done_callback(lambda _, task_id=task[0]: running.pop(task_id, None))
+    finally:
+        for job in list(running.values()):
+            job.cancel()
+        await cookie_jar.stop()
+        await lifecycle.stop()
+        executor.shutdown(wait=False)
+
+
+class Worker:
+    """API 行程中代表一個 worker 行程的物件。"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.tasks = None
+        # 進行中的工作 id
+        self.in_flight: set[int] = set()
+
+
+class WorkerPool:
+    """
+    管理 worker 行程，派發工作並在 worker 結束時重新啟動。
+    """
+
+    def __init__(self, size: int, config: dict, max_requeues=2, check_interval=1):
+        """
+        Args:
+            size (int): worker 行程數量。
+            config (dict): 傳給 worker 的設定，鍵值為 selenium_pool_size、selenium_queue_size、
+                selenium_queue_timeout、nodriver_max_tabs、cookie_jar_file、cookie_jar_flush_interval、
+                browser_max_requests、browser_max_rss_mb、health_check_interval、session_max、session_ttl、
+                spool_bytes、spool_dir。
+                cookie_jar_file 會加上 worker 編號，例如 cookies.0.json。
+            max_requeues (int): worker 結束時工作最多重新派發的次數。
+            check_interval (float): 檢查 worker 是否存活的間隔秒數。
+        """
+        self.config = config
+        self.max_requeues = max_requeues
+        self.check_interval = check_interval
+        self.workers = [Worker(index) for index in range(size)]
+        self.results = None
+        self.pending: dict[int, tuple] = {}
+        # 工作 id 對應到請求期限的絕對時間
+        self.expires: dict[int, float] = {}
+        self.ids = itertools.count()
+        self.loop = None
+        self.reader = None
+        self.monitor = None
+
+    @property
+    def in_flight(self):
+        """所有 worker 進行中的工作數量。"""
+        return len(self.pending)
+
+    async def start(self):
+        """啟動所有 worker 與結果讀取線程。"""
+        self.loop = asyncio.get_running_loop()
+        self.results = _mp.Queue()
+        for worker in self.workers:
+            self.__spawn(worker)
+        self.reader = threading.Thread(target=self.__read_results, name="worker-results", daemon=True)
+        self.reader.start()
+        self.monitor = asyncio.create_task(self.__monitor())
+
+    async def stop(self):
+        """通知所有 worker 結束，並讓進行中的工作失敗。"""
+        if self.monitor is not None:
+            self.monitor.cancel()
+            self.monitor = None
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.tasks.put(None)
+        for worker in self.workers:
+            if worker.process is not None:
+                await asyncio.to_thread(worker.process.join, 30)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        for task_id in list(self.pending):
+            self.__fail(task_id, WorkerCrashedError("worker 已停止"))
+        if self.results is not None:
+            self.results.put(None)
+
+    async def submit(self, backend: str, req: V1RequestBase):
+        """把請求交給 worker 抓取。
+        Args:
+            backend (str): "v1"（Selenium）或 "v2"（nodriver）。
+            req (V1RequestBase): 包含請求資訊的物件。
+        Returns:
+            tuple[SolutionResultT, dict]: 結果與 worker 記錄的各階段耗時（毫秒）。
+        Raises:
+            PoolTimeoutError: worker 中等待可用瀏覽器逾時。
+            SessionLimitError: worker 中工作階段數量已達上限。
+            DeadlineExceeded: worker 中請求超過期限。
+            WorkerCrashedError: worker 多次在處理此請求時結束。
+        """
+        task_id = next(self.ids)
+        future = self.loop.create_future()
+        # 期限以絕對時間傳遞，重新派發時沿用原本的期限
+        deadline = current_deadline()
+        if deadline is not None:
+            self.expires[task_id] = time.time() + deadline.remaining()
+        self.pending[task_id] = (backend, req, future, 0, None)
+        self.__dispatch(task_id)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # 客戶端中斷連線，讓 worker 停止抓取
+            self.__cancel(task_id)
+            raise
+        finally:
+            self.__forget(task_id)
+
+    def __dispatch(self, task_id):
+        """派發給進行中工作最少的 worker，工作階段的請求派發給固定的 worker。"""
+        backend, req, future, requeues, _ = self.pending[task_id]
+        if req.session_id is not None:
+            worker = self.workers[zlib.crc32(req.session_id.encode("utf-8")) % len(self.workers)]
+        else:
+            worker = min(self.workers, key=lambda w: len(w.in_flight))
+        worker.in_flight.add(task_id)
+        self.pending[task_id] = (backend, req, future, requeues, worker)
+        worker.tasks.put((task_id, backend, req, self.expires.get(task_id)))
+
+    def __cancel(self, task_id):
+        entry = self.pending.get(task_id)
+        if entry is not None and entry[4] is not None:
+            entry[4].tasks.put(("cancel", task_id))
+
+    def __forget(self, task_id):
+        self.expires.pop(task_id, None)
+        entry = self.pending.pop(task_id, None)
+        if entry is not None and entry[4] is not None:
+            entry[4].in_flight.discard(task_id)
+
+    def __fail(self, task_id, error):
+        entry = self.pending.get(task_id)
+        if entry is not None and not entry[2].done():
+            entry[2].set_exception(error)
+
+    def __spawn(self, worker: Worker):
+        worker.tasks = _mp.Queue()
+        worker.process = _mp.Process(
+            target=worker_main,
+            args=(worker.index, worker.tasks, self.results, self.config),
+            name=f"crawler-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    async def __monitor(self):
+        """重新啟動意外結束的 worker，並重新派發它進行中的工作。"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for worker in self.workers:
+                if worker.process.is_alive():
+                    continue
+                logger.error("worker %d 已結束 (exit code %s)，重新啟動", worker.index, worker.process.exitcode)
+                lost = list(worker.in_flight)
+                worker.in_flight.clear()
+                self.__spawn(worker)
+                for task_id in lost:
+                    backend, req, future, requeues, _ = self.pending[task_id]
+                    if future.done():
+                        continue
+                    if requeues >= self.max_requeues:
+                        future.set_exception(WorkerCrashedError(f"worker 在處理請求時結束 {requeues + 1} 次"))
+                        continue
+                    self.pending[task_id] = (backend, req, future, requeues + 1, None)
+                    self.__dispatch(task_id)
+
+    def __read_results(self):
+        """在背景線程讀取結果，交回事件迴圈。"""
+        while True:
+            item = self.results.get()
+            if item is None:
+                return
+            self.loop.call_soon_threadsafe(self.__resolve, *item)
+
+    def __resolve(self, task_id, solution, phases, error):
+        entry = self.pending.get(task_id)
+        if entry is None or entry[2].done():
+            return
+        if error is not None:
+            name, message = error
+            if name == "PoolTimeoutError":
+                entry[2].set_exception(PoolTimeoutError(message))
+            elif name == "SessionLimitError":
+                entry[2].set_exception(SessionLimitError(message))
+            elif name == "DeadlineExceeded":
+                # 訊息為用完時間的階段
+                entry[2].set_exception(DeadlineExceeded(message))
+            else:
+                entry[2].set_exception(RuntimeError(f"{name}: {message}"))
+            return
+        spool.attach(solution)
+        entry[2].set_result((solution, phases))
@@ -0,0 +1,24 @@
+"""測試共用設定：把 src 加入匯入路徑，並讓 app 模組的檔案都寫入暫存目錄。
+
+瀏覽器不會啟動：SeleniumPool 與 NodriverCrawler 只在 startup 時啟動瀏覽器，
+測試以 ASGI transport 直接呼叫 app，並把 selpool.get / nodcrawl.get 換成假的抓取函式。
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+_tmp = tempfile.mkdtemp(prefix="crawler-tests-")
+os.environ.update(
+    {
+        "COOKIE_JAR_FILE": "",
+        "CHANGE_STORE_FILE": "",
+        "ROUTER_STATS_FILE": "",
+        "JOB_DB": os.path.join(_tmp, "jobs.db"),
+        "RESPONSE_SPOOL_DIR": os.path.join(_tmp, "spool"),
+        "LOG_LEVEL": "WARNING",
+    }
+)
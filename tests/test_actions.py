@@ -0,0 +1,114 @@
+"""actions 的測試，以假的 driver 與分頁模擬頁面腳本。"""
+
+import asyncio
+import json
+
+from actions import DONE, FALLBACK, run_actions_nodriver, run_actions_selenium
+from data_structures import ActionT
+
+ACTIONS = [
+    ActionT(trigger="input", select="#q", value="bench"),
+    ActionT(trigger="located", select="#result"),
+    ActionT(trigger="clickable", select="#go"),
+    ActionT(trigger="located", select="#next"),
+]
+
+
+class FakePage:
+    """執行 steps 並記錄副作用；report 控制腳本回報的方式。"""
+
+    def __init__(self, report):
+        self.report = report
+        self.effects = []
+
+    def run(self, steps):
+        results = []
+        if self.report is drop_last:
+            steps = steps[:-1]
+        for step in steps:
+            self.effects.append(step["index"])
+            results.append({"index": step["index"], "trigger": step["trigger"], "status": DONE, "error": None, "ms": 1})
+        return self.report(results)
+
+
+class FakeDriver(FakePage):
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute_async_script(self, script, steps):
+        return self.run(steps)
+
+
+class FakeTab(FakePage):
+    async def evaluate(self, script, await_promise=False, return_by_value=False):
+        return self.run(json.loads(script[script.rindex(")(") + 2 : -1]))
+
+
+def stringify(results):
+    return json.dumps(results)
+
+
+def remote_object(results):
+    # nodriver 0.50.6 以 deep serialization 回傳陣列時得到的不是 list
+    return object()
+
+
+def drop_last(results):
+    # 執行到倒數第二個 action，例如最後一步前執行環境被替換
+    return json.dumps(results)
+
+
+def run_selenium(report):
+    page = FakeDriver(report)
+
+    def fallback(actions):
+        page.effects.extend(ACTIONS.index(action) for action in actions)
+        return ""
+
+    msg, results = run_actions_selenium(page, ACTIONS, fallback)
+    return page.effects, msg, results
+
+
+def run_nodriver(report):
+    page = FakeTab(report)
+
+    async def fallback(actions):
+        page.effects.extend(ACTIONS.index(action) for action in actions)
+        return ""
+
+    msg, results = asyncio.run(run_actions_nodriver(page, ACTIONS, fallback))
+    return page.effects, msg, results
+
+
+def test_each_action_runs_once():
+    for run in (run_selenium, run_nodriver):
+        effects, msg, results = run(stringify)
+        assert msg == ""
+        assert sorted(effects) == [0, 1, 2, 3]
+        assert [result["status"] for result in results] == [DONE] * 4
+
+
+def test_only_unreported_actions_fall_back():
+    for run in (run_selenium, run_nodriver):
+        effects, msg, results = run(drop_last)
+        assert msg == ""
+        # 每個批次最後一個 action 沒有回報，只由逐步執行補上
+        assert sorted(effects) == [0, 1, 2, 3]
+        assert [result["status"] for result in results] == [DONE, DONE, FALLBACK, FALLBACK]
+
+
+def test_error_stops_without_fallback():
+    def fail_first(results):
+        results[0].update(status="error", error="boom")
+        return json.dumps(results[:1])
+
+    effects, msg, results = run_nodriver(fail_first)
+    assert "boom" in msg
+    assert effects == [0, 1, 2]
+    assert results[3]["status"] == "skipped"
+
+
+def test_unreadable_result_falls_back_whole_batch():
+    effects, msg, results = run_nodriver(remote_object)
+    assert msg == ""
+    assert [result["status"] for result in results] == [FALLBACK] * 4
@@ -0,0 +1,249 @@
+"""以假的抓取函式測試 app 的請求處理，不啟動瀏覽器。"""
+
+import asyncio
+import time
+
+import app
+import httpx
+import metrics
+import orjson
+import pytest
+from data_structures import SolutionResultT, V1RequestBase, V1ResponseBase
+from selenium_pool import PoolTimeoutError
+
+
+def solution(req, body="x" * 500):
+    return SolutionResultT(status=200, url=req.url, response=body, user_agent="UA")
+
+
+@pytest.fixture
+def client():
+    async def make():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://test")
+
+    return make
+
+
+def test_v1_and_v2_overlap(monkeypatch, client):
+    """/v1 在線程池中執行，不阻塞事件迴圈：同時送出的 /v1、/v2 與 / 時間重疊。"""
+    spans = {}
+
+    def selenium_get(req):
+        started = time.monotonic()
+        time.sleep(0.5)
+        spans["v1"] = (started, time.monotonic())
+        return solution(req)
+
+    async def nodriver_get(req):
+        started = time.monotonic()
+        await asyncio.sleep(0.5)
+        spans["v2"] = (started, time.monotonic())
+        return solution(req)
+
+    monkeypatch.setattr(app.selpool, "get", selenium_get)
+    monkeypatch.setattr(app.nodcrawl, "get", nodriver_get)
+
+    async def main():
+        async with await client() as c:
+            started = time.monotonic()
+            v1, v2, root = await asyncio.gather(
+                c.post("/v1", json={"url": "http://a.test/", "no_cache": True}),
+                c.post("/v2", json={"url": "http://b.test/", "no_cache": True}),
+                c.get("/"),
+            )
+            return time.monotonic() - started, v1, v2, root
+
+    elapsed, v1, v2, root = asyncio.run(main())
+    assert v1.status_code == v2.status_code == root.status_code == 200
+    assert v1.json()["solution"]["status"] == v2.json()["solution"]["status"] == 200
+    # 依序執行需要 1 秒以上
+    assert elapsed < 0.9
+    (a_start, a_end), (b_start, b_end) = spans["v1"], spans["v2"]
+    assert a_start < b_end and b_start < a_end
+
+
+def test_v1_rejects_when_executor_is_full(monkeypatch, client):
+    """線程池已滿時直接回應 503，不在線程池佇列中無限期等待。"""
+
+    def selenium_get(req):
+        time.sleep(0.3)
+        return solution(req)
+
+    monkeypatch.setattr(app.selpool, "get", selenium_get)
+    monkeypatch.setattr(app.selpool, "admitted", app.selpool.size + app.selpool.max_waiting)
+
+    async def main():
+        async with await client() as c:
+            return await c.post("/v1", json={"url": "http://a.test/", "no_cache": True})
+
+    res = asyncio.run(main())
+    assert res.status_code == 503
+
+
+def test_admit_releases_slot():
+    """admit 離開時釋放名額，名額用完時拋出 PoolTimeoutError。"""
+    pool = app.selpool
+    before = pool.admitted
+    with pool.admit():
+        assert pool.admitted == before + 1
+    assert pool.admitted == before
+    pool.admitted = pool.size + pool.max_waiting
+    try:
+        with pytest.raises(PoolTimeoutError):
+            with pool.admit():
+                pass
+    finally:
+        pool.admitted = before
+
+
+def test_v2_error_finishes_timings(monkeypatch, client):
+    """抓取拋出例外時仍記錄請求耗時與 500 狀態碼。"""
+
+    async def nodriver_get(req):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app.nodcrawl, "get", nodriver_get)
+    counter = metrics.RESPONSES.labels("nodriver", "500")
+    before = counter._value.get()
+
+    async def main():
+        async with await client() as c:
+            with pytest.raises(RuntimeError):
+                await c.post("/v2", json={"url": "http://a.test/", "no_cache": True})
+
+    asyncio.run(main())
+    assert counter._value.get() == before + 1
+
+
+@pytest.mark.parametrize("clip", [{"x": 0}, {"width": 10}, {"width": "a", "height": 10}, {"width": 0, "height": 10}])
+def test_invalid_screenshot_clip_returns_400(client, clip):
+    """screenshot_clip 缺少欄位或格式錯誤時回應 400，不在截圖時才拋出 KeyError。"""
+
+    async def main():
+        async with await client() as c:
+            return await c.post("/v2", json={"url": "http://a.test/", "screenshot": True, "screenshot_clip": clip})
+
+    assert asyncio.run(main()).status_code == 400
+
+
+@pytest.mark.parametrize("message", [None, 'contains "solution":null} in text'])
+def test_render_matches_plain_encoding(message):
+    """render 分開編碼 solution 與其他欄位，結果與整份編碼相同。"""
+    req = V1RequestBase(url="http://a.test/")
+    res = V1ResponseBase(message=message, timings={"total": 1.0}, solution=solution(req, 'body "x"'))
+    rendered = app.render(res)
+    assert orjson.loads(rendered.body) == orjson.loads(app.encode(res))
+
+
+def test_conditional_request_without_validators_skips_probe(monkeypatch, client):
+    """變更紀錄沒有 ETag / Last-Modified 時不送出 HEAD 探測，直接抓取。"""
+    probes = []
+
+    async def probe(req, etag=None, last_modified=None):
+        probes.append(req.url)
+
+    async def nodriver_get(req):
+        return solution(req, "same body")
+
+    monkeypatch.setattr(app.http_crawler, "probe", probe)
+    monkeypatch.setattr(app.nodcrawl, "get", nodriver_get)
+
+    async def main():
+        async with await client() as c:
+            first = await c.post("/v2", json={"url": "http://probe.test/", "no_cache": True})
+            known = first.json()["solution"]["content_hash"]
+            return await c.post("/v2", json={"url": "http://probe.test/", "no_cache": True, "known_hash": known})
+
+    res = asyncio.run(main())
+    assert res.json()["status"] == "unchanged"
+    assert probes == []
+
+
+def test_worker_cookies_reach_the_api_jar(monkeypatch):
+    """worker 模式下瀏覽器取得的 cookies 寫入 API 行程的 cookie jar，工作階段的 cookies 除外。"""
+
+    class FakePool:
+        async def submit(self, backend, req):
+            cookie = {"name": req.session_id or "sid", "value": "1", "domain": "worker.test", "path": "/"}
+            return SolutionResultT(status=200, url=req.url, cookies=[cookie]), {}
+
+    monkeypatch.setattr(app, "worker_pool", FakePool())
+    asyncio.run(app.fetch_worker("v2", V1RequestBase(url="http://worker.test/")))
+    asyncio.run(app.fetch_worker("v2", V1RequestBase(url="http://worker.test/", session_id="login")))
+    assert [cookie["name"] for cookie in app.cookie_jar.cookies_for("http://worker.test/")] == ["sid"]
+
+
+def test_batch_streams_each_line_when_done():
+    """先完成的請求先輸出，不等待較慢的請求。"""
+    release = asyncio.Event()
+
+    async def crawl(req):
+        if req.url.endswith("slow"):
+            await release.wait()
+        return V1ResponseBase(solution=solution(req))
+
+    async def main():
+        stream = app.stream_batch([{"url": "http://a.test/slow"}, {"url": "http://a.test/fast"}], crawl, 2)
+        first = orjson.loads(await anext(stream))
+        # 慢的請求尚未完成時，第一行已經輸出
+        assert not release.is_set()
+        release.set()
+        second = orjson.loads(b"".join([chunk async for chunk in stream]))
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert (first["index"], first["solution"]["url"]) == (1, "http://a.test/fast")
+    assert (second["index"], second["solution"]["url"]) == (0, "http://a.test/slow")
+
+
+def test_batch_errors_become_lines(monkeypatch, client):
+    """失敗的請求與無效的資料輸出為 error 行，不中斷串流。"""
+
+    async def nodriver_get(req):
+        if req.url.endswith("boom"):
+            raise RuntimeError("boom")
+        return solution(req)
+
+    monkeypatch.setattr(app.nodcrawl, "get", nodriver_get)
+    payloads = [
+        {"url": "http://batch.test/ok", "no_cache": True},
+        {"url": "http://batch.test/boom", "no_cache": True},
+        {"url": 5},
+    ]
+
+    async def main():
+        async with await client() as c:
+            return await c.post("/v2/batch", json={"requests": payloads})
+
+    res = asyncio.run(main())
+    assert res.headers["content-type"] == "application/x-ndjson"
+    lines = sorted((orjson.loads(line) for line in res.text.splitlines()), key=lambda line: line["index"])
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert lines[0]["status"] == "ok" and lines[0]["solution"]["url"] == "http://batch.test/ok"
+    assert lines[1]["status"] == "error" and "boom" in lines[1]["message"]
+    assert lines[2]["status"] == "error"
+
+
+@pytest.mark.parametrize("body", [b'"http://a.test/"', b'{"requests": 5}', b"not json"])
+def test_batch_rejects_non_list_body(client, body):
+    async def main():
+        async with await client() as c:
+            return await c.post("/v1/batch", content=body)
+
+    res = asyncio.run(main())
+    assert res.status_code == 400
+
+
+def test_v3_reports_backend(monkeypatch, client):
+    async def route(req):
+        return solution(req), "nodriver"
+
+    monkeypatch.setattr(app.router, "fetch", route)
+
+    async def main():
+        async with await client() as c:
+            return await c.post("/v3", json={"url": "http://v3.test/", "no_cache": True})
+
+    res = asyncio.run(main()).json()
+    assert res["backend"] == "nodriver"
+    assert res["solution"]["url"] == "http://v3.test/"
@@ -0,0 +1,62 @@
+"""SessionManager 的測試，以假的瀏覽器取代 Chrome。"""
+
+import asyncio
+
+import pytest
+from browser_sessions import SessionLimitError, SessionManager
+
+
+class SlowConnection:
+    """關閉瀏覽器情境需要一段時間。"""
+
+    def __init__(self):
+        self.disposed = 0
+
+    async def send(self, command):
+        await asyncio.sleep(0.05)
+        self.disposed += 1
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connection = SlowConnection()
+
+
+def test_new_session_is_not_evicted_while_closing_victim():
+    """acquire 關閉被淘汰的工作階段時，同時進來的請求不能淘汰剛建立的工作階段。"""
+
+    async def main():
+        manager = SessionManager(max_sessions=1)
+        old = await manager.acquire("old")
+        old.browser, old.context_id = FakeBrowser(), "ctx"
+        manager.release(old)
+
+        first = asyncio.create_task(manager.acquire("first"))
+        await asyncio.sleep(0)
+        # first 正在關閉 old，唯一的名額屬於 first
+        with pytest.raises(SessionLimitError):
+            await manager.acquire("second")
+        session = await first
+        assert list(manager.sessions) == ["first"]
+        assert session.users == 1
+        manager.release(session)
+        assert session.users == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_acquire_releases_user():
+    async def main():
+        manager = SessionManager(max_sessions=1)
+        old = await manager.acquire("old")
+        old.browser, old.context_id = FakeBrowser(), "ctx"
+        manager.release(old)
+
+        task = asyncio.create_task(manager.acquire("new"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert manager.sessions["new"].users == 0
+
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+"""CompressionMiddleware 的測試。"""
+
+import asyncio
+
+import httpx
+import pytest
+from compression import CompressionMiddleware, is_compressible
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+BODY = b"x" * 4096
+
+
+def make_app(media_type):
+    async def endpoint(request):
+        return Response(BODY, media_type=media_type)
+
+    return CompressionMiddleware(Starlette(routes=[Route("/", endpoint)]))
+
+
+def get(media_type):
+    async def main():
+        transport = httpx.ASGITransport(app=make_app(media_type))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await c.get("/", headers={"Accept-Encoding": "gzip"})
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("media_type", ["image/png", "image/webp", "video/mp4", "application/zip"])
+def test_compressed_media_is_not_recompressed(media_type):
+    res = get(media_type)
+    assert "content-encoding" not in res.headers
+    assert res.content == BODY
+
+
+def test_text_is_compressed():
+    res = get("application/json")
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.content == BODY
+
+
+def test_is_compressible():
+    assert is_compressible("text/html; charset=utf-8")
+    assert is_compressible("image/svg+xml")
+    assert not is_compressible("IMAGE/JPEG")
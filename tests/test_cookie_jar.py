@@ -0,0 +1,32 @@
+"""CookieJar 的測試。"""
+
+from cookie_jar import CookieJar
+
+
+def test_host_only_cookie_does_not_leak_to_subdomains():
+    jar = CookieJar()
+    jar.update(
+        [
+            {"name": "host", "value": "1", "domain": "example.com", "path": "/"},
+            {"name": "shared", "value": "2", "domain": ".example.com", "path": "/"},
+        ]
+    )
+    own = {cookie["name"]: cookie for cookie in jar.cookies_for("https://example.com/page")}
+    assert set(own) == {"host", "shared"}
+    # host-only cookie 以 url 注入，瀏覽器不會把它設成子域名也適用的 cookie
+    assert own["host"]["url"] == "https://example.com/page"
+    assert "domain" not in own["host"] and "hostOnly" not in own["host"]
+    assert own["shared"]["domain"] == ".example.com"
+
+    sub = [cookie["name"] for cookie in jar.cookies_for("https://www.example.com/")]
+    assert sub == ["shared"]
+
+
+def test_host_only_flag_survives_reload(tmp_path):
+    path = str(tmp_path / "cookies.json")
+    jar = CookieJar(path)
+    jar.update([{"name": "host", "value": "1", "domain": "www.example.com", "hostOnly": True}])
+    jar.flush()
+    reloaded = CookieJar(path)
+    assert [cookie["name"] for cookie in reloaded.cookies_for("https://www.example.com/")] == ["host"]
+    assert reloaded.cookies_for("https://a.www.example.com/") == []
@@ -0,0 +1,44 @@
+"""extraction 的測試。"""
+
+import asyncio
+import json
+
+import app
+import httpx
+import pytest
+from data_structures import ValidationError, decode_request
+from extraction import extract_nodriver
+
+
+class FakeTab:
+    """只回傳字串的假分頁；nodriver 對物件回傳 RemoteObject，對字串回傳值。"""
+
+    def __init__(self, result):
+        self.result = result
+        self.scripts = []
+
+    async def evaluate(self, script, return_by_value=True):
+        self.scripts.append(script)
+        return json.dumps(self.result) if script.startswith("JSON.stringify(") else object()
+
+
+def test_extract_nodriver_decodes_json():
+    tab = FakeTab({"title": "Hello", "links": ["/a", "/b"]})
+    data = asyncio.run(extract_nodriver(tab, {"title": "h1", "links": {"css": "a", "prop": "href", "all": True}}))
+    assert data == {"title": "Hello", "links": ["/a", "/b"]}
+    assert len(tab.scripts) == 1
+
+
+@pytest.mark.parametrize("extract", [{"title": 1}, {"title": {"attr": "href"}}, {"title": ["h1"]}])
+def test_invalid_extract_is_rejected(extract):
+    with pytest.raises(ValidationError):
+        decode_request(json.dumps({"url": "http://a.test/", "extract": extract}).encode())
+
+
+def test_invalid_extract_returns_400():
+    async def main():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await c.post("/v2", json={"url": "http://a.test/", "extract": {"title": 1}})
+
+    assert asyncio.run(main()).status_code == 400
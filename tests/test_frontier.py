@@ -0,0 +1,44 @@
+"""frontier 的測試：去重集合與會寫入暫存檔的佇列。"""
+
+from frontier import Frontier, SeenSet
+
+URLS = [f"https://a.test/{i}" for i in range(100)]
+
+
+def test_seen_set_past_exact_limit():
+    """精確集合滿了之後仍能以 Bloom filter 判斷重複的網址。"""
+    seen = SeenSet(capacity=1000, exact_limit=10)
+    assert all(seen.add(url) for url in URLS)
+    assert not any(seen.add(url) for url in URLS)
+    assert len(seen) == 100
+    assert len(seen.exact) == 10
+
+
+def test_seen_set_uses_exact_set_for_bloom_false_positives():
+    """Bloom filter 誤判時，精確集合未滿就能認出新網址；滿了之後只能視為已出現。"""
+    seen = SeenSet(capacity=1000, exact_limit=2)
+    seen.bloom.contains = lambda h1, h2: True
+    assert seen.add(URLS[0]) and seen.add(URLS[1])
+    assert not seen.add(URLS[0])
+    assert seen.add(URLS[2])
+    assert not seen.add(URLS[3])
+    assert len(seen) == 3
+
+
+def test_frontier_spills_in_fifo_order():
+    frontier = Frontier(memory_limit=3)
+    for i in range(10):
+        frontier.push(URLS[i], i % 3)
+    assert len(frontier.memory) == 3 and frontier.spilled == 7
+    popped = [frontier.pop() for _ in range(5)]
+    # 讀回暫存檔的期間加入的網址排在後面
+    for i in range(10, 13):
+        frontier.push(URLS[i], 0)
+    while frontier:
+        popped.append(frontier.pop())
+    assert [url for _, url in popped] == URLS[:13]
+    assert [depth for depth, _ in popped[:10]] == [i % 3 for i in range(10)]
+    # 暫存檔讀完後清空
+    assert frontier.spill.seek(0, 2) == 0
+    frontier.close()
+    assert frontier.spill is None
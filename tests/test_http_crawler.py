@@ -0,0 +1,102 @@
+"""HttpCrawler 的測試，以 httpx.MockTransport 模擬網站。"""
+
+import asyncio
+
+import http_crawler
+import httpx
+import pytest
+from cookie_jar import CookieJar
+from data_structures import V1RequestBase
+from http_crawler import HttpCrawler
+
+PAGE = "<html><body>" + "content " * 50 + "</body></html>"
+
+
+class Site:
+    """依路徑回傳預先設定的回應，並記錄收到的請求。"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def __call__(self, request: httpx.Request):
+        self.requests.append(request)
+        status, headers, body = self.routes[request.url.path]
+        return httpx.Response(status, headers=headers, text=body)
+
+
+def crawler_for(routes, **kwargs):
+    site = Site(routes)
+    return HttpCrawler(transport=httpx.MockTransport(site), **kwargs), site
+
+
+def fetch(crawler, path, host="a.test", **kwargs):
+    return asyncio.run(crawler.fetch(V1RequestBase(url=f"http://{host}{path}"), **kwargs))
+
+
+HTML = {"content-type": "text/html; charset=utf-8"}
+
+
+def test_serves_html():
+    crawler, _ = crawler_for({"/": (200, HTML, PAGE)})
+    solution, reason = fetch(crawler, "/")
+    assert reason == "" and solution.status == 200 and solution.response == PAGE
+
+
+def test_challenge_page_escalates_and_is_remembered():
+    crawler, site = crawler_for({"/": (200, HTML, "<html><title>Just a moment...</title>" + PAGE)})
+    assert fetch(crawler, "/") == (None, "challenge")
+    # 記憶期限內直接使用瀏覽器，不送出請求
+    assert fetch(crawler, "/") == (None, "domain")
+    assert len(site.requests) == 1
+    assert fetch(crawler, "/", use_memory=False) == (None, "challenge")
+    assert len(site.requests) == 2
+
+
+@pytest.mark.parametrize("status", [401, 403, 429, 503])
+def test_blocking_status_escalates(status):
+    crawler, _ = crawler_for({"/": (status, HTML, PAGE)})
+    assert fetch(crawler, "/") == (None, "challenge")
+
+
+def test_page_size_escalation_only_for_html_success():
+    crawler, _ = crawler_for(
+        {
+            "/short": (200, HTML, "<html></html>"),
+            "/missing": (404, HTML, "<html>not found</html>"),
+            "/api": (200, {"content-type": "application/json"}, "{}"),
+        }
+    )
+    assert fetch(crawler, "/api")[0].response == "{}"
+    solution, reason = fetch(crawler, "/missing")
+    assert reason == "" and solution.status == 404
+    assert fetch(crawler, "/short") == (None, "page_size")
+
+
+def test_domain_memory_expires(monkeypatch):
+    crawler, _ = crawler_for({"/": (200, HTML, "<html></html>")}, memory_ttl=60)
+    now = http_crawler.time.time()
+    fetch(crawler, "/")
+    assert crawler.needs_browser_domain("http://a.test/other")
+    monkeypatch.setattr(http_crawler.time, "time", lambda: now + 61)
+    assert not crawler.needs_browser_domain("http://a.test/other")
+    assert crawler.browser_domains == {}
+
+
+def test_set_cookie_round_trip():
+    """Set-Cookie 寫入 cookie jar，之後的請求依網域帶入。"""
+    jar = CookieJar()
+    headers = [
+        ("content-type", "text/html"),
+        ("set-cookie", "sid=1; Path=/"),
+        ("set-cookie", "wide=2; Domain=a.test; Path=/"),
+    ]
+    crawler, site = crawler_for({"/": (200, headers, PAGE)}, cookie_jar=jar)
+    solution, _ = fetch(crawler, "/")
+    assert {cookie["name"] for cookie in solution.cookies} == {"sid", "wide"}
+    fetch(crawler, "/")
+    fetch(crawler, "/", host="sub.a.test")
+    assert "Cookie" not in site.requests[0].headers
+    assert sorted(site.requests[1].headers["Cookie"].split("; ")) == ["sid=1", "wide=2"]
+    # 沒有 Domain 屬性的 cookie 只送回原本的主機
+    assert site.requests[2].headers["Cookie"] == "wide=2"
@@ -0,0 +1,35 @@
+"""JobQueue 的排程測試。"""
+
+import asyncio
+
+from data_structures import V1ResponseBase
+from job_queue import JobQueue
+
+
+def test_saturated_domain_does_not_starve_others(tmp_path):
+    """前 500 筆以上都是已達上限的網域時，後面其他網域的工作仍會被派發。"""
+
+    async def main():
+        started = []
+        release = asyncio.Event()
+
+        async def crawl(req):
+            started.append(req.url)
+            await release.wait()
+            return V1ResponseBase(status="ok")
+
+        queue = JobQueue(str(tmp_path / "jobs.db"), {"v2": crawl}, max_running=4, domain_limit=1)
+        for _ in range(600):
+            await queue.submit("v2", {"url": "https://busy.example.com/"}, priority=1)
+        job_id = await queue.submit("v2", {"url": "https://other.example.org/"})
+        await queue.start()
+        for _ in range(100):
+            if len(started) >= 2:
+                break
+            await asyncio.sleep(0.01)
+        assert sorted(started) == ["https://busy.example.com/", "https://other.example.org/"]
+        assert (await queue.get(job_id)).status == "running"
+        release.set()
+        await queue.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""log 的測試：JSON lines 格式、request_id 的傳遞與停用等級。"""
+
+import atexit
+import contextvars
+import io
+import json
+import logging
+import threading
+
+import log
+import pytest
+from data_structures import V1RequestBase
+from log import bind_request, get_logger, setup_logging
+
+
+@pytest.fixture
+def output(monkeypatch):
+    """以新的 listener 把 "crawler" logger 寫入 StringIO，結束後還原。"""
+    root = logging.getLogger(log.ROOT)
+    saved = root.handlers[:], root.level, root.propagate
+    root.handlers = []
+    monkeypatch.setattr(log, "_listener", None)
+    buffer = io.StringIO()
+    setup_logging("INFO", "json", buffer)
+
+    def lines():
+        # 停止 listener 時會寫出佇列中剩下的紀錄
+        log._listener.stop()
+        atexit.unregister(log._listener.stop)
+        return [json.loads(line) for line in buffer.getvalue().splitlines()]
+
+    yield lines
+    root.handlers, level, root.propagate = saved
+    root.setLevel(level)
+
+
+def test_json_lines(output):
+    logger = get_logger("tests")
+    logger.info("hello %s", "世界")
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        logger.exception("failed")
+    first, second = output()
+    assert first["level"] == "INFO" and first["logger"] == "tests" and first["message"] == "hello 世界"
+    assert "request_id" not in first and isinstance(first["time"], float)
+    assert second["level"] == "ERROR" and "ValueError: bad" in second["exc_info"]
+
+
+def test_request_id_reaches_threads(output):
+    logger = get_logger("tests")
+
+    def handle():
+        request_id = bind_request(V1RequestBase(request_id="req-1"))
+        logger.info("in request")
+        # Selenium 線程以 copy_context 執行，沿用同一個 request_id
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(logger.info, "in thread"))
+        thread.start()
+        thread.join()
+        return request_id
+
+    assert contextvars.copy_context().run(handle) == "req-1"
+    logger.info("after request")
+    lines = output()
+    assert [line.get("request_id") for line in lines] == ["req-1", "req-1", None]
+
+
+def test_bind_request_generates_id():
+    req = V1RequestBase()
+    assert contextvars.copy_context().run(bind_request, req) == req.request_id
+    assert len(req.request_id) == 32
+
+
+def test_disabled_level_is_not_formatted(output):
+    formatted = []
+
+    class Arg:
+        def __str__(self):
+            formatted.append(self)
+            return "arg"
+
+    logger = get_logger("tests")
+    skipped, logged = Arg(), Arg()
+    logger.debug("debug %s", skipped)
+    logger.info("info %s", logged)
+    lines = output()
+    assert [line["message"] for line in lines] == ["info arg"]
+    # 停用等級的參數不會被格式化（pytest 的 log capture 也可能格式化啟用的紀錄）
+    assert logged in formatted and skipped not in formatted
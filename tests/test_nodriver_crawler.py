@@ -0,0 +1,48 @@
+"""NodriverCrawler 的測試，以假的瀏覽器取代 Chrome。"""
+
+import asyncio
+import threading
+
+from nodriver_crawler import NodriverCrawler
+
+
+class FakeConnection:
+    async def send(self, command):
+        # nodriver 以 generator 傳遞 CDP 指令
+        request = next(command)
+        assert request["method"] == "SystemInfo.getProcessInfo"
+        try:
+            command.send(
+                {
+                    "processInfo": [
+                        {"type": "gpu", "id": 11, "cpuTime": 0.1},
+                        {"type": "browser", "id": 10, "cpuTime": 0.2},
+                    ]
+                }
+            )
+        except StopIteration as e:
+            return e.value
+
+
+class FakeBrowser:
+    connection = FakeConnection()
+
+
+def test_health_check_reads_rss_off_the_event_loop(monkeypatch):
+    crawler = NodriverCrawler()
+    crawler.browser = FakeBrowser()
+    calls = []
+    recycled = []
+
+    def over_limit(pid):
+        calls.append((pid, threading.current_thread() is threading.main_thread()))
+        return True
+
+    async def recycle(reason="error"):
+        recycled.append(reason)
+
+    monkeypatch.setattr(crawler, "recycle", recycle)
+    asyncio.run(crawler.health_check(over_limit))
+    # 主行程 id 來自 SystemInfo.getProcessInfo，RSS 在線程中讀取
+    assert calls == [(10, False)]
+    assert recycled == ["rss"]
@@ -0,0 +1,84 @@
+"""page_content 的測試，以假的分頁模擬 nodriver 的回傳值。"""
+
+import asyncio
+import json
+import re
+
+import page_content
+import pytest
+import spool
+from data_structures import SolutionResultT, V1RequestBase
+from page_content import CHUNK_CHARS, read_content_nodriver, read_content_selenium
+
+
+class RemoteObject:
+    """nodriver 0.50.6 以 deep serialization 回傳陣列與物件時得到的值。"""
+
+
+def run_slice(page, script):
+    start, size = map(int, re.findall(r"\((\d+), (\d+)\)", script)[-1])
+    end = min(start + size, len(page))
+    return json.dumps([page[start:end], end]) if "JSON.stringify" in page_content.SLICE_JS else RemoteObject()
+
+
+class FakeTab:
+    def __init__(self, page):
+        self.page = page
+        self.cleaned = False
+
+    async def evaluate(self, script, return_by_value=False):
+        if script is page_content.STASH_JS:
+            return len(self.page)
+        if script is page_content.CLEANUP_JS:
+            self.cleaned = True
+            return None
+        return run_slice(self.page, script)
+
+    async def get_content(self):
+        return self.page
+
+
+class FakeDriver:
+    def __init__(self, page):
+        self.page = page
+
+    @property
+    def page_source(self):
+        raise AssertionError("分段讀取時不應取得整份 page_source")
+
+    def execute_script(self, script, *args):
+        # 與瀏覽器相同：return 後直接換行時自動插入分號，回傳 undefined
+        if re.match(r"return[ \t]*\n", script):
+            return None
+        if page_content.STASH_JS.strip() in script:
+            return len(self.page)
+        if script is page_content.CLEANUP_JS:
+            return None
+        assert page_content.SLICE_JS.strip() in script
+        start, size = args
+        end = min(start + size, len(self.page))
+        return json.dumps([self.page[start:end], end])
+
+
+PAGE = "<html>" + "é" * (CHUNK_CHARS * 2 + 10) + "</html>"
+
+
+def text(body):
+    return spool.materialize(body.fill(SolutionResultT())).response
+
+
+def test_read_content_nodriver_in_slices():
+    tab = FakeTab(PAGE)
+    body = asyncio.run(read_content_nodriver(tab, V1RequestBase(max_response_bytes=None)))
+    assert text(body) == PAGE
+    assert tab.cleaned
+
+
+def test_read_content_selenium_in_slices():
+    body = read_content_selenium(FakeDriver(PAGE), V1RequestBase(max_response_bytes=None))
+    assert text(body) == PAGE
+
+
+def test_unreadable_slice_raises():
+    with pytest.raises(RuntimeError):
+        page_content._decode_slice(RemoteObject())
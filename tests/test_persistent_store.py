@@ -0,0 +1,58 @@
+"""PersistentStore 與其子類別的測試。"""
+
+import asyncio
+import json
+
+from change_store import ChangeStore
+from cookie_jar import CookieJar
+
+
+def test_change_store_round_trip(tmp_path):
+    path = str(tmp_path / "changes.json")
+    store = ChangeStore(path, max_entries=2)
+    for key in ("a", "b", "c"):
+        store.record(key, f"hash-{key}", etag=f'"{key}"')
+    store.flush()
+    reloaded = ChangeStore(path, max_entries=2)
+    assert reloaded.get("a") is None
+    assert reloaded.get("c")["etag"] == '"c"'
+    assert not reloaded.dirty
+
+
+def test_failed_write_keeps_changes(tmp_path, monkeypatch):
+    """寫入失敗時保留 dirty，下次寫入時再試。"""
+    path = tmp_path / "cookies.json"
+    jar = CookieJar(str(path))
+    jar.update([{"name": "a", "value": "1", "domain": ".example.com"}])
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr("persistent_store.os.replace", fail)
+        jar.flush()
+    assert jar.dirty
+    jar.flush()
+    assert not jar.dirty
+    assert [cookie["name"] for cookie in json.loads(path.read_text())] == ["a"]
+
+
+def test_stop_flushes(tmp_path):
+    path = tmp_path / "changes.json"
+    store = ChangeStore(str(path), flush_interval=60)
+
+    async def main():
+        await store.start()
+        store.record("a", "hash")
+        await store.stop()
+
+    asyncio.run(main())
+    assert "a" in json.loads(path.read_text())
+
+
+def test_unreadable_file_is_ignored(tmp_path):
+    path = tmp_path / "changes.json"
+    path.write_text("{not json")
+    store = ChangeStore(str(path))
+    assert store.get("a") is None
+    assert not store.dirty
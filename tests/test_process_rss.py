@@ -0,0 +1,33 @@
+"""process_rss 的測試。"""
+
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import process_rss
+import pytest
+
+
+def test_missing_pid_is_zero():
+    assert process_rss.process_tree_rss(None) == 0
+
+
+@pytest.mark.skipif(platform.system() != "Linux", reason="/proc 只在 Linux 上可用")
+def test_proc_walk_includes_children(monkeypatch):
+    """沒有 psutil 時從 /proc 走訪行程樹，子行程的 RSS 也計算在內。"""
+    monkeypatch.setattr(process_rss, "psutil", None)
+    own = process_rss.process_tree_rss(os.getpid())
+    child = subprocess.Popen([sys.executable, "-c", "import time; data = bytearray(64 << 20); time.sleep(5)"])
+    try:
+        for _ in range(50):
+            total = process_rss.process_tree_rss(os.getpid())
+            if total > own + (32 << 20):
+                break
+            time.sleep(0.1)
+        assert own > 0
+        assert total > own + (32 << 20)
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,125 @@
+"""readiness 的測試，以假的分頁與 CDP 事件模擬頁面載入。"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from data_structures import V1RequestBase
+from readiness import READY, READY_JS, TIMEOUT, NetworkIdleTracker, build_options, wait_ready_nodriver, wait_ready_selenium
+
+
+def test_build_options():
+    opts = build_options(V1RequestBase(wait_until="selector", wait_selector="#main", idle_time=300), 2.5)
+    assert opts["strategy"] == "selector"
+    assert opts["selector"] == "#main"
+    assert (opts["timeout"], opts["idle_time"], opts["page_size"]) == (2500, 300, 100)
+    # 未知的策略改用 page_size
+    assert build_options(V1RequestBase(wait_until="load"), 1)["strategy"] == "page_size"
+
+
+class RemoteObject:
+    """導航中執行環境被替換時，evaluate 回傳的不是狀態字串。"""
+
+
+class FakeTab:
+    def __init__(self, results):
+        self.results = list(results)
+        self.scripts = []
+
+    async def evaluate(self, script, await_promise=False, return_by_value=False):
+        self.scripts.append(script)
+        return self.results.pop(0) if self.results else RemoteObject()
+
+
+def opts_of(script):
+    return json.loads(script[len(f"({READY_JS})(") : -1])
+
+
+def test_nodriver_reevaluates_until_state():
+    tab = FakeTab([RemoteObject(), None, READY])
+    state, waited = asyncio.run(wait_ready_nodriver(tab, V1RequestBase(), 5))
+    assert state == READY
+    assert len(tab.scripts) == 3
+    # 每次重新執行時只給剩下的時間
+    timeouts = [opts_of(script)["timeout"] for script in tab.scripts]
+    assert timeouts == sorted(timeouts, reverse=True) and timeouts[0] <= 5000
+    assert waited >= 200
+
+
+def test_nodriver_times_out_when_script_keeps_failing():
+    tab = FakeTab([])
+    state, _ = asyncio.run(wait_ready_nodriver(tab, V1RequestBase(), 0.3))
+    assert state == TIMEOUT
+    assert 1 <= len(tab.scripts) <= 4
+
+
+def test_selenium_passes_options():
+    class FakeDriver:
+        def set_script_timeout(self, seconds):
+            self.script_timeout = seconds
+
+        def execute_async_script(self, script, opts):
+            self.script, self.opts = script, opts
+            return READY
+
+    driver = FakeDriver()
+    state, _ = wait_ready_selenium(driver, V1RequestBase(wait_until="mutation_idle"), 3)
+    assert state == READY
+    assert driver.opts["strategy"] == "mutation_idle"
+    assert driver.script_timeout > 3
+    assert driver.script.startswith("const done = arguments[arguments.length - 1];")
+
+
+class EventTab:
+    def __init__(self):
+        self.handlers = {}
+        self.sent = []
+
+    async def send(self, command):
+        self.sent.append(command)
+
+    def add_handler(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def remove_handler(self, event, handler):
+        self.handlers[event].remove(handler)
+
+
+def event(request_id):
+    return SimpleNamespace(request_id=request_id)
+
+
+def test_network_idle_tracker():
+    async def main():
+        tab = EventTab()
+        tracker = NetworkIdleTracker()
+        await tracker.attach(tab)
+        assert len(tab.sent) == 1 and sum(map(len, tab.handlers.values())) == 3
+        tracker.on_request(event("1"))
+        tracker.on_request(event("2"))
+        tracker.on_done(event("1"))
+        # 還有進行中的請求時等到逾時
+        assert await tracker.wait_idle(0, 0.2) == TIMEOUT
+        tracker.on_done(event("2"))
+        start = time.monotonic()
+        assert await tracker.wait_idle(200, 2) == READY
+        assert time.monotonic() - start >= 0.15
+        # 新的請求重新開始計算閒置時間
+        tracker.on_request(event("3"))
+        tracker.on_done(event("3"))
+        assert await tracker.wait_idle(500, 0.2) == TIMEOUT
+        tracker.detach()
+        assert sum(map(len, tab.handlers.values())) == 0
+
+    asyncio.run(main())
+
+
+def test_nodriver_network_idle_uses_tracker():
+    tracker = NetworkIdleTracker()
+    tracker.last_activity -= 1
+    tab = FakeTab([])
+    state, _ = asyncio.run(wait_ready_nodriver(tab, V1RequestBase(wait_until="network_idle"), 1, tracker))
+    assert state == READY
+    assert tab.scripts == []
+
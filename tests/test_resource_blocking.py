@@ -0,0 +1,60 @@
+"""resource_blocking 的測試。"""
+
+import fnmatch
+import json
+
+from resource_blocking import count_blocked_selenium, resolve_block_options, selenium_blocked_urls
+
+
+def entry(method, **params):
+    return {"level": "INFO", "message": json.dumps({"message": {"method": method, "params": params}, "webview": "x"})}
+
+
+def test_count_blocked_selenium():
+    """只計算帶有 blockedReason 的 Network.loadingFailed 事件。"""
+    entries = [
+        entry("Network.requestWillBeSent", requestId="1"),
+        entry("Network.loadingFailed", requestId="1", errorText="net::ERR_BLOCKED_BY_CLIENT", blockedReason="inspector"),
+        entry("Network.loadingFailed", requestId="2", errorText="net::ERR_CONNECTION_RESET"),
+        entry("Network.loadingFailed", requestId="3", blockedReason="inspector"),
+        {"level": "INFO", "message": "not json Network.loadingFailed"},
+    ]
+    assert count_blocked_selenium(entries) == 2
+    assert count_blocked_selenium([]) == 0
+
+
+def blink_matches(url, pattern):
+    """Chrome 檢查 Network.setBlockedURLs 的方式：依序尋找以 * 分隔的片段，頭尾不錨定。"""
+    pos = 0
+    for part in pattern.split("*"):
+        pos = url.find(part, pos)
+        if pos < 0:
+            return False
+        pos += len(part)
+    return True
+
+
+def blocked(url, urls):
+    # 同時以不錨定的片段比對與完整的萬用字元比對檢查
+    return any(blink_matches(url, pattern) or fnmatch.fnmatchcase(url, pattern) for pattern in urls)
+
+
+def test_selenium_blocked_urls_match_only_the_path():
+    """副檔名只比對網址路徑，不封鎖主機名稱中含有副檔名的網頁。"""
+    urls = selenium_blocked_urls(*resolve_block_options(["image", "font", "media", "stylesheet"]))
+    for url in [
+        "https://www.giftcards.com/",
+        "https://www.svgrepo.com/",
+        "https://iconify.design.icons.example/",
+        "https://cdn.css-tricks.com/",
+        "https://ogg.example/page",
+        "https://example.com/",
+    ]:
+        assert not blocked(url, urls), url
+    for url in [
+        "https://example.com/a.gif",
+        "https://example.com/img/logo.svg?v=2",
+        "https://example.com/style.css",
+        "https://example.com/fonts/a.woff2",
+    ]:
+        assert blocked(url, urls), url
@@ -0,0 +1,112 @@
+"""回應快取與變更紀錄的鍵。"""
+
+import asyncio
+
+import pytest
+from change_store import change_key
+from data_structures import SolutionResultT, V1RequestBase
+from deadline import DeadlineExceeded, start_deadline
+from response_cache import SHARED, ResponseCache, cache_key
+
+
+def test_cache_key_includes_wait_and_blocking():
+    base = V1RequestBase(url="http://a.test/")
+    key = cache_key("v2", base)
+    assert cache_key("v2", V1RequestBase(url="http://A.test/#x")) == key
+    assert cache_key("v2", V1RequestBase(url="http://a.test/", wait_until="selector", wait_selector="#x")) != key
+    assert cache_key("v2", V1RequestBase(url="http://a.test/", wait_xpath="//div")) != key
+    assert cache_key("v2", V1RequestBase(url="http://a.test/", block_resources="image")) != key
+
+
+def test_keys_include_size_limits():
+    """截斷或拒絕的結果不會被沒有大小上限的請求取得。"""
+    base = V1RequestBase(url="http://a.test/", max_response_bytes=1000)
+    for key in (lambda req: cache_key("v2", req), change_key):
+        assert key(V1RequestBase(url="http://a.test/", max_response_bytes=2000)) != key(base)
+        assert key(V1RequestBase(url="http://a.test/", max_response_bytes=1000, truncate_response=False)) != key(base)
+
+
+def test_cache_key_includes_fast_path():
+    """快速路徑取得的原始 HTML 不會提供給要求瀏覽器的請求。"""
+    fast = cache_key("v1", V1RequestBase(url="http://a.test/", fast_path=True))
+    assert fast != cache_key("v1", V1RequestBase(url="http://a.test/", fast_path=False))
+
+
+class SlowFetch:
+    """記錄呼叫次數、是否被取消，並在 seconds 秒後回傳結果。"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return SolutionResultT(status=200, url="http://a.test/", response="body")
+
+
+def waiter(cache, fetcher, seconds=None):
+    async def run():
+        if seconds is not None:
+            start_deadline(seconds)
+        return await cache.fetch("v2", REQ, fetcher)
+
+    return asyncio.create_task(run())
+
+
+REQ = V1RequestBase(url="http://a.test/")
+
+
+def test_leader_disconnect_does_not_abort_followers():
+    """第一個請求的客戶端中斷連線時，共用同一次抓取的其他請求仍取得結果。"""
+
+    async def main():
+        cache, fetcher = ResponseCache(), SlowFetch(0.2)
+        leader = waiter(cache, fetcher)
+        await asyncio.sleep(0.01)
+        follower = waiter(cache, fetcher)
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        solution, status = await follower
+        assert (solution.response, status) == ("body", SHARED)
+        assert fetcher.calls == 1 and not fetcher.cancelled
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+
+
+def test_fetch_is_cancelled_when_every_waiter_leaves():
+    async def main():
+        cache, fetcher = ResponseCache(), SlowFetch(1)
+        tasks = [waiter(cache, fetcher), waiter(cache, fetcher)]
+        await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert fetcher.cancelled
+        assert cache.inflight == {}
+
+    asyncio.run(main())
+
+
+def test_each_waiter_uses_its_own_deadline():
+    """共用的抓取持續到最晚的期限，期限較短的請求只放棄自己的等待。"""
+
+    async def main():
+        cache, fetcher = ResponseCache(), SlowFetch(0.3)
+        short = waiter(cache, fetcher, seconds=0.1)
+        await asyncio.sleep(0.01)
+        long = waiter(cache, fetcher, seconds=2)
+        with pytest.raises(DeadlineExceeded):
+            await short
+        solution, status = await long
+        assert (solution.response, status, fetcher.calls) == ("body", SHARED, 1)
+
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""BackendRouter 的測試，以假的抓取函式取代 crawler。"""
+
+import asyncio
+
+import pytest
+from data_structures import SolutionResultT, V1RequestBase
+from router import (
+    CHALLENGE,
+    ERROR,
+    SUCCESS,
+    Backend,
+    BackendRouter,
+    BrowserBackend,
+    HttpBackend,
+    RouterStats,
+    classify_status,
+)
+
+
+class FakeHttpCrawler:
+    def __init__(self, status):
+        self.status = status
+
+    async def fetch(self, req, use_memory=True):
+        return SolutionResultT(status=self.status, url=req.url, response="<html>not found</html>"), ""
+
+
+def route(status):
+    calls = []
+
+    async def browser(req):
+        calls.append(req.url)
+        return SolutionResultT(status=200, url=req.url, response="<html>" + "x" * 500 + "</html>")
+
+    router = BackendRouter(
+        [HttpBackend(FakeHttpCrawler(status)), BrowserBackend("nodriver", 2, browser)], RouterStats()
+    )
+    solution, backend = asyncio.run(router.fetch(V1RequestBase(url="http://a.test/missing")))
+    return solution, backend, calls
+
+
+def test_client_error_is_final():
+    """404 是網站的最終答案，不改用瀏覽器。"""
+    solution, backend, calls = route(404)
+    assert (solution.status, backend, calls) == (404, "http", [])
+
+
+def test_server_error_falls_back():
+    solution, backend, calls = route(500)
+    assert (solution.status, backend) == (200, "nodriver")
+    assert calls == ["http://a.test/missing"]
+
+
+def test_classify_status():
+    assert [classify_status(status) for status in (200, 301, 404, 410, 403, 429, 503, 500)] == [
+        None,
+        None,
+        SUCCESS,
+        SUCCESS,
+        CHALLENGE,
+        CHALLENGE,
+        CHALLENGE,
+        ERROR,
+    ]
+
+
+def test_backend_fetch_is_abstract():
+    with pytest.raises(TypeError):
+        Backend()
@@ -0,0 +1,72 @@
+"""SiteCrawl 的測試，以假的抓取函式模擬網站的連結。"""
+
+import asyncio
+
+import pytest
+from data_structures import CrawlOptionsT, SolutionResultT, V1RequestBase, V1ResponseBase
+from site_crawl import LINKS_FIELD, SiteCrawl
+
+# 每個頁面的連結
+SITE = {
+    "http://a.test/": ["http://a.test/1", "http://a.test/2", "http://A.test/1#top", "http://other.test/", "mailto:x@a.test"],
+    "http://a.test/1": ["http://a.test/3", "http://a.test/", "http://sub.a.test/"],
+    "http://a.test/2": ["http://a.test/4"],
+    "http://a.test/3": ["http://a.test/5"],
+    "http://a.test/4": [],
+    "http://sub.a.test/": ["http://a.test/6"],
+}
+
+
+class FakeCrawl:
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, req: V1RequestBase):
+        self.requests.append(req)
+        await asyncio.sleep(0)
+        data = {"title": req.url}
+        if LINKS_FIELD in (req.extract or {}):
+            data[LINKS_FIELD] = SITE.get(req.url, [])
+        return V1ResponseBase(solution=SolutionResultT(url=req.url, data=data))
+
+
+def run(options, seed="http://a.test/"):
+    crawl = FakeCrawl()
+    site_crawl = SiteCrawl(V1RequestBase(url=seed, extract={"title": "title"}), crawl, options)
+
+    async def collect():
+        return [(depth, res) async for depth, res in site_crawl.run()]
+
+    return site_crawl, crawl, asyncio.run(collect())
+
+
+def test_breadth_first_with_dedup_and_depth_limit():
+    site_crawl, crawl, results = run(CrawlOptionsT(max_depth=2, concurrency=1))
+    urls = [req.url for req in crawl.requests]
+    assert urls == [
+        "http://a.test/",
+        "http://a.test/1",
+        "http://a.test/2",
+        "http://a.test/3",
+        "http://sub.a.test/",
+        "http://a.test/4",
+    ]
+    assert [depth for depth, _ in results] == [0, 1, 1, 2, 2, 2]
+    # 最大深度的頁面不擷取連結，回應中也不留下連結欄位
+    assert [LINKS_FIELD in req.extract for req in crawl.requests] == [True, True, True, False, False, False]
+    assert all(res.solution.data == {"title": res.solution.url} for _, res in results)
+    assert site_crawl.summary() == {"status": "finished", "pages": 6, "discovered": 6, "remaining": 0}
+
+
+def test_host_scope_and_page_limit():
+    site_crawl, crawl, results = run(CrawlOptionsT(max_depth=5, max_pages=3, scope="host", concurrency=2))
+    assert [req.url for req in crawl.requests] == ["http://a.test/", "http://a.test/1", "http://a.test/2"]
+    assert len(results) == 3
+    assert site_crawl.summary()["remaining"] == 2
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        SiteCrawl(V1RequestBase(url="http://a.test/"), FakeCrawl(), CrawlOptionsT(scope="site", concurrency=1))
+    with pytest.raises(ValueError):
+        SiteCrawl(V1RequestBase(url="ftp://a.test/"), FakeCrawl(), CrawlOptionsT(concurrency=1))
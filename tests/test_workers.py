@@ -0,0 +1,151 @@
+"""WorkerPool 的測試，以不啟動瀏覽器的 stub_worker_main 取代 worker 行程。
+
+worker 以 spawn 啟動，stub 須可由子行程匯入，因此定義在模組層級。
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+import workers
+from browser_sessions import SessionLimitError
+from data_structures import SolutionResultT, V1RequestBase
+from deadline import DeadlineExceeded
+from selenium_pool import PoolTimeoutError
+from workers import WorkerCrashedError, WorkerPool
+
+
+def stub_worker_main(index, tasks, results, config):
+    """依網址路徑決定行為：回傳結果、回傳錯誤、沒有回應，或在處理中結束行程。"""
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        if task[0] == "cancel":
+            open(os.path.join(config["dir"], f"cancelled-{task[1]}"), "w").close()
+            continue
+        task_id, backend, req, expires = task
+        path = req.url.split("/", 3)[3]
+        if path == "crash":
+            os._exit(1)
+        if path == "crash-once":
+            marker = os.path.join(config["dir"], "crashed")
+            if not os.path.exists(marker):
+                open(marker, "w").close()
+                os._exit(1)
+        if path.startswith("error/"):
+            results.put((task_id, None, {}, (path.split("/")[1], "message")))
+            continue
+        if path == "hang":
+            continue
+        if path == "slow":
+            time.sleep(0.5)
+        solution = SolutionResultT(url=req.url, status=200, response=str(os.getpid()))
+        results.put((task_id, solution, {"load": 5}, None))
+
+
+@pytest.fixture
+def pool_factory(monkeypatch, tmp_path):
+    monkeypatch.setattr(workers, "worker_main", stub_worker_main)
+
+    def create(size=1, max_requeues=2):
+        return WorkerPool(size, {"dir": str(tmp_path)}, max_requeues, check_interval=0.05)
+
+    return create
+
+
+def request(path, **kwargs):
+    return V1RequestBase(url=f"http://a.test/{path}", **kwargs)
+
+
+def run(pool, main):
+    async def wrapper():
+        await pool.start()
+        try:
+            return await asyncio.wait_for(main(), 60)
+        finally:
+            await pool.stop()
+
+    return asyncio.run(wrapper())
+
+
+def test_dispatch_to_least_busy_and_by_session(pool_factory):
+    pool = pool_factory(size=2)
+
+    async def main():
+        # 同時進行的工作分到不同的 worker
+        results = await asyncio.gather(pool.submit("v2", request("slow")), pool.submit("v2", request("slow")))
+        assert results[0][1] == {"load": 5}
+        assert results[0][0].response != results[1][0].response
+        # 工作階段固定派發給依名稱選出的 worker（"login" 為 0 號），即使它比較忙碌
+        busy = asyncio.create_task(pool.submit("v2", request("slow")))
+        await asyncio.sleep(0.05)
+        assert pool.workers[0].in_flight
+        solution, _ = await pool.submit("v2", request("ok", session_id="login"))
+        assert solution.response == str(pool.workers[0].process.pid)
+        await busy
+        assert pool.in_flight == 0
+
+    run(pool, main)
+
+
+def test_crashed_worker_is_respawned_and_task_requeued(pool_factory):
+    pool = pool_factory(max_requeues=1)
+
+    async def main():
+        pid = pool.workers[0].process.pid
+        solution, _ = await pool.submit("v1", request("crash-once"))
+        assert solution.status == 200
+        assert solution.response != str(pid)
+        assert pool.workers[0].process.is_alive()
+
+    run(pool, main)
+
+
+def test_requeues_are_limited(pool_factory):
+    pool = pool_factory(max_requeues=1)
+
+    async def main():
+        with pytest.raises(WorkerCrashedError):
+            await pool.submit("v1", request("crash"))
+        # 重新啟動的 worker 仍可處理其他請求
+        solution, _ = await pool.submit("v1", request("ok"))
+        assert solution.status == 200
+
+    run(pool, main)
+
+
+@pytest.mark.parametrize(
+    "name, error",
+    [
+        ("PoolTimeoutError", PoolTimeoutError),
+        ("SessionLimitError", SessionLimitError),
+        ("DeadlineExceeded", DeadlineExceeded),
+        ("ValueError", RuntimeError),
+    ],
+)
+def test_errors_round_trip(pool_factory, name, error):
+    pool = pool_factory()
+
+    async def main():
+        with pytest.raises(error, match="message"):
+            await pool.submit("v2", request(f"error/{name}"))
+
+    run(pool, main)
+
+
+def test_cancel_is_sent_to_worker(pool_factory, tmp_path):
+    pool = pool_factory()
+
+    async def main():
+        task = asyncio.create_task(pool.submit("v2", request("hang")))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        while not any(name.startswith("cancelled-") for name in os.listdir(tmp_path)):
+            await asyncio.sleep(0.05)
+        assert pool.in_flight == 0
+
+    run(pool, main)